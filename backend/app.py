@@ -1,24 +1,73 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import random
-import string
 import os
-from datetime import datetime, timedelta
-import psycopg
+from datetime import date, datetime, time, timedelta, timezone
 try:
     from .database import get_db, get_database_url
+    from . import incident_stats
+    from .report_cache import ReportCache
+    from .hashing import HashingBusy, PasswordHasher
+    from .circuit_breaker import CircuitBreaker, CircuitOpen
+    from . import bulk_import
+    from . import request_metrics
+    from . import migrate
 except ImportError:
     from database import get_db, get_database_url
+    import incident_stats
+    from report_cache import ReportCache
+    from hashing import HashingBusy, PasswordHasher
+    from circuit_breaker import CircuitBreaker, CircuitOpen
+    import bulk_import
+    import request_metrics
+    import migrate
 import json
-import stripe
-from werkzeug.security import generate_password_hash, check_password_hash
+import base64
+import binascii
+import tempfile
+import hashlib
+import html
+import importlib
+from functools import lru_cache
+import psycopg
+from psycopg_pool import PoolTimeout
+from types import SimpleNamespace
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
 from dotenv import load_dotenv
 from functools import wraps
 
 # Load environment variables
 load_dotenv()
 
+def format_record_value(value):
+    """Render native DATE/TIME/TIMESTAMPTZ values the way the TEXT columns stored them.
+
+    Dates and times come from the browser's date/time inputs (YYYY-MM-DD and
+    HH:MM); timestamps were naive isoformat() strings in UTC.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, time):
+        if value.second or value.microsecond:
+            return value.isoformat()
+        return value.strftime('%H:%M')
+    return value
+
+class RecordJSONProvider(DefaultJSONProvider):
+    """Keep the API's JSON date format stable now that the columns are native types."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, (date, time)):
+            return format_record_value(o)
+        return DefaultJSONProvider.default(o)
+
 app = Flask(__name__)
+app.json = RecordJSONProvider(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 # Session Configuration for Cross-Origin (Vercel -> Railway)
 app.config.update(
@@ -35,10 +84,44 @@ allowed_origins = [
     'https://www.compcleared.com',
     'https://compcleared-app.vercel.app'
 ]
-CORS(app, supports_credentials=True, origins=allowed_origins)
+CORS_OPTIONS = {'supports_credentials': True, 'origins': allowed_origins}
+CORS(app, **CORS_OPTIONS)
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access."""
+
+    def __init__(self, name, configure=None):
+        self._name = name
+        self._configure = configure
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            if self._configure:
+                self._configure(module)
+            self._module = module
+        return getattr(self._module, attr)
+
+# Stripe configuration. The SDK is most of this module's import time and only
+# billing endpoints need it, so it loads on first use.
+STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', 'sk_test_placeholder')
+# Consecutive failed Stripe calls before Stripe endpoints fail fast with 503.
+stripe_breaker = CircuitBreaker(
+    'Stripe',
+    failure_threshold=int(os.environ.get('STRIPE_BREAKER_FAILURES', 5)),
+    reset_seconds=float(os.environ.get('STRIPE_BREAKER_RESET_SECONDS', 30)),
+)
 
-# Stripe configuration
-stripe.api_key = os.environ.get('STRIPE_SECRET_KEY', 'sk_test_placeholder')
+def configure_stripe(module):
+    try:
+        from . import stripe_client
+    except ImportError:
+        import stripe_client
+    module.api_key = STRIPE_SECRET_KEY
+    stripe_client.configure(module, stripe_breaker)
+
+stripe = LazyModule('stripe', configure=configure_stripe)
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
 
 # Stripe price IDs (CompCleared Pro — $19/mo and $149/yr).
@@ -52,152 +135,296 @@ PRICE_IDS = {
 # The browser session stores a reference to this row, never the authorization itself.
 CHECKOUT_AUTHORIZATION_TTL = timedelta(minutes=30)
 
-# Database setup for SB 553 Workplace Violence Compliance
-def init_db():
-    database_url = get_database_url()
-    if not database_url:
-        print("⚠️  DATABASE_URL not set — skipping init_db (will run when DATABASE_URL is configured)")
-        return
+# Password hashes are computed on a small per-worker thread pool (see hashing)
+# so a burst of logins cannot occupy every request thread.
+password_hasher = PasswordHasher(
+    iterations=int(os.environ.get('PASSWORD_HASH_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS)),
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+    max_queue=int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 8)),
+)
 
-    conn = psycopg.connect(database_url)
-    c = conn.cursor()
+_started = False
 
-    # Companies table
-    c.execute('''CREATE TABLE IF NOT EXISTS companies (
-                    id SERIAL PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    tier TEXT NOT NULL,
-                    employee_count INTEGER,
-                    locations TEXT,
-                    created_at TEXT,
-                    subscription_status TEXT,
-                    stripe_customer_id TEXT,
-                    stripe_subscription_id TEXT
-                )''')
-
-    # Users table
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER,
-                    email TEXT UNIQUE NOT NULL,
-                    password_hash TEXT,
-                    name TEXT,
-                    role TEXT,
-                    location_id TEXT,
-                    created_at TEXT,
-                    FOREIGN KEY (company_id) REFERENCES companies (id)
-                )''')
-
-    # This table is intentionally independent of Flask's signed client cookie. It
-    # makes the authorization durable across a webhook/browser race and lets the
-    # signup transaction consume it exactly once.
-    c.execute('''CREATE TABLE IF NOT EXISTS checkout_authorizations (
-                    checkout_session_id TEXT PRIMARY KEY,
-                    company_id INTEGER NOT NULL REFERENCES companies (id),
-                    expires_at TIMESTAMPTZ NOT NULL,
-                    consumed_at TIMESTAMPTZ
-                )''')
-    # Existing databases may have received the initial table before consumed_at
-    # was introduced; this makes the change safe to deploy repeatedly.
-    c.execute('''ALTER TABLE checkout_authorizations
-                 ADD COLUMN IF NOT EXISTS consumed_at TIMESTAMPTZ''')
-    c.execute('''CREATE INDEX IF NOT EXISTS checkout_authorizations_expiry_idx
-                 ON checkout_authorizations (expires_at)''')
-    # Stripe can deliver subscription cancellation before checkout completion.
-    # Retain that fact even while the company is still pending.
-    c.execute('''CREATE TABLE IF NOT EXISTS canceled_stripe_subscriptions (
-                    stripe_subscription_id TEXT PRIMARY KEY,
-                    canceled_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
-                )''')
-
-    # Workplace Violence Incidents table (SB 553 compliant)
-    c.execute('''CREATE TABLE IF NOT EXISTS incidents (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER,
-                    location_id TEXT,
-
-                    -- SB 553 Required Fields
-                    incident_date TEXT NOT NULL,
-                    incident_time TEXT NOT NULL,
-                    exact_location TEXT NOT NULL,
-
-                    violence_type TEXT NOT NULL,
-                    offender_classification TEXT NOT NULL,
-
-                    description TEXT NOT NULL,
-                    circumstances TEXT,
-                    violence_nature TEXT,
-
-                    consequences TEXT,
-                    law_enforcement_contacted INTEGER,
-                    injuries TEXT,
-                    protective_measures TEXT,
-
-                    employees_involved TEXT,
-                    corrective_actions TEXT,
-
-                    logged_by_name TEXT NOT NULL,
-                    logged_by_title TEXT NOT NULL,
-                    log_date TEXT NOT NULL,
-
-                    created_at TEXT,
-
-                    FOREIGN KEY (company_id) REFERENCES companies (id)
-                )''')
-
-    # Training records table (SB 553 compliance)
-    c.execute('''CREATE TABLE IF NOT EXISTS training_records (
-                    id SERIAL PRIMARY KEY,
-                    company_id INTEGER,
-                    training_date TEXT NOT NULL,
-                    training_type TEXT NOT NULL, -- e.g., Annual, Initial, Post-Incident
-                    trainer_name TEXT,
-                    topic_description TEXT,
-                    attendee_count INTEGER,
-                    documentation_url TEXT, -- Link to signed sign-in sheets
-                    created_at TEXT,
-                    FOREIGN KEY (company_id) REFERENCES companies (id)
-                )''')
+def create_app():
+    """Application factory: run per-worker startup, then return the Flask app.
 
+    Importing this module stays side-effect free; gunicorn calls this once per
+    worker (backend.app:create_app()) to check that the schema migrations are
+    applied and load reportlab before the first request instead of during it.
+    """
+    global _started
+    if not _started:
+        migrate.verify_schema()
+        prewarm_reports()
+        _started = True
+    return app
 
-    conn.commit()
-    conn.close()
-    print("✅ SB 553 Postgres database initialized")
+def request_db():
+    """The current request's database connection, checked out on first use.
+
+    The auth decorators and the handler share it, so a protected request holds
+    one pooled connection; close_request_db returns it after the response.
+    """
+    if 'db' not in g:
+        g.db = get_db()
+    return g.db
+
+@app.teardown_appcontext
+def close_request_db(error):
+    conn = g.pop('db', None)
+    if conn is not None:
+        conn.close()
+
+@app.before_request
+def start_request_metrics():
+    rule = request.url_rule
+    g.request_stats = request_metrics.start_request(rule.rule if rule else '<unmatched>', request.method)
+
+@app.after_request
+def finish_request_metrics(response):
+    """Record the request once its body is sent, so streamed responses are timed in full."""
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return response
+    sent = {'bytes': response.content_length}
+    if sent['bytes'] is None and response.is_streamed:
+        body = response.response
+        sent['bytes'] = 0
 
-init_db()
+        def counted():
+            try:
+                for chunk in body:
+                    sent['bytes'] += len(chunk.encode() if isinstance(chunk, str) else chunk)
+                    yield chunk
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+
+        response.response = counted()
+    status = response.status_code
+    response.call_on_close(lambda: request_metrics.finish_request(stats, status, sent['bytes']))
+    return response
+
+REQUEST_CONTEXT_QUERY = '''SELECT to_jsonb(users) - 'password_hash' AS user_record,
+                                 to_jsonb(companies) AS company_record
+                          FROM users LEFT JOIN companies ON companies.id = users.company_id
+                          WHERE users.id = %s'''
+
+def load_request_context():
+    """Load the signed-in user and their company into g.user and g.company.
+
+    One JOIN on the request's connection answers login_required,
+    subscription_required, data_versioned and handlers such as /api/me.
+    The password hash never leaves the database.
+    """
+    if 'user' not in g:
+        c = request_db().cursor()
+        c.execute(REQUEST_CONTEXT_QUERY, (session['user_id'],))
+        context = c.fetchone()
+        g.user = context['user_record'] if context else None
+        g.company = context['company_record'] if context else None
+    return g.user
+
+def access_denial(session, user, company=None, subscription=False):
+    """The (error, status) a request is refused with, or None when it may proceed.
+
+    The rule behind login_required and, with subscription=True,
+    subscription_required. backend.asgi applies it to the dashboard reads
+    too. `user` and `company` are the request context loaded for
+    session['user_id'] (None when there is none).
+    """
+    if 'user_id' not in session or not user:
+        return 'Authentication required', 401
+    if subscription:
+        if 'company_id' not in session:
+            return 'Authentication required', 401
+        if not company or company['subscription_status'] != 'active':
+            return 'Active subscription required', 403
+    return None
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
-            return jsonify({'success': False, 'error': 'Authentication required'}), 401
+        denial = access_denial(session, 'user_id' in session and load_request_context())
+        if denial:
+            return jsonify({'success': False, 'error': denial[0]}), denial[1]
         return f(*args, **kwargs)
     return decorated_function
 
 def subscription_required(f):
+    """Require an active subscription; runs after login_required has loaded g.company."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'company_id' not in session:
-            return jsonify({'success': False, 'error': 'Authentication required'}), 401
-        
-        conn = get_db()
-        c = conn.cursor()
-        c.execute('SELECT subscription_status FROM companies WHERE id = %s', (session['company_id'],))
-        company = c.fetchone()
-        conn.close()
-        
-        if not company or company['subscription_status'] != 'active':
-            return jsonify({'success': False, 'error': 'Active subscription required'}), 403
-        
+        denial = access_denial(session, g.user, g.company, subscription=True)
+        if denial:
+            return jsonify({'success': False, 'error': denial[0]}), denial[1]
         return f(*args, **kwargs)
     return decorated_function
 
+def data_versioned(f):
+    """Tag a company's read endpoint with an ETag derived from companies.data_version.
+
+    A matching If-None-Match gets a 304 from the version in g.company, without
+    running the handler's queries. The version is read before those queries,
+    so a write landing in between can only make the tag older than the body,
+    which costs the client one extra full response, never a stale one.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        etag, not_modified = check_data_version(session, g.company, request)
+        if not_modified:
+            return not_modified
+        response = app.make_response(f(*args, **kwargs))
+        if response.status_code != 200:
+            return response
+        return tag_data_version(response, etag)
+    return decorated_function
+
+def check_data_version(session, company, request):
+    """data_versioned's ETag for `request`, and the 304 to answer with if it still matches.
+
+    backend.asgi calls this for its dashboard reads as well.
+    """
+    etag = data_version_etag(session['company_id'], company['data_version'], request.full_path)
+    if request.if_none_match.contains(etag):
+        return etag, tag_data_version(app.response_class(status=304), etag)
+    return etag, None
+
+def data_version_etag(company_id, data_version, full_path):
+    # The query string selects the page; the date moves /api/stats'
+    # 30-day window even when no data changes.
+    tag_source = json.dumps([company_id, data_version, full_path, date.today().isoformat()])
+    return f"v{data_version}-{hashlib.sha256(tag_source.encode()).hexdigest()[:20]}"
+
+def tag_data_version(response, etag):
+    response.set_etag(etag)
+    # Browsers revalidate on every fetch, so a new incident shows up at once.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def bump_data_version(c, company_id):
+    """Invalidate the company's ETags; call in the transaction that changes its data."""
+    c.execute('UPDATE companies SET data_version = data_version + 1 WHERE id = %s', (company_id,))
+
+# Keyset pagination for the list endpoints. The cursor is opaque to clients: a
+# base64url-encoded JSON array holding the sort key of the last row returned.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token, sort_key):
+    """The sort key in `token`, each value read by the matching parser of `sort_key`.
+
+    Parsing here keeps a tampered value from reaching Postgres as a bad
+    ::date or ::time parameter.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(sort_key):
+        raise ValueError('Invalid cursor')
+    try:
+        return [parse(value) for parse, value in zip(sort_key, values)]
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError('Invalid cursor')
+
+def read_page_args(sort_key, args=None):
+    """Parse ?limit=&cursor= into (limit, sort key to resume after or None).
+
+    `sort_key` holds a parser per cursor value, e.g. INCIDENT_SORT_KEY.
+    Returns None when the client asked for no paging at all.
+    """
+    args = request.args if args is None else args
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    if limit is None and cursor is None:
+        return None
+    try:
+        limit = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit, (decode_cursor(cursor, sort_key) if cursor else None)
+
+def cursor_id(value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError('Invalid cursor')
+    return value
+
+# Parsers of the cursor values of each list, in ORDER BY order.
+INCIDENT_SORT_KEY = (date.fromisoformat, time.fromisoformat, cursor_id)
+TRAINING_SORT_KEY = (date.fromisoformat, cursor_id)
+
+def next_page_cursor(rows, limit, sort_columns):
+    """Trim the look-ahead row fetched past `limit` and return the next cursor."""
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    return encode_cursor([rows[-1][column] for column in sort_columns])
+
+@app.errorhandler(PoolTimeout)
+def database_busy(error):
+    # Every pooled connection stayed checked out for DB_POOL_TIMEOUT_SECONDS.
+    # Shed load with a retryable status instead of queueing indefinitely.
+    response = jsonify({'success': False, 'error': 'Service is busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(error):
+    # The hashing pool and its queue are full; fail fast rather than tie up
+    # another request thread waiting for a slot.
+    response = jsonify({'success': False, 'error': 'Service is busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@app.errorhandler(CircuitOpen)
+def stripe_unavailable(error):
+    # Recent Stripe calls failed or timed out; answer now rather than hold a
+    # request thread for another round of timeouts.
+    response = jsonify({'success': False, 'error': 'Payments are temporarily unavailable, please retry'})
+    response.headers['Retry-After'] = str(int(error.retry_after))
+    return response, 503
+
 # API Routes
 
 @app.route('/api/health', methods=['GET'])
 def health():
     return jsonify({'status': 'ok', 'service': 'CompCleared SB 553'})
 
+def metrics_token_matches():
+    metrics_token = os.environ.get('METRICS_TOKEN')
+    return bool(metrics_token) and request.headers.get('Authorization') == f'Bearer {metrics_token}'
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Per-worker runtime metrics, readable with `Authorization: Bearer $METRICS_TOKEN`."""
+    if not metrics_token_matches():
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    return jsonify({
+        'pid': os.getpid(),
+        'password_hashing': password_hasher.metrics(),
+        'stripe': stripe_breaker.metrics(),
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request metrics of all workers in the Prometheus text format.
+
+    Readable with the METRICS_TOKEN bearer only. A loopback address proves
+    nothing behind a reverse proxy on the same host.
+    """
+    if not metrics_token_matches():
+        return jsonify({'success': False, 'error': 'Not found'}), 404
+    return app.response_class(request_metrics.registry.render(),
+                              content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Auth endpoints
 
 @app.route('/api/signup', methods=['POST'])
@@ -210,31 +437,35 @@ def signup():
             'success': False,
             'error': 'Complete payment verification before creating an account'
         }), 403
+    if not data or not data.get('password'):
+        return jsonify({'success': False, 'error': 'Password is required'}), 400
     
-    conn = get_db()
+    # Hash before taking any row or advisory locks below; a busy hashing pool
+    # answers 503 through hashing_busy.
+    password_hash = password_hasher.hash(data['password'])
+    
+    conn = request_db()
     c = conn.cursor()
     
     try:
         # Check if email already exists
         c.execute('SELECT id FROM users WHERE email = %s', (data['email'],))
         if c.fetchone():
-            conn.close()
             return jsonify({'success': False, 'error': 'Email already registered'}), 400
 
         # Take the same subscription lock as checkout completion and cancellation.
         # The subsequent consume statement rechecks the company state while this
         # lock is held, so a cancellation cannot race a first-account signup.
-        c.execute('''SELECT authorization.company_id, company.stripe_subscription_id
-                     FROM checkout_authorizations AS authorization
-                     JOIN companies AS company ON company.id = authorization.company_id
-                     WHERE authorization.checkout_session_id = %s
-                       AND authorization.expires_at > NOW()
-                       AND authorization.consumed_at IS NULL
+        c.execute('''SELECT checkout_auth.company_id, company.stripe_subscription_id
+                     FROM checkout_authorizations AS checkout_auth
+                     JOIN companies AS company ON company.id = checkout_auth.company_id
+                     WHERE checkout_auth.checkout_session_id = %s
+                       AND checkout_auth.expires_at > NOW()
+                       AND checkout_auth.consumed_at IS NULL
                      FOR UPDATE''', (checkout_session_id,))
         checkout_authorization = c.fetchone()
         if not checkout_authorization or not checkout_authorization['stripe_subscription_id']:
             conn.rollback()
-            conn.close()
             session.pop('verified_checkout_session_id', None)
             return jsonify({
                 'success': False,
@@ -249,25 +480,24 @@ def signup():
         # the consumption back instead of stranding a legitimate payer. Joining
         # companies and the cancellation marker makes this a final, atomic active
         # subscription check under the shared subscription lock.
-        c.execute('''UPDATE checkout_authorizations AS authorization
+        c.execute('''UPDATE checkout_authorizations AS checkout_auth
                      SET consumed_at = NOW()
                      FROM companies AS company
-                     WHERE authorization.checkout_session_id = %s
-                       AND authorization.company_id = company.id
-                       AND authorization.expires_at > NOW()
-                       AND authorization.consumed_at IS NULL
+                     WHERE checkout_auth.checkout_session_id = %s
+                       AND checkout_auth.company_id = company.id
+                       AND checkout_auth.expires_at > NOW()
+                       AND checkout_auth.consumed_at IS NULL
                        AND company.subscription_status = 'active'
                        AND company.stripe_subscription_id = %s
                        AND NOT EXISTS (
                            SELECT 1 FROM canceled_stripe_subscriptions
                            WHERE stripe_subscription_id = company.stripe_subscription_id
                        )
-                     RETURNING authorization.company_id''',
+                     RETURNING checkout_auth.company_id''',
                   (checkout_session_id, checkout_authorization['stripe_subscription_id']))
         authorization = c.fetchone()
         if not authorization:
             conn.rollback()
-            conn.close()
             session.pop('verified_checkout_session_id', None)
             return jsonify({
                 'success': False,
@@ -275,9 +505,6 @@ def signup():
             }), 403
         company_id = authorization['company_id']
         
-        # Hash password (using pbkdf2 for compatibility)
-        password_hash = generate_password_hash(data['password'], method='pbkdf2:sha256')
-        
         # Create user
         c.execute('''INSERT INTO users (
             company_id, email, password_hash, name, role, created_at
@@ -292,7 +519,6 @@ def signup():
         ))
         user_id = c.fetchone()['id']
         conn.commit()
-        conn.close()
         
         # Create session
         session['user_id'] = user_id
@@ -308,7 +534,6 @@ def signup():
         
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/login', methods=['POST'])
@@ -316,14 +541,22 @@ def login():
     """Log in existing user"""
     data = request.json
     
+    # Returned before the password check, which can take a while.
     conn = get_db()
-    c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE email = %s', (data['email'],))
-    user = c.fetchone()
-    conn.close()
+    try:
+        c = conn.cursor()
+        c.execute('SELECT * FROM users WHERE email = %s', (data['email'],))
+        user = c.fetchone()
+    finally:
+        conn.close()
     
-    if not user or not check_password_hash(user['password_hash'], data['password']):
+    if not user:
         return jsonify({'success': False, 'error': 'Invalid email or password'}), 401
+    matches, needs_rehash = password_hasher.verify(user['password_hash'], data['password'])
+    if not matches:
+        return jsonify({'success': False, 'error': 'Invalid email or password'}), 401
+    if needs_rehash:
+        rehash_password(user, data['password'])
     
     # Create session
     session['user_id'] = user['id']
@@ -340,6 +573,22 @@ def login():
         }
     })
 
+def rehash_password(user, password):
+    """Upgrade a hash made with another work factor; login succeeds either way."""
+    try:
+        password_hash = password_hasher.hash(password)
+    except HashingBusy:
+        return
+    conn = get_db()
+    try:
+        c = conn.cursor()
+        # Compare-and-set, so a concurrent password change is never overwritten.
+        c.execute('UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s',
+                  (password_hash, user['id'], user['password_hash']))
+        conn.commit()
+    finally:
+        conn.close()
+
 @app.route('/api/logout', methods=['POST'])
 def logout():
     """Log out current user"""
@@ -350,23 +599,10 @@ def logout():
 @login_required
 def get_current_user():
     """Get current user info"""
-    conn = get_db()
-    c = conn.cursor()
-    c.execute('SELECT * FROM users WHERE id = %s', (session['user_id'],))
-    user = c.fetchone()
-    
-    if user and user['company_id']:
-        c.execute('SELECT * FROM companies WHERE id = %s', (user['company_id'],))
-        company = c.fetchone()
-    else:
-        company = None
-    
-    conn.close()
-    
     return jsonify({
         'success': True,
-        'user': dict(user) if user else None,
-        'company': dict(company) if company else None
+        'user': g.user,
+        'company': g.company
     })
 
 # Stripe endpoints
@@ -378,23 +614,24 @@ def create_checkout_session():
     tier = data.get('tier', 'annual')
     
     try:
-        # Create or get company
+        # Create or get company. The connection goes back before the Stripe call.
         conn = get_db()
-        c = conn.cursor()
-        
-        c.execute('''INSERT INTO companies (
-            name, tier, employee_count, subscription_status, created_at
-        ) VALUES (%s, %s, %s, %s, %s) RETURNING id''',
-        (
-            data['company_name'],
-            tier,
-            data.get('employee_count', 0),
-            'pending',
-            datetime.now().isoformat()
-        ))
-        company_id = c.fetchone()['id']
-        conn.commit()
-        conn.close()
+        try:
+            c = conn.cursor()
+            c.execute('''INSERT INTO companies (
+                name, tier, employee_count, subscription_status, created_at
+            ) VALUES (%s, %s, %s, %s, %s) RETURNING id''',
+            (
+                data['company_name'],
+                tier,
+                data.get('employee_count', 0),
+                'pending',
+                datetime.now().isoformat()
+            ))
+            company_id = c.fetchone()['id']
+            conn.commit()
+        finally:
+            conn.close()
         
         price_id = PRICE_IDS.get(tier) or PRICE_IDS.get('monthly')
         if not price_id:
@@ -427,6 +664,8 @@ def create_checkout_session():
             'company_id': company_id
         })
         
+    except CircuitOpen:
+        raise
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
@@ -440,7 +679,9 @@ def verify_session():
         return jsonify({'success': False, 'error': 'Missing parameters'}), 400
         
     try:
-        checkout_session = stripe.checkout.Session.retrieve(session_id)
+        # The webhook usually lands before the browser returns from Checkout.
+        checkout_session = (find_checkout_session(session_id) or
+                            stripe.checkout.Session.retrieve(session_id))
 
         metadata_company_id = (checkout_session.metadata or {}).get('company_id')
         if (metadata_company_id != company_id or
@@ -453,7 +694,7 @@ def verify_session():
         if checkout_session.payment_status != 'paid' or not checkout_session.subscription:
             return jsonify({'success': False, 'status': checkout_session.payment_status}), 400
 
-        conn = get_db()
+        conn = request_db()
         c = conn.cursor()
         # Serialize checkout completion and cancellation for this Stripe
         # subscription, even if the cancellation webhook arrives first.
@@ -464,7 +705,6 @@ def verify_session():
                      FROM companies WHERE id = %s FOR UPDATE''', (company_id,))
         company = c.fetchone()
         if not company or company['subscription_status'] not in ('pending', 'active'):
-            conn.close()
             return jsonify({
                 'success': False,
                 'error': 'Company is not awaiting checkout verification'
@@ -474,7 +714,6 @@ def verify_session():
                      FROM canceled_stripe_subscriptions
                      WHERE stripe_subscription_id = %s''', (checkout_session.subscription,))
         if c.fetchone():
-            conn.close()
             return jsonify({
                 'success': False,
                 'error': 'Company is not awaiting checkout verification'
@@ -488,7 +727,6 @@ def verify_session():
                          WHERE id = %s AND subscription_status = 'pending' ''',
                       (checkout_session.customer, checkout_session.subscription, company_id))
         elif company['stripe_subscription_id'] != checkout_session.subscription:
-            conn.close()
             return jsonify({
                 'success': False,
                 'error': 'Company is not awaiting checkout verification'
@@ -500,16 +738,53 @@ def verify_session():
                      ON CONFLICT (checkout_session_id) DO NOTHING''',
                   (session_id, company_id, datetime.now().astimezone() + CHECKOUT_AUTHORIZATION_TTL))
         conn.commit()
-        conn.close()
         session['verified_checkout_session_id'] = session_id
         return jsonify({'success': True, 'status': 'active'})
             
+    except CircuitOpen:
+        raise
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+def find_checkout_session(session_id):
+    """A paid checkout session recorded from a verified webhook, shaped like the Stripe object.
+
+    Returns None on a miss, or when the recorded session was not paid (an
+    asynchronous payment may have completed since), so the caller asks Stripe.
+    """
+    # Returned before the caller falls back to asking Stripe.
+    conn = get_db()
+    try:
+        c = conn.cursor()
+        c.execute('''SELECT id, client_reference_id, metadata_company_id, payment_status,
+                            subscription_id, customer_id
+                     FROM stripe_checkout_sessions
+                     WHERE id = %s AND payment_status = 'paid' ''', (session_id,))
+        recorded = c.fetchone()
+    finally:
+        conn.close()
+    if not recorded:
+        return None
+    return SimpleNamespace(
+        id=recorded['id'],
+        client_reference_id=recorded['client_reference_id'],
+        metadata={'company_id': recorded['metadata_company_id']},
+        payment_status=recorded['payment_status'],
+        subscription=recorded['subscription_id'],
+        customer=recorded['customer_id'],
+    )
+
+# Stripe events the webhook worker applies; any other type is acknowledged
+# and dropped.
+STRIPE_EVENT_TYPES = ('checkout.session.completed', 'customer.subscription.deleted')
+
 @app.route('/api/webhook', methods=['POST'])
 def stripe_webhook():
-    """Handle Stripe webhook events"""
+    """Verify a Stripe webhook, store it in the inbox and acknowledge it.
+
+    The event is applied later by webhook_worker, so Stripe gets its 200 after
+    one INSERT; a redelivered event id is a no-op.
+    """
     payload = request.data
     sig_header = request.headers.get('Stripe-Signature')
     endpoint_secret = os.environ.get('STRIPE_WEBHOOK_SECRET')
@@ -521,7 +796,52 @@ def stripe_webhook():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
     
-    # Handle subscription events
+    if event['type'] in STRIPE_EVENT_TYPES:
+        conn = request_db()
+        record_stripe_event(conn.cursor(), event, payload.decode('utf-8'))
+        conn.commit()
+    
+    return jsonify({'success': True})
+
+def record_stripe_event(c, event, payload):
+    """Insert a verified event (and its raw JSON) into the inbox unless it is already there.
+
+    Completed checkout sessions are also recorded for find_checkout_session.
+    """
+    c.execute('''INSERT INTO stripe_events (id, type, subscription_id, stripe_created, payload)
+                 VALUES (%s, %s, %s, %s, %s)
+                 ON CONFLICT (id) DO NOTHING''',
+              (event['id'], event['type'], stripe_event_subscription_id(event), event['created'], payload))
+    recorded = c.rowcount == 1
+    if event['type'] == 'checkout.session.completed':
+        checkout_session = event['data']['object']
+        c.execute('''INSERT INTO stripe_checkout_sessions (
+                         id, client_reference_id, metadata_company_id,
+                         payment_status, subscription_id, customer_id
+                     ) VALUES (%s, %s, %s, %s, %s, %s)
+                     ON CONFLICT (id) DO NOTHING''',
+                  (checkout_session['id'],
+                   checkout_session.get('client_reference_id'),
+                   (checkout_session.get('metadata') or {}).get('company_id'),
+                   checkout_session.get('payment_status'),
+                   checkout_session.get('subscription'),
+                   checkout_session.get('customer')))
+    return recorded
+
+def stripe_event_subscription_id(event):
+    """The subscription an event belongs to; its events are applied in order."""
+    stripe_object = event['data']['object']
+    if event['type'] == 'customer.subscription.deleted':
+        return stripe_object['id']
+    return stripe_object.get('subscription')
+
+def apply_stripe_event(c, event):
+    """Apply an inbox event inside the caller's transaction.
+
+    The caller holds pg_advisory_xact_lock(hashtext(subscription id)), the lock
+    verify_session and signup take for the same subscription. Both branches
+    are safe to run again, which is what makes replaying an event harmless.
+    """
     if event['type'] == 'checkout.session.completed':
         session_data = event['data']['object']
         metadata_company_id = session_data.get('metadata', {}).get('company_id')
@@ -530,10 +850,6 @@ def stripe_webhook():
         if (company_id and company_id == metadata_company_id and
                 session_data.get('payment_status') == 'paid' and
                 session_data.get('subscription')):
-            conn = get_db()
-            c = conn.cursor()
-            c.execute('SELECT pg_advisory_xact_lock(hashtext(%s))',
-                      (session_data['subscription'],))
             c.execute('''UPDATE companies
                          SET subscription_status = %s,
                              stripe_customer_id = %s,
@@ -548,16 +864,12 @@ def stripe_webhook():
                        session_data['subscription'],
                        company_id,
                        session_data['subscription']))
-            conn.commit()
-            conn.close()
-            print(f"✅ Subscription activated for company {company_id}")
+            if c.rowcount:
+                print(f"✅ Subscription activated for company {company_id}")
     
     elif event['type'] == 'customer.subscription.deleted':
         subscription = event['data']['object']
         
-        conn = get_db()
-        c = conn.cursor()
-        c.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', (subscription['id'],))
         c.execute('''INSERT INTO canceled_stripe_subscriptions (stripe_subscription_id)
                      VALUES (%s) ON CONFLICT (stripe_subscription_id) DO NOTHING''',
                   (subscription['id'],))
@@ -568,17 +880,13 @@ def stripe_webhook():
         # Invalidate outstanding browser authorizations in the same locked
         # transaction. This covers cancellation delivered before the browser
         # returns from Checkout and makes stale cookies unusable immediately.
-        c.execute('''UPDATE checkout_authorizations AS authorization
+        c.execute('''UPDATE checkout_authorizations AS checkout_auth
                      SET consumed_at = NOW()
                      FROM companies AS company
-                     WHERE authorization.company_id = company.id
+                     WHERE checkout_auth.company_id = company.id
                        AND company.stripe_subscription_id = %s
-                       AND authorization.consumed_at IS NULL''',
+                       AND checkout_auth.consumed_at IS NULL''',
                   (subscription['id'],))
-        conn.commit()
-        conn.close()
-    
-    return jsonify({'success': True})
 
 # Protected endpoints (require auth + subscription)
 
@@ -586,17 +894,11 @@ def stripe_webhook():
 @login_required
 @subscription_required
 def create_billing_portal():
-    conn = get_db()
-    c = conn.cursor()
-    c.execute('SELECT stripe_customer_id FROM companies WHERE id = %s', (session['company_id'],))
-    company = c.fetchone()
-    conn.close()
-
-    if not company or not company['stripe_customer_id']:
+    if not g.company['stripe_customer_id']:
         return jsonify({'success': False, 'error': 'Billing account is not available yet'}), 409
 
     portal_session = stripe.billing_portal.Session.create(
-        customer=company['stripe_customer_id'],
+        customer=g.company['stripe_customer_id'],
         return_url=f'{FRONTEND_URL}/dashboard',
     )
     return jsonify({'success': True, 'url': portal_session.url})
@@ -606,48 +908,25 @@ def create_billing_portal():
 @subscription_required
 def create_incident():
     """Log a new workplace violence incident (SB 553)"""
-    data = request.json
+    data = request.json or {}
+    company_id = session['company_id']
+    try:
+        values = incident_values(data, company_id, datetime.now(timezone.utc))
+    except bulk_import.RowError as e:
+        return jsonify({'success': False, 'error': str(e), 'field': e.field}), 400
     
-    conn = get_db()
+    conn = request_db()
     c = conn.cursor()
     
     try:
-        c.execute('''INSERT INTO incidents (
-            company_id, location_id,
-            incident_date, incident_time, exact_location,
-            violence_type, offender_classification,
-            description, circumstances, violence_nature,
-            consequences, law_enforcement_contacted, injuries, protective_measures,
-            employees_involved, corrective_actions,
-            logged_by_name, logged_by_title, log_date,
-            created_at
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id''',
-        (
-            session['company_id'],
-            data.get('location_id', 'main'),
-            data['incident_date'],
-            data['incident_time'],
-            data['exact_location'],
-            data['violence_type'],
-            data['offender_classification'],
-            data['description'],
-            data.get('circumstances', ''),
-            data.get('violence_nature', ''),
-            data.get('consequences', ''),
-            1 if data.get('law_enforcement_contacted') else 0,
-            data.get('injuries', ''),
-            data.get('protective_measures', ''),
-            json.dumps(data.get('employees_involved', [])),
-            data.get('corrective_actions', ''),
-            data['logged_by_name'],
-            data['logged_by_title'],
-            datetime.now().isoformat(),
-            datetime.now().isoformat()
-        ))
+        c.execute(f'''INSERT INTO incidents ({', '.join(INCIDENT_COLUMNS)})
+                     VALUES ({', '.join(['%s'] * len(INCIDENT_COLUMNS))}) RETURNING id''', values)
         
         incident_id = c.fetchone()['id']
+        incident_stats.record_incidents(c, company_id,
+                                        [(values[INCIDENT_TYPE_INDEX], values[INCIDENT_DATE_INDEX])])
+        bump_data_version(c, company_id)
         conn.commit()
-        conn.close()
         
         return jsonify({
             'success': True,
@@ -656,39 +935,265 @@ def create_incident():
         }), 201
         
     except Exception as e:
-        conn.close()
+        conn.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
-@app.route('/api/incidents', methods=['GET'])
+INCIDENT_COLUMNS = (
+    'company_id', 'location_id',
+    'incident_date', 'incident_time', 'exact_location',
+    'violence_type', 'offender_classification',
+    'description', 'circumstances', 'violence_nature',
+    'consequences', 'law_enforcement_contacted', 'injuries', 'protective_measures',
+    'employees_involved', 'corrective_actions',
+    'logged_by_name', 'logged_by_title', 'log_date',
+    'created_at',
+)
+INCIDENT_DATE_INDEX = INCIDENT_COLUMNS.index('incident_date')
+INCIDENT_TYPE_INDEX = INCIDENT_COLUMNS.index('violence_type')
+# What incident reads return: every column except the search_vector behind
+# GET /api/incidents/search.
+INCIDENT_FIELDS = ', '.join(('id',) + INCIDENT_COLUMNS)
+
+def incident_values(data, company_id, now):
+    """Validate one incident record and return its INCIDENT_COLUMNS values.
+
+    Shared by create_incident and the bulk import; raises bulk_import.RowError.
+    """
+    return (
+        company_id,
+        bulk_import.parse_text(data, 'location_id') or 'main',
+        bulk_import.parse_date(data, 'incident_date'),
+        bulk_import.parse_time(data, 'incident_time'),
+        bulk_import.parse_text(data, 'exact_location', required=True),
+        bulk_import.parse_text(data, 'violence_type', required=True),
+        bulk_import.parse_text(data, 'offender_classification', required=True),
+        bulk_import.parse_text(data, 'description', required=True),
+        bulk_import.parse_text(data, 'circumstances'),
+        bulk_import.parse_text(data, 'violence_nature'),
+        bulk_import.parse_text(data, 'consequences'),
+        bulk_import.parse_flag(data, 'law_enforcement_contacted'),
+        bulk_import.parse_text(data, 'injuries'),
+        bulk_import.parse_text(data, 'protective_measures'),
+        json.dumps(bulk_import.parse_list(data, 'employees_involved')),
+        bulk_import.parse_text(data, 'corrective_actions'),
+        bulk_import.parse_text(data, 'logged_by_name', required=True),
+        bulk_import.parse_text(data, 'logged_by_title', required=True),
+        now,
+        now,
+    )
+
+# Rows accepted by one bulk import request.
+BULK_IMPORT_MAX_ROWS = int(os.environ.get('BULK_IMPORT_MAX_ROWS', 50000))
+
+@app.route('/api/incidents/bulk', methods=['POST'])
 @login_required
 @subscription_required
-def get_incidents():
-    """Get all incidents for a company"""
+def import_incidents():
+    """Import many incidents from a CSV or NDJSON upload, all or nothing.
+
+    CSV headers and NDJSON keys are the POST /api/incidents field names. Rows
+    are streamed into COPY; any invalid row rolls the whole import back and
+    the response lists every rejected row. ?dry_run=1 only validates.
+    """
     company_id = session['company_id']
+    now = datetime.now(timezone.utc)
+    by_type_and_date = []
+    return run_bulk_import(
+        'incidents', INCIDENT_COLUMNS,
+        lambda record: incident_values(record, company_id, now),
+        on_row=lambda record, values: by_type_and_date.append(
+            (values[INCIDENT_TYPE_INDEX], values[INCIDENT_DATE_INDEX])),
+        before_commit=lambda c: (incident_stats.record_incidents(c, company_id, by_type_and_date),
+                                 bump_data_version(c, company_id)),
+    )
+
+def run_bulk_import(table, columns, to_values, on_row=None, before_commit=None):
+    """Shared body of the bulk import endpoints; see bulk_import.
+
+    With ?dry_run=1 the upload is only validated; no table is touched.
+    """
+    if request.mimetype not in bulk_import.CSV_CONTENT_TYPES + bulk_import.NDJSON_CONTENT_TYPES:
+        return jsonify({'success': False, 'error': 'Send text/csv or application/x-ndjson'}), 415
+    dry_run = request.args.get('dry_run', '').lower() in bulk_import.TRUE_VALUES
+    rows = bulk_import.read_records(request.stream, request.mimetype, BULK_IMPORT_MAX_ROWS)
+    too_many = {'success': False, 'error': f'Imports are limited to {BULK_IMPORT_MAX_ROWS} rows; split the file'}
     
-    conn = get_db()
+    if dry_run:
+        try:
+            valid, errors = bulk_import.import_rows(None, rows, to_values)
+        except bulk_import.TooManyRows:
+            return jsonify(too_many), 413
+        except bulk_import.UnreadableUpload as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if errors:
+            return jsonify({'success': False, 'dry_run': True, 'error': 'Some rows are invalid',
+                            **bulk_import.error_summary(errors)}), 422
+        return jsonify({'success': True, 'dry_run': True, 'valid': valid})
+    
+    conn = request_db()
     c = conn.cursor()
-    c.execute('''SELECT * FROM incidents
-                 WHERE company_id = %s
-                 ORDER BY incident_date DESC, incident_time DESC''', (company_id,))
+    try:
+        with c.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            imported, errors = bulk_import.import_rows(copy, rows, to_values, on_row)
+        if errors:
+            conn.rollback()
+            return jsonify({'success': False, 'error': 'No rows were imported',
+                            **bulk_import.error_summary(errors)}), 422
+        if before_commit:
+            before_commit(c)
+        conn.commit()
+    except bulk_import.TooManyRows:
+        conn.rollback()
+        return jsonify(too_many), 413
+    except bulk_import.UnreadableUpload as e:
+        conn.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except psycopg.DataError as e:
+        # A value that passed validation but that Postgres still refuses.
+        conn.rollback()
+        return jsonify({'success': False, 'error': f'No rows were imported: {e.diag.message_primary or e}'}), 422
     
-    incidents = [dict(row) for row in c.fetchall()]
-    conn.close()
+    return jsonify({'success': True, 'imported': imported}), 201
+
+@app.route('/api/incidents', methods=['GET'])
+@login_required
+@subscription_required
+@data_versioned
+def get_incidents():
+    """Get incidents for a company, newest first.
+
+    Without ?limit/?cursor this returns the full list as before; with them it
+    returns one keyset page plus `next_cursor` (null on the last page).
+    """
+    company_id = session['company_id']
+    try:
+        page = read_page_args(INCIDENT_SORT_KEY)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
-    return jsonify({'success': True, 'incidents': incidents})
+    conn = request_db()
+    c = conn.cursor()
+    c.execute(*incident_list_query(company_id, page))
+    return jsonify(incident_list_payload(c.fetchall(), page))
+
+def incident_list_query(company_id, page):
+    """The statement and parameters of GET /api/incidents for read_page_args' `page`."""
+    if page is None:
+        return (f'''SELECT {INCIDENT_FIELDS} FROM incidents
+                   WHERE company_id = %s
+                   ORDER BY incident_date DESC, incident_time DESC, id DESC''', (company_id,))
+    if page[1] is None:
+        return (f'''SELECT {INCIDENT_FIELDS} FROM incidents
+                   WHERE company_id = %s
+                   ORDER BY incident_date DESC, incident_time DESC, id DESC
+                   LIMIT %s''', (company_id, page[0] + 1))
+    # The row comparison lets Postgres seek straight to the cursor position
+    # instead of counting past an OFFSET.
+    return (f'''SELECT {INCIDENT_FIELDS} FROM incidents
+               WHERE company_id = %s
+                 AND (incident_date, incident_time, id) < (%s, %s, %s)
+               ORDER BY incident_date DESC, incident_time DESC, id DESC
+               LIMIT %s''', (company_id, *page[1], page[0] + 1))
+
+def incident_list_payload(rows, page):
+    incidents = [dict(row) for row in rows]
+    if page is None:
+        return {'success': True, 'incidents': incidents}
+    next_cursor = next_page_cursor(incidents, page[0], ('incident_date', 'incident_time', 'id'))
+    return {'success': True, 'incidents': incidents, 'next_cursor': next_cursor}
+
+SEARCH_QUERY_MAX_LENGTH = 200
+SEARCH_SORT_KEY = (float, cursor_id)
+# ts_headline marks matches with these control characters, which cannot come
+# from a form field; the payload escapes the text and then turns them into
+# <mark> tags, so highlighting never lets incident text through as HTML.
+SEARCH_HIGHLIGHT_START = '\x02'
+SEARCH_HIGHLIGHT_STOP = '\x03'
+SEARCH_HEADLINE_OPTIONS = (f'StartSel={SEARCH_HIGHLIGHT_START}, StopSel={SEARCH_HIGHLIGHT_STOP}, '
+                           'MaxFragments=3, MaxWords=20, MinWords=8, FragmentDelimiter=" ... "')
+# The narrative columns behind incidents.search_vector, in the order their
+# matches are shown.
+SEARCH_HEADLINE_COLUMNS = ('description', 'violence_nature', 'exact_location', 'circumstances', 'corrective_actions')
+
+@app.route('/api/incidents/search', methods=['GET'])
+@login_required
+@subscription_required
+@data_versioned
+def search_incidents():
+    """Full-text search of the company's incident narratives, best match first.
+
+    ?q= takes web search syntax ("quoted phrases", or, -excluded). Each result
+    carries a `headline` of the matching passages with <mark> around the
+    matched words. Always paged: ?limit= (default DEFAULT_PAGE_SIZE) and the
+    `next_cursor` of the previous page.
+    """
+    terms = request.args.get('q', '').strip()
+    if not terms:
+        return jsonify({'success': False, 'error': 'q is required'}), 400
+    if len(terms) > SEARCH_QUERY_MAX_LENGTH:
+        return jsonify({'success': False,
+                        'error': f'q must be at most {SEARCH_QUERY_MAX_LENGTH} characters'}), 400
+    try:
+        page = read_page_args(SEARCH_SORT_KEY) or (DEFAULT_PAGE_SIZE, None)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    conn = request_db()
+    c = conn.cursor()
+    c.execute(*incident_search_query(session['company_id'], terms, page))
+    return jsonify(incident_search_payload(c.fetchall(), page))
+
+def incident_search_query(company_id, terms, page):
+    """The statement and parameters of GET /api/incidents/search."""
+    after = ''
+    params = [terms, company_id]
+    if page[1] is not None:
+        # A real reads into a float exactly, so the cursor's rank casts back to the same real.
+        after = 'AND (ts_rank(incidents.search_vector, query), incidents.id) < (%s::real, %s)'
+        params += page[1]
+    # incidents_search_idx finds the matches; headlines are only built for
+    # the page, since ts_headline re-parses each narrative.
+    fields = ', '.join(f'incidents.{field}' for field in INCIDENT_FIELDS.split(', '))
+    narrative = ', '.join(f'incidents.{column}' for column in SEARCH_HEADLINE_COLUMNS)
+    return (f'''WITH matches AS (
+                    SELECT incidents.id, ts_rank(incidents.search_vector, query) AS rank, query
+                    FROM incidents, websearch_to_tsquery('english', %s) AS query
+                    WHERE incidents.company_id = %s
+                      AND incidents.search_vector @@ query
+                      {after}
+                    ORDER BY rank DESC, incidents.id DESC
+                    LIMIT %s
+                )
+                SELECT {fields}, matches.rank,
+                       ts_headline('english',
+                                   translate(concat_ws(' ... ', {narrative}), %s, ''),
+                                   matches.query, %s) AS headline
+                FROM matches
+                JOIN incidents ON incidents.id = matches.id
+                ORDER BY matches.rank DESC, matches.id DESC''',
+            (*params, page[0] + 1, SEARCH_HIGHLIGHT_START + SEARCH_HIGHLIGHT_STOP, SEARCH_HEADLINE_OPTIONS))
+
+def incident_search_payload(rows, page):
+    incidents = [dict(row) for row in rows]
+    next_cursor = next_page_cursor(incidents, page[0], ('rank', 'id'))
+    for incident in incidents:
+        del incident['rank']
+        incident['headline'] = (html.escape(incident['headline'])
+                                .replace(SEARCH_HIGHLIGHT_START, '<mark>')
+                                .replace(SEARCH_HIGHLIGHT_STOP, '</mark>'))
+    return {'success': True, 'incidents': incidents, 'next_cursor': next_cursor}
 
 @app.route('/api/incidents/<int:incident_id>', methods=['GET'])
 @login_required
 @subscription_required
 def get_incident(incident_id):
     """Get a specific incident"""
-    conn = get_db()
+    conn = request_db()
     c = conn.cursor()
-    c.execute('SELECT * FROM incidents WHERE id = %s AND company_id = %s', 
+    c.execute(f'SELECT {INCIDENT_FIELDS} FROM incidents WHERE id = %s AND company_id = %s',
               (incident_id, session['company_id']))
     
     incident = c.fetchone()
-    conn.close()
     
     if incident:
         return jsonify({'success': True, 'incident': dict(incident)})
@@ -700,30 +1205,21 @@ def get_incident(incident_id):
 @subscription_required
 def create_training_record():
     """Log employee training completion"""
-    data = request.json
+    data = request.json or {}
+    try:
+        values = training_values(data, session['company_id'], datetime.now(timezone.utc))
+    except bulk_import.RowError as e:
+        return jsonify({'success': False, 'error': str(e), 'field': e.field}), 400
     
-    conn = get_db()
+    conn = request_db()
     c = conn.cursor()
     
-    c.execute('''INSERT INTO training_records (
-        company_id, training_date, training_type,
-        trainer_name, topic_description, attendee_count,
-        documentation_url, created_at
-    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id''',
-    (
-        session['company_id'],
-        data['training_date'],
-        data['training_type'],
-        data.get('trainer_name', ''),
-        data.get('topic_description', ''),
-        data.get('attendee_count', 0),
-        data.get('documentation_url', ''),
-        datetime.now().isoformat()
-    ))
+    c.execute(f'''INSERT INTO training_records ({', '.join(TRAINING_COLUMNS)})
+                 VALUES ({', '.join(['%s'] * len(TRAINING_COLUMNS))}) RETURNING id''', values)
     
     training_id = c.fetchone()['id']
+    bump_data_version(c, session['company_id'])
     conn.commit()
-    conn.close()
     
     return jsonify({
         'success': True,
@@ -731,200 +1227,485 @@ def create_training_record():
         'message': 'Training record created'
     }), 201
 
+TRAINING_COLUMNS = (
+    'company_id', 'training_date', 'training_type',
+    'trainer_name', 'topic_description', 'attendee_count',
+    'documentation_url', 'created_at',
+)
+
+def training_values(data, company_id, now):
+    """Validate one training record and return its TRAINING_COLUMNS values.
+
+    Shared by create_training_record and the bulk import; raises bulk_import.RowError.
+    """
+    attendee_count = bulk_import.parse_int(data, 'attendee_count')
+    if attendee_count is not None and attendee_count < 0:
+        raise bulk_import.RowError('attendee_count', 'attendee_count cannot be negative')
+    return (
+        company_id,
+        bulk_import.parse_date(data, 'training_date'),
+        bulk_import.parse_text(data, 'training_type', required=True),
+        bulk_import.parse_text(data, 'trainer_name'),
+        bulk_import.parse_text(data, 'topic_description'),
+        attendee_count or 0,
+        bulk_import.parse_text(data, 'documentation_url'),
+        now,
+    )
+
+@app.route('/api/training/bulk', methods=['POST'])
+@login_required
+@subscription_required
+def import_training_records():
+    """Import a roster of training sessions from CSV or NDJSON, all or nothing.
+
+    Same fields as POST /api/training; ?dry_run=1 validates without saving.
+    """
+    company_id = session['company_id']
+    now = datetime.now(timezone.utc)
+    return run_bulk_import('training_records', TRAINING_COLUMNS,
+                           lambda record: training_values(record, company_id, now),
+                           before_commit=lambda c: bump_data_version(c, company_id))
+
 @app.route('/api/training', methods=['GET'])
 @login_required
 @subscription_required
+@data_versioned
 def get_training_records():
-    """Get training records for a company"""
+    """Get training records for a company, newest first (paged like get_incidents)"""
     company_id = session['company_id']
+    try:
+        page = read_page_args(TRAINING_SORT_KEY)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
-    conn = get_db()
+    conn = request_db()
     c = conn.cursor()
-    c.execute('''SELECT * FROM training_records
-                 WHERE company_id = %s
-                 ORDER BY training_date DESC''', (company_id,))
-    
-    records = [dict(row) for row in c.fetchall()]
-    conn.close()
-    
-    return jsonify({'success': True, 'training_records': records})
+    c.execute(*training_list_query(company_id, page))
+    return jsonify(training_list_payload(c.fetchall(), page))
+
+def training_list_query(company_id, page):
+    if page is None:
+        return ('''SELECT * FROM training_records
+                   WHERE company_id = %s
+                   ORDER BY training_date DESC, id DESC''', (company_id,))
+    if page[1] is None:
+        return ('''SELECT * FROM training_records
+                   WHERE company_id = %s
+                   ORDER BY training_date DESC, id DESC
+                   LIMIT %s''', (company_id, page[0] + 1))
+    return ('''SELECT * FROM training_records
+               WHERE company_id = %s
+                 AND (training_date, id) < (%s, %s)
+               ORDER BY training_date DESC, id DESC
+               LIMIT %s''', (company_id, *page[1], page[0] + 1))
+
+def training_list_payload(rows, page):
+    records = [dict(row) for row in rows]
+    if page is None:
+        return {'success': True, 'training_records': records}
+    next_cursor = next_page_cursor(records, page[0], ('training_date', 'id'))
+    return {'success': True, 'training_records': records, 'next_cursor': next_cursor}
 
 @app.route('/api/stats', methods=['GET'])
 @login_required
 @subscription_required
+@data_versioned
 def get_stats():
     """Get incident statistics for dashboard"""
     company_id = session['company_id']
     
-    conn = get_db()
+    # Read from the rollup maintained by create_incident, so the cost does not
+    # grow with the tenant's incident history.
+    conn = request_db()
     c = conn.cursor()
+    stats = incident_stats.load_stats(c, company_id, stats_window_start())
     
-    # Total incidents
-    c.execute('SELECT COUNT(*) as count FROM incidents WHERE company_id = %s', (company_id,))
-    total = c.fetchone()['count']
-    
-    # By violence type
-    c.execute('''SELECT violence_type, COUNT(*) as count FROM incidents
-                 WHERE company_id = %s
-                 GROUP BY violence_type''', (company_id,))
-    by_type = [dict(row) for row in c.fetchall()]
+    return jsonify({'success': True, 'stats': stats})
+
+def stats_window_start():
+    """First day counted in /api/stats' recent_30_days."""
+    return (datetime.now() - timedelta(days=30)).date()
+
+# Rows fetched per round trip by an export's server-side cursor; each batch
+# becomes one chunk of the response.
+EXPORT_FETCH_BATCH_SIZE = 500
+
+# Exported columns, in the order bulk import accepts them back.
+INCIDENT_EXPORT_COLUMNS = ('id',) + tuple(column for column in INCIDENT_COLUMNS if column != 'company_id')
+TRAINING_EXPORT_COLUMNS = ('id',) + tuple(column for column in TRAINING_COLUMNS if column != 'company_id')
+
+@app.route('/api/export/incidents', methods=['GET'])
+@login_required
+@subscription_required
+def export_incidents():
+    """Stream every incident as CSV or NDJSON, oldest first; ?from=/&to= bound incident_date."""
+    return stream_export('incidents', INCIDENT_EXPORT_COLUMNS, 'incident_date',
+                         ('incident_date', 'incident_time', 'id'), json_columns=('employees_involved',))
+
+@app.route('/api/export/training', methods=['GET'])
+@login_required
+@subscription_required
+def export_training_records():
+    """Stream every training record as CSV or NDJSON; ?from=/&to= bound training_date."""
+    return stream_export('training_records', TRAINING_EXPORT_COLUMNS, 'training_date',
+                         ('training_date', 'id'))
+
+def stream_export(table, columns, date_column, order_by, json_columns=()):
+    """Build a chunked export response for the signed-in company.
+
+    Rows are read through a named (server-side) cursor a batch at a time and
+    written out as they arrive, so memory use does not depend on how many
+    rows the company has. The pooled connection stays checked out until the
+    client has received the last chunk.
+    """
+    from flask import Response
+    import csv
+    import io
     
-    # Recent incidents (last 30 days)
-    thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()[:10]
-    c.execute('''SELECT COUNT(*) as count FROM incidents
-                 WHERE company_id = %s AND incident_date >= %s''',
-                 (company_id, thirty_days_ago))
-    recent = c.fetchone()['count']
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'error': 'format must be csv or ndjson'}), 400
+    conditions = ['company_id = %s']
+    params = [session['company_id']]
+    for argument, operator in (('from', '>='), ('to', '<=')):
+        if request.args.get(argument):
+            try:
+                params.append(date.fromisoformat(request.args[argument]))
+            except ValueError:
+                return jsonify({'success': False, 'error': f'{argument} must be a date like 2026-01-31'}), 400
+            conditions.append(f'{date_column} {operator} %s')
+    query = f'''SELECT {', '.join(columns)} FROM {table}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {', '.join(order_by)}'''
     
-    conn.close()
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        conn = get_db()
+        rows = conn.cursor(name=f'{table}_export')
+        try:
+            rows.execute(query, params)
+            if export_format == 'csv':
+                writer.writerow(columns)
+            while True:
+                batch = rows.fetchmany(EXPORT_FETCH_BATCH_SIZE)
+                if not batch:
+                    break
+                for row in batch:
+                    record = {column: format_record_value(row[column]) for column in columns}
+                    if export_format == 'csv':
+                        writer.writerow(record.values())
+                    else:
+                        for column in json_columns:
+                            try:
+                                record[column] = json.loads(record[column] or '[]')
+                            except ValueError:
+                                pass
+                        buffer.write(json.dumps(record) + '\n')
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            rows.close()
+            conn.close()
     
-    return jsonify({
-        'success': True,
-        'stats': {
-            'total_incidents': total,
-            'by_type': by_type,
-            'recent_30_days': recent
-        }
-    })
+    extension, mimetype = {'csv': ('csv', 'text/csv'), 'ndjson': ('ndjson', 'application/x-ndjson')}[export_format]
+    filename = f"{table}_{datetime.now().strftime('%Y%m%d')}.{extension}"
+    return Response(generate(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 @app.route('/api/report/pdf', methods=['GET'])
 @login_required
 @subscription_required
 def generate_pdf_report():
-    """Generate a PDF summary of incident records entered in CompCleared."""
-    from io import BytesIO
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from flask import send_file
-    
-    company_id = session['company_id']
-    
-    conn = get_db()
+    """Generate a PDF summary of incident records entered in CompCleared.
+
+    The rendered PDF is cached under a hash of its inputs, so a repeat download
+    costs one small query (or a 304). On a miss, incidents are read through a
+    server-side cursor in batches and laid out as reportlab consumes them, so
+    worker memory does not grow with the number of incidents recorded.
+    """
+    conn = request_db()
+    company = load_incident_report_company(conn, session['company_id'])
+    # The report is dated, so a PDF cached on an earlier day is not reused.
+    generated_on = date.today()
+    etag = report_cache.key('incident-report', REPORT_TEMPLATE_VERSION, company, generated_on)
+    return send_cached_report(etag, incident_report_filename(company, generated_on),
+                              lambda output: write_incident_report(conn, company, generated_on, output))
+
+def load_incident_report_company(conn, company_id):
+    """Open the report's snapshot and return the company with its change markers.
+
+    The markers change whenever an incident is logged (incidents are
+    append-only), which makes the returned dict a complete cache key.
+    """
+    # The isolation level must be set by a transaction's first statement; end
+    # the one the request context's lookup opened (a no-op when idle).
+    conn.rollback()
+    c = conn.cursor()
+    # One snapshot for the cache key, the total in the header and the rows.
+    c.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+    c.execute('''SELECT id, name,
+                        (SELECT MAX(id) FROM incidents
+                         WHERE company_id = companies.id) AS last_incident_id,
+                        (SELECT COALESCE(SUM(incident_count), 0) FROM incident_type_counts
+                         WHERE company_id = companies.id) AS rollup_incident_count
+                 FROM companies WHERE id = %s''', (company_id,))
+    return dict(c.fetchone())
+
+def write_incident_report(conn, company, generated_on, output):
+    """Render the incident summary for `company`, dated `generated_on`, inside the snapshot opened above."""
     c = conn.cursor()
+    c.execute('SELECT COUNT(*) AS count FROM incidents WHERE company_id = %s', (company['id'],))
+    incident_count = c.fetchone()['count']
+    # Stream incidents through a named (server-side) cursor
+    incidents = conn.cursor(name='incident_report')
+    incidents.itersize = REPORT_FETCH_BATCH_SIZE
+    try:
+        incidents.execute(f'''SELECT {INCIDENT_FIELDS} FROM incidents
+                             WHERE company_id = %s
+                             ORDER BY incident_date DESC, incident_time DESC, id DESC''', (company['id'],))
+        render_incident_report(company, incident_count, incidents, generated_on, output)
+    finally:
+        incidents.close()
+
+def incident_report_filename(company, generated_on):
+    return f"SB553_Incident_Report_{company['name'].replace(' ', '_')}_{generated_on.strftime('%Y%m%d')}.pdf"
+
+# Rows fetched per round trip by the report's server-side cursor, and the size
+# past which a report being rendered is spooled to a temporary file.
+REPORT_FETCH_BATCH_SIZE = 200
+REPORT_SPOOL_MAX_BYTES = 4 * 1024 * 1024
+
+# Bump whenever report layout or copy changes so cached PDFs are not reused.
+REPORT_TEMPLATE_VERSION = 2
+report_cache = ReportCache(
+    os.environ.get('REPORT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'compcleared-report-cache'),
+    int(os.environ.get('REPORT_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+)
+
+def send_cached_report(etag, download_name, render):
+    """Send the report cached under `etag`, calling render(output) on a miss.
+
+    The cache key is a strong ETag: a matching If-None-Match gets a 304
+    without touching the cache, and browsers are told to revalidate.
+    """
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
     
-    # Get company info
-    c.execute('SELECT * FROM companies WHERE id = %s', (company_id,))
-    company = dict(c.fetchone())
+    source = report_cache.get(etag)
+    if source is not None:
+        try:
+            return send_report_file(source, download_name, etag)
+        except FileNotFoundError:
+            # Another worker evicted it after get(); render it again.
+            pass
     
-    # Get all incidents
-    c.execute('''SELECT * FROM incidents
-                 WHERE company_id = %s
-                 ORDER BY incident_date DESC''', (company_id,))
-    incidents = [dict(row) for row in c.fetchall()]
-    conn.close()
+    buffer = tempfile.SpooledTemporaryFile(max_size=REPORT_SPOOL_MAX_BYTES)
+    render(buffer)
+    buffer.seek(0)
+    try:
+        source = report_cache.put(etag, buffer)
+    except OSError as e:
+        # A full or read-only cache disk must not break downloads.
+        print(f"⚠️  Report cache unavailable: {e}")
+        source = None
+    if source is not None:
+        try:
+            response = send_report_file(source, download_name, etag)
+        except FileNotFoundError:
+            pass
+        else:
+            buffer.close()
+            return response
+    # Not cacheable, or already evicted again: send the rendered copy.
+    buffer.seek(0)
+    return send_report_file(buffer, download_name, etag)
+
+def send_report_file(source, download_name, etag):
+    from flask import send_file
     
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+    response = send_file(
+        source,
+        as_attachment=True,
+        download_name=download_name,
+        mimetype='application/pdf',
+        etag=etag,
+        conditional=True
+    )
+    response.cache_control.private = True
+    return response
+
+class StreamedStory(list):
+    """A platypus story that pulls flowables from an iterator as it is consumed.
+
+    doc.build() re-checks len(story) before laying out each flowable and only
+    looks a few flowables ahead (keepWithNext), so topping the list up from
+    __len__ keeps just a small window of flowables alive at any time.
+    """
+
+    def __init__(self, flowables, window=64):
+        super().__init__()
+        self._source = iter(flowables)
+        self._window = window
+        self._fill()
+
+    def _fill(self):
+        while self._source is not None and list.__len__(self) < self._window:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+@lru_cache(maxsize=None)
+def incident_report_styles():
+    """Paragraph and table styles for the incident summary, built once per process."""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
     
     styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, spaceAfter=20, textColor=colors.HexColor('#0f172a'))
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=14, spaceBefore=15, spaceAfter=10, textColor=colors.HexColor('#2563EB'))
-    body_style = ParagraphStyle('Body', parent=styles['Normal'], fontSize=10, spaceAfter=8)
-    
-    story = []
+    return SimpleNamespace(
+        title=ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, spaceAfter=20, textColor=colors.HexColor('#0f172a')),
+        heading=ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=14, spaceBefore=15, spaceAfter=10, textColor=colors.HexColor('#2563EB')),
+        body=ParagraphStyle('Body', parent=styles['Normal'], fontSize=10, spaceAfter=8),
+        incident_table=TableStyle([
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#475569')),
+            ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#475569')),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]),
+    )
+
+def render_incident_report(company, incident_count, incidents, generated_on, output):
+    """Write the incident record summary PDF for `company` to `output`.
+
+    `incidents` may be any iterable of incident rows (newest first); it is
+    consumed lazily while pages are laid out.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
     
-    # Header
-    story.append(Paragraph("WORKPLACE VIOLENCE INCIDENT RECORD SUMMARY", title_style))
-    story.append(Paragraph(f"Customer organization: {company['name']}", body_style))
-    story.append(Paragraph(f"Report Generated: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", body_style))
-    story.append(Paragraph(f"Total Incidents Recorded: {len(incidents)}", body_style))
-    story.append(Spacer(1, 20))
+    doc = SimpleDocTemplate(output, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72,
+                            pageCompression=1)
     
-    # Record summary
-    story.append(Paragraph("INCIDENT RECORD SUMMARY", heading_style))
-    story.append(Paragraph(
-        "This summary includes only incident records entered in CompCleared and is not a complete record of every incident. "
-        "It is provided for record organization and is not legal advice.",
-        body_style
-    ))
-    story.append(Spacer(1, 20))
+    styles = incident_report_styles()
+    title_style = styles.title
+    heading_style = styles.heading
+    body_style = styles.body
+    incident_table_style = styles.incident_table
     
-    # Incidents
-    if incidents:
-        story.append(Paragraph("INCIDENT RECORDS", heading_style))
+    def story():
+        # Header
+        yield Paragraph("WORKPLACE VIOLENCE INCIDENT RECORD SUMMARY", title_style)
+        yield Paragraph(f"Customer organization: {company['name']}", body_style)
+        yield Paragraph(f"Report Generated: {generated_on.strftime('%B %d, %Y')}", body_style)
+        yield Paragraph(f"Total Incidents Recorded: {incident_count}", body_style)
+        yield Spacer(1, 20)
         
-        for i, incident in enumerate(incidents, 1):
-            story.append(Paragraph(f"<b>Incident #{i}</b>", body_style))
-            
-            # Create table for incident details
-            data = [
-                ['Date:', incident.get('incident_date', 'N/A'), 'Time:', incident.get('incident_time', 'N/A')],
-                ['Location:', incident.get('exact_location', 'N/A'), 'Type:', incident.get('violence_type', 'N/A')],
-                ['Offender:', incident.get('offender_classification', 'N/A'), 'Law Enforcement:', 'Yes' if incident.get('law_enforcement_contacted') else 'No'],
-            ]
-            
-            t = Table(data, colWidths=[1.2*inch, 2*inch, 1.2*inch, 2*inch])
-            t.setStyle(TableStyle([
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-                ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#475569')),
-                ('TEXTCOLOR', (2, 0), (2, -1), colors.HexColor('#475569')),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            story.append(t)
+        # Record summary
+        yield Paragraph("INCIDENT RECORD SUMMARY", heading_style)
+        yield Paragraph(
+            "This summary includes only incident records entered in CompCleared and is not a complete record of every incident. "
+            "It is provided for record organization and is not legal advice.",
+            body_style
+        )
+        yield Spacer(1, 20)
+        
+        # Incidents
+        if incident_count:
+            yield Paragraph("INCIDENT RECORDS", heading_style)
             
-            story.append(Paragraph(f"<b>Description:</b> {incident.get('description', 'N/A')}", body_style))
-            if incident.get('corrective_actions'):
-                story.append(Paragraph(f"<b>Corrective Actions:</b> {incident.get('corrective_actions')}", body_style))
-            story.append(Paragraph(f"<i>Logged by: {incident.get('logged_by_name', 'N/A')}, {incident.get('logged_by_title', 'N/A')} on {incident.get('log_date', 'N/A')}</i>", body_style))
-            story.append(Spacer(1, 15))
-    else:
-        story.append(Paragraph("No incidents have been recorded.", body_style))
-    
-    # Footer
-    story.append(Spacer(1, 30))
-    story.append(Paragraph("─" * 50, body_style))
-    story.append(Paragraph(
-        "<i>This report was generated by CompCleared to help organize incident records. It is not legal advice.</i>",
-        body_style
-    ))
-    
-    doc.build(story)
-    buffer.seek(0)
-    
-    filename = f"SB553_Incident_Report_{company['name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
+            for i, incident in enumerate(incidents, 1):
+                incident = {key: format_record_value(value) for key, value in incident.items()}
+                yield Paragraph(f"<b>Incident #{i}</b>", body_style)
+                
+                # Create table for incident details
+                data = [
+                    ['Date:', incident.get('incident_date', 'N/A'), 'Time:', incident.get('incident_time', 'N/A')],
+                    ['Location:', incident.get('exact_location', 'N/A'), 'Type:', incident.get('violence_type', 'N/A')],
+                    ['Offender:', incident.get('offender_classification', 'N/A'), 'Law Enforcement:', 'Yes' if incident.get('law_enforcement_contacted') else 'No'],
+                ]
+                
+                t = Table(data, colWidths=[1.2*inch, 2*inch, 1.2*inch, 2*inch])
+                t.setStyle(incident_table_style)
+                yield t
+                
+                yield Paragraph(f"<b>Description:</b> {incident.get('description', 'N/A')}", body_style)
+                if incident.get('corrective_actions'):
+                    yield Paragraph(f"<b>Corrective Actions:</b> {incident.get('corrective_actions')}", body_style)
+                yield Paragraph(f"<i>Logged by: {incident.get('logged_by_name', 'N/A')}, {incident.get('logged_by_title', 'N/A')} on {incident.get('log_date', 'N/A')}</i>", body_style)
+                yield Spacer(1, 15)
+        else:
+            yield Paragraph("No incidents have been recorded.", body_style)
+        
+        # Footer
+        yield Spacer(1, 30)
+        yield Paragraph("─" * 50, body_style)
+        yield Paragraph(
+            "<i>This report was generated by CompCleared to help organize incident records. It is not legal advice.</i>",
+            body_style
+        )
     
-    return send_file(
-        buffer,
-        as_attachment=True,
-        download_name=filename,
-        mimetype='application/pdf'
-    )
+    doc.build(StreamedStory(story()))
 
 @app.route('/api/report/plan', methods=['GET'])
 @login_required
 @subscription_required
 def generate_written_plan():
     """Generate a custom Written Workplace Violence Prevention Plan (WVPP)"""
-    from io import BytesIO
+    company = g.company
+    
+    # The plan depends only on the company name and the template.
+    etag = report_cache.key('written-plan', REPORT_TEMPLATE_VERSION, company['name'])
+    return send_cached_report(etag, written_plan_filename(company),
+                              lambda output: render_written_plan(company, output))
+
+def written_plan_filename(company):
+    return f"SB553_Written_Plan_{company['name'].replace(' ', '_')}.pdf"
+
+@lru_cache(maxsize=None)
+def written_plan_styles():
+    """Paragraph styles for the written plan template, built once per process."""
     from reportlab.lib import colors
-    from reportlab.lib.pagesizes import letter
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, ListFlowable, ListItem
-    from flask import send_file
-    
-    company_id = session['company_id']
     
-    conn = get_db()
-    c = conn.cursor()
-    c.execute('SELECT * FROM companies WHERE id = %s', (company_id,))
-    company = dict(c.fetchone())
-    conn.close()
+    styles = getSampleStyleSheet()
+    return SimpleNamespace(
+        title=ParagraphStyle('Title', parent=styles['Heading1'], fontSize=24, spaceAfter=20, alignment=1, textColor=colors.HexColor('#0f172a')),
+        subtitle=ParagraphStyle('Subtitle', parent=styles['Heading2'], fontSize=14, spaceAfter=30, alignment=1, textColor=colors.HexColor('#64748B')),
+        heading=ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=16, spaceBefore=20, spaceAfter=12, textColor=colors.HexColor('#2563EB'), borderPadding=5, thickness=1),
+        body=ParagraphStyle('Body', parent=styles['Normal'], fontSize=11, spaceAfter=10, leading=14),
+        item=ParagraphStyle('Item', parent=styles['Normal'], fontSize=11, leftIndent=20, spaceAfter=8),
+    )
+
+def render_written_plan(company, output):
+    """Write the written plan template PDF for `company` to `output`."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
     
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+    doc = SimpleDocTemplate(output, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
     
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=24, spaceAfter=20, alignment=1, textColor=colors.HexColor('#0f172a'))
-    subtitle_style = ParagraphStyle('Subtitle', parent=styles['Heading2'], fontSize=14, spaceAfter=30, alignment=1, textColor=colors.HexColor('#64748B'))
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=16, spaceBefore=20, spaceAfter=12, textColor=colors.HexColor('#2563EB'), borderPadding=5, thickness=1)
-    body_style = ParagraphStyle('Body', parent=styles['Normal'], fontSize=11, spaceAfter=10, leading=14)
-    item_style = ParagraphStyle('Item', parent=styles['Normal'], fontSize=11, leftIndent=20, spaceAfter=8)
+    styles = written_plan_styles()
+    title_style = styles.title
+    subtitle_style = styles.subtitle
+    heading_style = styles.heading
+    body_style = styles.body
+    item_style = styles.item
     
     story = []
     
@@ -994,17 +1775,126 @@ def generate_written_plan():
     story.append(Paragraph("• The specific details of this written prevention plan.", item_style))
     
     doc.build(story)
-    buffer.seek(0)
+
+def prewarm_reports():
+    """Import reportlab and build report styles now rather than on the first download."""
+    from reportlab.pdfbase import pdfmetrics
     
-    filename = f"SB553_Written_Plan_{company['name'].replace(' ', '_')}.pdf"
+    # platypus is the bulk of reportlab's import time.
+    importlib.import_module('reportlab.platypus')
+    incident_report_styles()
+    written_plan_styles()
+    for font_name in ('Helvetica', 'Helvetica-Bold'):
+        pdfmetrics.getFont(font_name)
+
+# Report types that can be rendered by the background worker (report_worker).
+REPORT_KINDS = ('incident_summary', 'written_plan')
+
+def render_report(conn, company_id, kind, output):
+    """Render report `kind` for a company into `output`; returns its download name."""
+    if kind == 'incident_summary':
+        company = load_incident_report_company(conn, company_id)
+        generated_on = date.today()
+        write_incident_report(conn, company, generated_on, output)
+        conn.rollback()
+        return incident_report_filename(company, generated_on)
+    if kind == 'written_plan':
+        c = conn.cursor()
+        c.execute('SELECT id, name FROM companies WHERE id = %s', (company_id,))
+        company = dict(c.fetchone())
+        conn.rollback()
+        render_written_plan(company, output)
+        return written_plan_filename(company)
+    raise ValueError(f'Unknown report type: {kind}')
+
+def report_job_json(job):
+    return {
+        'id': job['id'],
+        'type': job['kind'],
+        'status': job['status'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+    }
+
+@app.route('/api/reports', methods=['POST'])
+@login_required
+@subscription_required
+def create_report_job():
+    """Queue a report for the background worker instead of rendering it in this request."""
+    company_id = session['company_id']
+    data = request.get_json(silent=True) or {}
+    kind = data.get('type')
+    if kind not in REPORT_KINDS:
+        return jsonify({'success': False, 'error': f"type must be one of: {', '.join(REPORT_KINDS)}"}), 400
+    
+    conn = request_db()
+    c = conn.cursor()
+    # A second click while the first job is still pending reuses that job;
+    # report_jobs_pending_key lets only one of concurrent requests insert it.
+    job = None
+    while not job:
+        c.execute('''INSERT INTO report_jobs (company_id, kind) VALUES (%s, %s)
+                     ON CONFLICT (company_id, kind) WHERE status IN ('queued', 'running') DO NOTHING
+                     RETURNING id, kind, status, created_at, finished_at''', (company_id, kind))
+        job = c.fetchone()
+        if not job:
+            # Empty when the pending job finished in between; then insert again.
+            c.execute('''SELECT id, kind, status, created_at, finished_at FROM report_jobs
+                         WHERE status IN ('queued', 'running') AND company_id = %s AND kind = %s''',
+                      (company_id, kind))
+            job = c.fetchone()
+        conn.commit()
+    
+    response = jsonify({'success': True, 'job': report_job_json(job)})
+    response.status_code = 202
+    response.headers['Location'] = f"/api/reports/{job['id']}"
+    return response
+
+@app.route('/api/reports/<int:job_id>', methods=['GET'])
+@login_required
+@subscription_required
+def get_report_job(job_id):
+    """Poll a queued report: 202 while pending, the PDF once done.
+
+    A failed job is a normal outcome, not a server fault: it answers 200 with
+    status 'failed' and an error to show. The worker's exception text stays
+    in report_jobs.error.
+    """
+    from flask import send_file
+    from io import BytesIO
+    
+    company_id = session['company_id']
+    
+    conn = request_db()
+    c = conn.cursor()
+    # The PDF is read in the same tenant-scoped statement, so a job deleted by
+    # retention in between cannot turn into a 500.
+    c.execute('''SELECT id, kind, status, filename, created_at, finished_at,
+                        CASE WHEN status = 'done' THEN result END AS result
+                 FROM report_jobs
+                 WHERE id = %s AND company_id = %s''', (job_id, company_id))
+    job = c.fetchone()
+    if not job or job['status'] != 'done':
+        if not job:
+            return jsonify({'success': False, 'error': 'Report not found'}), 404
+        if job['status'] == 'failed':
+            return jsonify({'success': True, 'job': report_job_json(job),
+                            'error': 'Report could not be generated. Please request it again.'})
+        response = jsonify({'success': True, 'job': report_job_json(job)})
+        response.status_code = 202
+        response.headers['Retry-After'] = '2'
+        return response
     
     return send_file(
-        buffer,
+        BytesIO(job['result']),
         as_attachment=True,
-        download_name=filename,
+        download_name=job['filename'],
         mimetype='application/pdf'
     )
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
-    app.run(debug=False, host='0.0.0.0', port=port)
+    # The development server is a single process, so it can migrate for itself.
+    if get_database_url():
+        migrate.migrate()
+    create_app().run(debug=False, host='0.0.0.0', port=port)
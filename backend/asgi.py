@@ -0,0 +1,297 @@
+"""ASGI entry point: the dashboard's reads on asyncio, the rest of the API on Flask.
+
+    uvicorn backend.asgi:app --workers 2 --host 0.0.0.0 --port 8080
+
+GET /api/me, /api/incidents, /api/training and /api/stats are the requests
+every dashboard view makes. Here they run as coroutines on database.async_db(),
+so a worker keeps as many of them waiting on Postgres as its async pool has
+connections, instead of one per thread. They use app.py's session interface,
+access rule, queries, payload builders, ETags and error bodies, so they answer
+exactly as the Flask routes do (test_asgi compares the two). Every other request, including everything
+that calls Stripe, runs the Flask app on one of ASGI_WSGI_THREADS threads per
+worker, as it does under gunicorn.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask_cors.core import get_cors_headers, get_cors_options
+from psycopg_pool import PoolTimeout
+from werkzeug.exceptions import InternalServerError
+
+try:
+    from . import app as app_module
+    from . import database, incident_stats, request_metrics
+except ImportError:
+    import app as app_module
+    import database
+    import incident_stats
+    import request_metrics
+
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 8))
+# Request bodies above this size are spooled to disk before Flask reads them.
+REQUEST_BODY_SPOOL_BYTES = 1024 * 1024
+
+
+def build_environ(scope, body):
+    """The WSGI environ for an ASGI http scope whose body has been read into `body`."""
+    script_name = scope.get('root_path', '')
+    path = scope['path']
+    if script_name and path.startswith(script_name):
+        path = path[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # The whole body has been read, with or without a Content-Length.
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for raw_name, raw_value in scope['headers']:
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            value = f"{environ[name]}{'; ' if name == 'HTTP_COOKIE' else ','}{value}"
+        environ[name] = value
+    return environ
+
+
+async def read_body(receive):
+    body = tempfile.SpooledTemporaryFile(max_size=REQUEST_BODY_SPOOL_BYTES)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    body.seek(0)
+    return body
+
+
+class WSGIBridge:
+    """Runs a WSGI app on a thread pool, streaming its response back to the event loop.
+
+    Unlike asgiref's WsgiToAsgi, requests are not serialized onto one thread.
+    """
+
+    def __init__(self, wsgi_app, threads):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        body = await read_body(receive)
+        loop = asyncio.get_running_loop()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        try:
+            await loop.run_in_executor(self.executor, self.run, build_environ(scope, body), send_from_thread)
+        finally:
+            body.close()
+
+    def run(self, environ, send):
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response_start.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start.update(status=int(status.split(' ', 1)[0]), headers=[
+                (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers])
+            return write
+
+        def send_start():
+            if not response_start.get('sent'):
+                response_start['sent'] = True
+                send({'type': 'http.response.start', 'status': response_start['status'],
+                      'headers': response_start['headers']})
+
+        def write(data):
+            send_start()
+            send({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        chunks = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    write(chunk)
+            send_start()
+            send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def dashboard_request(scope):
+    """The Flask request for an ASGI scope, with the session Flask would open for it.
+
+    The session comes from app.session_interface, as in Flask's request
+    context, so cookie name, signing and lifetime settings apply here too.
+    """
+    flask_app = app_module.app
+    request = flask_app.request_class(build_environ(scope, None))
+    request.session = (flask_app.session_interface.open_session(flask_app, request)
+                       or flask_app.session_interface.make_null_session(flask_app))
+    return request
+
+
+def json_response(payload, status=200):
+    response = app_module.app.json.response(payload)
+    response.status_code = status
+    return response
+
+
+def error_response(message, status):
+    return json_response({'success': False, 'error': message}, status)
+
+
+async def fetch_all(conn, query, params):
+    return await (await conn.execute(query, params)).fetchall()
+
+
+async def get_current_user(request, conn, user, company):
+    return json_response({'success': True, 'user': user, 'company': company})
+
+
+async def get_incidents(request, conn, user, company):
+    try:
+        page = app_module.read_page_args(app_module.INCIDENT_SORT_KEY, request.args)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    rows = await fetch_all(conn, *app_module.incident_list_query(request.session['company_id'], page))
+    return json_response(app_module.incident_list_payload(rows, page))
+
+
+async def get_training_records(request, conn, user, company):
+    try:
+        page = app_module.read_page_args(app_module.TRAINING_SORT_KEY, request.args)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    rows = await fetch_all(conn, *app_module.training_list_query(request.session['company_id'], page))
+    return json_response(app_module.training_list_payload(rows, page))
+
+
+async def get_stats(request, conn, user, company):
+    company_id = request.session['company_id']
+    by_type = [dict(row) for row in await fetch_all(conn, incident_stats.STATS_BY_TYPE_QUERY, (company_id,))]
+    recent = await (await conn.execute(incident_stats.STATS_RECENT_QUERY,
+                                       (company_id, app_module.stats_window_start()))).fetchone()
+    return json_response({'success': True, 'stats': incident_stats.stats_payload(by_type, recent['count'])})
+
+
+# path: (handler, whether it is @subscription_required and @data_versioned)
+DASHBOARD_ROUTES = {
+    '/api/me': (get_current_user, False),
+    '/api/incidents': (get_incidents, True),
+    '/api/training': (get_training_records, True),
+    '/api/stats': (get_stats, True),
+}
+
+
+async def dispatch(request, handler, versioned):
+    """login_required, subscription_required and data_versioned, then the handler."""
+    session = request.session
+    if 'user_id' not in session:
+        return error_response(*app_module.access_denial(session, None))
+    async with database.async_db() as conn:
+        context = await (await conn.execute(app_module.REQUEST_CONTEXT_QUERY, (session['user_id'],))).fetchone()
+        user = context['user_record'] if context else None
+        company = context['company_record'] if context else None
+        denial = app_module.access_denial(session, user, company, subscription=versioned)
+        if denial:
+            return error_response(*denial)
+        if not versioned:
+            return await handler(request, conn, user, company)
+        etag, not_modified = app_module.check_data_version(session, company, request)
+        if not_modified:
+            return not_modified
+        response = await handler(request, conn, user, company)
+        if response.status_code != 200:
+            return response
+        return app_module.tag_data_version(response, etag)
+
+
+class Application:
+    def __init__(self, flask_app, wsgi_threads=ASGI_WSGI_THREADS):
+        self.flask_app = flask_app
+        self.wsgi = WSGIBridge(flask_app.wsgi_app, wsgi_threads)
+        self.cors_options = get_cors_options(flask_app, app_module.CORS_OPTIONS)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+        elif scope['method'] in ('GET', 'HEAD') and scope['path'] in DASHBOARD_ROUTES:
+            await self.dashboard(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    # Schema version check and reportlab preload, as under gunicorn.
+                    await asyncio.get_running_loop().run_in_executor(None, app_module.create_app)
+                    await database.open_async_pool()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await database.close_async_pool()
+                self.wsgi.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dashboard(self, scope, receive, send):
+        await read_body(receive)
+        request = dashboard_request(scope)
+        stats = request_metrics.start_request(scope['path'], request.method)
+        handler, versioned = DASHBOARD_ROUTES[scope['path']]
+        try:
+            response = await dispatch(request, handler, versioned)
+        except PoolTimeout:
+            response = error_response('Service is busy, please retry', 503)
+            response.headers['Retry-After'] = '1'
+        except Exception:
+            self.flask_app.logger.exception('Exception on %s [%s]', request.path, request.method)
+            response = InternalServerError().get_response()
+        # What flask_cors and the session interface add to every Flask response.
+        for name, value in get_cors_headers(self.cors_options, request.headers, request.method).items():
+            response.headers.add(name, value)
+        self.flask_app.session_interface.save_session(self.flask_app, request.session, response)
+
+        chunks, status, headers = response.get_wsgi_response(request.environ)
+        # A HEAD answer keeps the GET headers, Content-Length included, but no body.
+        body = b'' if request.method == 'HEAD' else b''.join(chunks)
+        await send({'type': 'http.response.start', 'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in headers]})
+        await send({'type': 'http.response.body', 'body': body})
+        request_metrics.finish_request(stats, response.status_code, len(body))
+
+
+app = Application(app_module.app)
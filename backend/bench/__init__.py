@@ -0,0 +1 @@
+"""Benchmarks for the CompCleared backend; run each module with python -m."""
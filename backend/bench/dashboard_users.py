@@ -0,0 +1,225 @@
+"""How many concurrent dashboard users one container sustains, per server mode.
+
+Seeds one tenant with --rows incidents and training records, then for each
+--servers mode starts the backend the way load.py does (gunicorn as in the
+Dockerfile, or uvicorn running backend.asgi) and steps through --users. Each
+simulated user opens the dashboard as Dashboard.js does: GET /api/me, then
+incidents, stats and training in parallel, each on its own keep-alive
+connection; waits --think-ms; and repeats for --seconds. A step is sustained
+when no request fails and the p95 dashboard load stays under --target-ms.
+
+    python -m backend.bench.dashboard_users [--servers gunicorn,uvicorn]
+        [--users 25,50,100,200,400] [--rows 1000] [--seconds 15] [--think-ms 2000]
+        [--target-ms 1000] [--db-latency-ms 0] [--json results.json]
+
+A local database answers in microseconds, so requests mostly wait on CPU.
+--db-latency-ms puts a proxy between the backend and Postgres that delays
+every packet by half that in each direction, like a database across a network.
+
+Steps stop at the first one that is not sustained. DATABASE_URL must point at
+a disposable database; the tenant is deleted afterwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import psycopg
+
+from backend.bench.load import (PAGE_SIZE, PASSWORD, Client, delete_tenants, git_commit, seed_tenant,
+                                session_cookie, start_backend)
+
+DASHBOARD_READS = (f'/api/incidents?limit={PAGE_SIZE}', '/api/stats', f'/api/training?limit={PAGE_SIZE}')
+
+
+class DelayingProxy:
+    """TCP proxy on 127.0.0.1 that forwards each chunk `delay_ms` after it arrives, in order."""
+
+    def __init__(self, target_host, target_port, delay_ms):
+        self.target = (target_host, target_port)
+        self.delay = delay_ms / 1000
+        self.loop = asyncio.new_event_loop()
+        server = self.loop.run_until_complete(asyncio.start_server(self.connect, '127.0.0.1', 0))
+        self.port = server.sockets[0].getsockname()[1]
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    async def connect(self, client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(self.pipe(client_reader, server_writer), self.pipe(server_reader, client_writer))
+
+    async def pipe(self, reader, writer):
+        pending = asyncio.Queue()
+
+        async def forward():
+            while True:
+                due, chunk = await pending.get()
+                await asyncio.sleep(due - self.loop.time())
+                if not chunk:
+                    writer.close()
+                    return
+                writer.write(chunk)
+                await writer.drain()
+
+        forwarding = asyncio.ensure_future(forward())
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                pending.put_nowait((self.loop.time() + self.delay, chunk))
+                if not chunk:
+                    break
+            await forwarding
+        except OSError:
+            forwarding.cancel()
+            writer.close()
+
+
+def run_step(client, cookie, users, args):
+    """Hold `users` users on the dashboard for --seconds; returns the step's summary."""
+    loads = []
+    failures = [0]
+    lock = threading.Lock()
+    headers = {'Cookie': cookie}
+    stop_at = time.perf_counter() + args.seconds
+
+    def get(path):
+        status = client.request('GET', path, headers=headers)[0]
+        return status == 200
+
+    with ThreadPoolExecutor(max_workers=users * len(DASHBOARD_READS)) as reads:
+        def user():
+            # Spread the first loads over one think time, as users arrive at different moments.
+            time.sleep(random.uniform(0, args.think_ms / 1000))
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                ok = get('/api/me') and all(reads.map(get, DASHBOARD_READS))
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                with lock:
+                    if ok:
+                        loads.append(elapsed_ms)
+                    else:
+                        failures[0] += 1
+                time.sleep(args.think_ms / 1000)
+
+        started = time.perf_counter()
+        users_threads = [threading.Thread(target=user, daemon=True) for _ in range(users)]
+        for thread in users_threads:
+            thread.start()
+        for thread in users_threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    loads.sort()
+
+    def percentile(fraction):
+        return round(loads[min(len(loads) - 1, int(len(loads) * fraction))], 1) if loads else None
+
+    p95 = percentile(0.95)
+    return {
+        'users': users,
+        'dashboard_loads': len(loads),
+        'failed_loads': failures[0],
+        'loads_per_s': round(len(loads) / elapsed, 1),
+        'p50_ms': percentile(0.5),
+        'p95_ms': p95,
+        'p99_ms': percentile(0.99),
+        'sustained': failures[0] == 0 and p95 is not None and p95 <= args.target_ms,
+    }
+
+
+def print_step(server, step):
+    print(f"{server:<9} {step['users']:>6} {step['loads_per_s']:>8.1f} {step['p50_ms'] or 0:>8.1f} "
+          f"{step['p95_ms'] or 0:>8.1f} {step['p99_ms'] or 0:>8.1f} {step['failed_loads']:>7}  "
+          f"{'yes' if step['sustained'] else 'no'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find how many concurrent dashboard users a container sustains.')
+    parser.add_argument('--servers', default='gunicorn,uvicorn')
+    parser.add_argument('--users', default='25,50,100,200,400', help='comma-separated concurrent users per step')
+    parser.add_argument('--rows', type=int, default=1000, help='incidents and training records of the tenant')
+    parser.add_argument('--seconds', type=float, default=15, help='length of each step')
+    parser.add_argument('--think-ms', type=float, default=2000, help='pause between dashboard loads')
+    parser.add_argument('--target-ms', type=float, default=1000, help='p95 dashboard load of a sustained step')
+    parser.add_argument('--db-latency-ms', type=float, default=0, help='round trip added to every query')
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--json', help='write machine-readable results here')
+    args = parser.parse_args(argv)
+
+    servers = args.servers.split(',')
+    if set(servers) - {'gunicorn', 'uvicorn'}:
+        parser.error('--servers takes gunicorn and/or uvicorn')
+    if not os.environ.get('DATABASE_URL'):
+        print('DATABASE_URL must point at a disposable database')
+        return 2
+
+    from backend import app as app_module
+    from backend import migrate
+    from backend.database import get_db
+
+    migrate.migrate()
+    app_module.create_app()
+    conn = get_db()
+    environment = dict(os.environ)
+    if args.db_latency_ms:
+        target = psycopg.conninfo.conninfo_to_dict(os.environ['DATABASE_URL'])
+        proxy = DelayingProxy(target.get('host', 'localhost'), int(target.get('port', 5432)), args.db_latency_ms / 2)
+        environment['DATABASE_URL'] = psycopg.conninfo.make_conninfo(
+            os.environ['DATABASE_URL'], host='127.0.0.1', port=proxy.port)
+    tenant = None
+    results = {}
+    try:
+        tenant = seed_tenant(app_module, conn, args.rows, app_module.password_hasher.hash(PASSWORD))
+        print(f"{'server':<9} {'users':>6} {'loads/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'failed':>7}  sustained")
+        for server in servers:
+            args.server = server
+            backend, base_url = start_backend(args, environment)
+            try:
+                client = Client(base_url)
+                cookie = session_cookie(client, tenant['email'])
+                results[server] = []
+                for users in (int(count) for count in args.users.split(',')):
+                    results[server].append(run_step(client, cookie, users, args))
+                    print_step(server, results[server][-1])
+                    if not results[server][-1]['sustained']:
+                        break
+            finally:
+                backend.terminate()
+                backend.wait()
+    finally:
+        if tenant:
+            delete_tenants(conn, [tenant['company_id']], [])
+        conn.close()
+
+    print()
+    for server, steps in results.items():
+        sustained = [step['users'] for step in steps if step['sustained']]
+        print(f"{server}: {max(sustained) if sustained else 'fewer than ' + str(steps[0]['users'])} "
+              f"users sustained (p95 dashboard load under {args.target_ms:.0f} ms)")
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({
+                'commit': git_commit(),
+                'measured_at': datetime.now().astimezone().isoformat(),
+                'config': {name: getattr(args, name) for name in (
+                    'users', 'rows', 'seconds', 'think_ms', 'target_ms', 'db_latency_ms', 'workers', 'threads')},
+                'results': results,
+            }, output, indent=2)
+        print(f'results written to {args.json}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Latency of GET /api/incidents/search with and without incidents_search_idx.
+
+Seeds one tenant with --rows incidents (default 1,000,000) whose narratives
+mix a small vocabulary, so terms range from rare to matching most rows, then
+times each --queries search as the endpoint runs it: once as the statement
+with the GIN index, once in a transaction that drops the index and rolls back,
+and once through the Flask test client including headlines and JSON. All
+rows belong to one company, so the tenant index cannot narrow the scan and
+the GIN index has to do the work.
+
+    python -m backend.bench.incident_search [--rows 1000000] [--limit 25] [--repeats 5]
+        [--queries 'machete,knife,"parking lot",customer threatened']
+
+DATABASE_URL must point at a disposable database; the tenant is deleted
+afterwards. Seeding 1M rows computes every search_vector and takes minutes.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from backend.bench.load import delete_tenants
+
+OFFENDERS = ('A customer', 'A visitor', 'A former employee', 'A coworker', 'A contractor', 'A delivery driver')
+ACTIONS = ('shouted at', 'threatened', 'pushed', 'followed', 'cornered', 'swung at')
+TARGETS = ('the cashier', 'a nurse', 'the night manager', 'two servers', 'a security guard')
+WEAPONS = ('', '', '', ' with a knife', ' with a baseball bat', ' with a box cutter')
+LOCATIONS = ('Lobby', 'Loading dock', 'Parking lot', 'Break room', 'Pharmacy counter', 'Stairwell B')
+CIRCUMSTANCES = ('Refused a refund', 'Was asked to leave', 'Argument over a schedule change',
+                 'Denied entry after hours', 'Waited over an hour')
+CORRECTIVE_ACTIONS = ('Added a second closer', 'Installed a panic button', 'Reviewed de-escalation training',
+                      'Banned the person from the site', 'Moved the register away from the door')
+# About one incident in ten thousand carries this word.
+RARE_WEAPON = ' with a machete'
+
+
+def seed_incidents(app_module, conn, rows):
+    """Insert an active company with `rows` incidents; returns its id."""
+    c = conn.cursor()
+    c.execute('''INSERT INTO companies (name, tier, subscription_status, created_at)
+                 VALUES (%s, 'annual', 'active', now()) RETURNING id''', (f'Search benchmark ({rows} rows)',))
+    company_id = c.fetchone()['id']
+    c.execute('''INSERT INTO users (company_id, email, name, role, created_at)
+                 VALUES (%s, %s, 'Search benchmark', 'admin', now())''',
+              (company_id, f'incident-search-{company_id}@example.com'))
+
+    pick = random.Random(553).choice
+    now = datetime.now()
+    first_day = date.today() - timedelta(days=3 * 365)
+    with c.copy(f"COPY incidents ({', '.join(app_module.INCIDENT_COLUMNS)}) FROM STDIN") as copy:
+        for number in range(rows):
+            weapon = RARE_WEAPON if number % 10007 == 0 else pick(WEAPONS)
+            copy.write_row(app_module.incident_values({
+                'incident_date': first_day + timedelta(days=number * 3 * 365 // max(rows, 1)),
+                'incident_time': f'{number % 24:02d}:{number % 60:02d}',
+                'exact_location': pick(LOCATIONS),
+                'violence_type': ('Type 1', 'Type 2', 'Type 3', 'Type 4')[number % 4],
+                'offender_classification': ('Customer', 'Coworker', 'Stranger')[number % 3],
+                'description': f'{pick(OFFENDERS)} {pick(ACTIONS)} {pick(TARGETS)}{weapon}.',
+                'circumstances': pick(CIRCUMSTANCES),
+                'corrective_actions': pick(CORRECTIVE_ACTIONS),
+                'logged_by_name': 'Pat Manager',
+                'logged_by_title': 'Site manager',
+            }, company_id, now))
+    conn.commit()
+    c.execute('ANALYZE incidents')
+    conn.commit()
+    return company_id
+
+
+def time_statement(conn, statement, params, repeats):
+    """Median milliseconds of `statement` with its rows fetched, and the row count."""
+    timings = []
+    for _ in range(repeats):
+        c = conn.cursor()
+        started = time.perf_counter()
+        c.execute(statement, params)
+        rows = c.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), len(rows)
+
+
+def index_scans(plan):
+    """Names of the indexes a JSON plan reads."""
+    names = [plan['Index Name']] if 'Index Name' in plan else []
+    for child in plan.get('Plans', []):
+        names += index_scans(child)
+    return names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time incident search with and without its GIN index.')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='incidents of the benchmark tenant')
+    parser.add_argument('--limit', type=int, default=25, help='page size of each search')
+    parser.add_argument('--repeats', type=int, default=5, help='runs per query; the median is reported')
+    parser.add_argument('--queries', default='machete,knife,"parking lot",customer threatened',
+                        help='comma-separated search strings')
+    args = parser.parse_args(argv)
+
+    if not os.environ.get('DATABASE_URL'):
+        print('DATABASE_URL must point at a disposable database')
+        return 2
+
+    from backend import app as app_module
+    from backend import migrate
+    from backend.database import get_db
+
+    migrate.migrate()
+    app_module.create_app()
+    app_module.app.config.update(TESTING=True)
+    conn = get_db()
+    company_id = None
+    try:
+        started = time.perf_counter()
+        company_id = seed_incidents(app_module, conn, args.rows)
+        print(f'seeded {args.rows} incidents in {time.perf_counter() - started:.0f} s')
+        c = conn.cursor()
+        c.execute('SELECT id FROM users WHERE company_id = %s', (company_id,))
+        user_id = c.fetchone()['id']
+        conn.commit()
+
+        print(f"{'query':<22} {'matches':>8} {'GIN ms':>9} {'no index ms':>12} {'endpoint ms':>12}  indexes used")
+        with app_module.app.test_client() as client:
+            with client.session_transaction() as flask_session:
+                flask_session['user_id'] = user_id
+                flask_session['company_id'] = company_id
+            for terms in args.queries.split(','):
+                statement, params = app_module.incident_search_query(company_id, terms, (args.limit, None))
+                c.execute('''SELECT COUNT(*) AS count FROM incidents
+                             WHERE company_id = %s AND search_vector @@ websearch_to_tsquery('english', %s)''',
+                          (company_id, terms))
+                matches = c.fetchone()['count']
+                c.execute('EXPLAIN (FORMAT JSON) ' + statement, params)
+                indexes = sorted(set(index_scans(c.fetchone()['QUERY PLAN'][0]['Plan'])))
+                with_index = time_statement(conn, statement, params, args.repeats)[0]
+                conn.commit()
+
+                c.execute('DROP INDEX incidents_search_idx')
+                without_index = time_statement(conn, statement, params, args.repeats)[0]
+                conn.rollback()
+
+                timings = []
+                for _ in range(args.repeats):
+                    started = time.perf_counter()
+                    response = client.get('/api/incidents/search', query_string={'q': terms, 'limit': args.limit})
+                    timings.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 200, response.get_json()
+                print(f'{terms:<22} {matches:>8} {with_index:>9.1f} {without_index:>12.1f} '
+                      f'{statistics.median(timings):>12.1f}  {", ".join(indexes)}')
+    finally:
+        if company_id:
+            delete_tenants(conn, [company_id], [])
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""End-to-end load test of the backend API over HTTP.
+
+Seeds one tenant per size in --tenants (incidents and as many training
+records) into DATABASE_URL, starts the local Stripe stand-in and gunicorn
+(configured like the Dockerfile; --server uvicorn runs backend.asgi instead)
+against that database, then sends
+--requests requests to each endpoint from --concurrency keep-alive clients.
+Reports throughput and p50/p95/p99 per endpoint and tenant size, and deletes
+everything it created.
+
+    python -m backend.bench.load [--tenants 1,1000,100000] [--requests 200] [--concurrency 8]
+        [--endpoints login,incidents,stats,training,report_pdf,webhook] [--server uvicorn]
+        [--json results.json] [--compare baseline.json]
+
+--json writes the results with the commit they were measured at; --compare
+prints each p95 and throughput against an earlier --json file. Use --url to
+load an already running backend on the same DATABASE_URL instead (it needs
+--webhook-secret for the webhook endpoint and its own STRIPE_API_BASE).
+
+List endpoints are read a page (?limit=) at a time, the way the dashboard
+reads them, and without If-None-Match. The first --warmup requests to each
+endpoint are not measured, so report_pdf measures cached downloads; the
+first request runs alone and its latency (first_ms, a cold render for
+report_pdf) is reported separately.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from urllib.parse import urlsplit
+
+from backend.bench.stripe_events import deliveries, fake_events
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'load-test-password'
+PAGE_SIZE = 50
+ENDPOINTS = {
+    'login': ('POST', '/api/login'),
+    'incidents': ('GET', f'/api/incidents?limit={PAGE_SIZE}'),
+    'stats': ('GET', '/api/stats'),
+    'training': ('GET', f'/api/training?limit={PAGE_SIZE}'),
+    'report_pdf': ('GET', '/api/report/pdf'),
+    'webhook': ('POST', '/api/webhook'),
+}
+# Endpoints whose cost does not depend on a tenant's data; run once.
+UNSCOPED_ENDPOINTS = ('login', 'webhook')
+
+
+class Client:
+    """One keep-alive HTTP connection per thread."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        """Return (status, response headers, body size, milliseconds)."""
+        started = time.perf_counter()
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = http.client.HTTPConnection(
+                    self.host, self.port, timeout=300)
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                size = len(response.read())
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; reconnect once.
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    return None, {}, 0, (time.perf_counter() - started) * 1000
+        return response.status, response.headers, size, (time.perf_counter() - started) * 1000
+
+
+def seed_tenant(app_module, conn, rows, password_hash):
+    """Insert an active company with an owner, `rows` incidents and `rows` training records."""
+    c = conn.cursor()
+    c.execute('''INSERT INTO companies (name, tier, subscription_status, stripe_customer_id, created_at)
+                 VALUES (%s, 'annual', 'active', 'cus_stub_load', now()) RETURNING id''',
+              (f'Load test ({rows} rows)',))
+    company_id = c.fetchone()['id']
+    email = f'load-{company_id}@example.com'
+    c.execute('''INSERT INTO users (company_id, email, password_hash, name, role, created_at)
+                 VALUES (%s, %s, %s, 'Load test', 'admin', now())''', (company_id, email, password_hash))
+
+    now = datetime.now()
+    first_day = date.today() - timedelta(days=3 * 365)
+    with c.copy(f"COPY incidents ({', '.join(app_module.INCIDENT_COLUMNS)}) FROM STDIN") as copy:
+        for number in range(rows):
+            copy.write_row(app_module.incident_values({
+                'incident_date': first_day + timedelta(days=number * 3 * 365 // max(rows, 1)),
+                'incident_time': f'{number % 24:02d}:{number % 60:02d}',
+                'exact_location': ('Lobby', 'Loading dock', 'Parking lot', 'Break room')[number % 4],
+                'violence_type': ('Type 1', 'Type 2', 'Type 3', 'Type 4')[number % 4],
+                'offender_classification': ('Customer', 'Coworker', 'Stranger')[number % 3],
+                'description': f'Verbal threat reported at shift change, incident {number}. ' * 3,
+                'circumstances': 'Escalated after a service refusal',
+                'law_enforcement_contacted': number % 5 == 0,
+                'employees_involved': ['Alex', 'Sam'],
+                'logged_by_name': 'Pat Manager',
+                'logged_by_title': 'Site manager',
+            }, company_id, now))
+    with c.copy(f"COPY training_records ({', '.join(app_module.TRAINING_COLUMNS)}) FROM STDIN") as copy:
+        for number in range(rows):
+            copy.write_row(app_module.training_values({
+                'training_date': first_day + timedelta(days=number * 3 * 365 // max(rows, 1)),
+                'training_type': ('Initial', 'Annual refresher', 'Post-incident')[number % 3],
+                'trainer_name': 'Pat Trainer',
+                'topic_description': f'Session {number}',
+                'attendee_count': number % 40 + 1,
+            }, company_id, now))
+    conn.commit()
+    app_module.incident_stats.rebuild(conn, company_id)
+    return {'company_id': company_id, 'email': email, 'rows': rows}
+
+
+def delete_tenants(conn, company_ids, events):
+    conn.rollback()
+    c = conn.cursor()
+    for table in ('incident_type_counts', 'incident_daily_counts', 'incidents', 'training_records',
+                  'report_jobs', 'users'):
+        c.execute(f'DELETE FROM {table} WHERE company_id = ANY(%s)', (company_ids,))
+    c.execute('DELETE FROM companies WHERE id = ANY(%s)', (company_ids,))
+    c.execute('DELETE FROM stripe_events WHERE id = ANY(%s)', ([event['id'] for event in events],))
+    c.execute('DELETE FROM stripe_checkout_sessions WHERE id = ANY(%s)',
+              ([event['data']['object']['id'] for event in events
+                if event['type'] == 'checkout.session.completed'],))
+    conn.commit()
+
+
+def backend_command(args):
+    if args.server == 'uvicorn':
+        return ['uvicorn', 'backend.asgi:app', '--workers', str(args.workers), '--no-access-log',
+                '--host', '127.0.0.1', '--port', str(args.port)]
+    return ['gunicorn', '-w', str(args.workers), '--threads', str(args.threads), '--timeout', '300',
+            '-b', f'127.0.0.1:{args.port}', 'backend.app:create_app()']
+
+
+def start_backend(args, environment):
+    """Run --server on --port; returns (process, base URL). Its log goes to a temp file."""
+    log = tempfile.NamedTemporaryFile(prefix='compcleared-load-', suffix='.log', delete=False)
+    # Under uvicorn, --threads is the thread pool for the routes that are not async.
+    process = subprocess.Popen(backend_command(args), cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+                               env=dict(environment, ASGI_WSGI_THREADS=str(args.threads)))
+    base_url = f'http://127.0.0.1:{args.port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{args.server} exited; see {log.name}')
+        try:
+            with urllib.request.urlopen(base_url + '/api/health', timeout=1):
+                print(f'{args.server} listening on {base_url}; log in {log.name}')
+                return process, base_url
+        except OSError:  # refused, reset or timed out while the workers boot
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'{args.server} did not start within 60 s; see {log.name}')
+
+
+def session_cookie(client, email):
+    status, headers, _, _ = client.request('POST', '/api/login', json.dumps(
+        {'email': email, 'password': PASSWORD}), {'Content-Type': 'application/json'})
+    if status != 200:
+        raise RuntimeError(f'login as {email} answered {status}')
+    # The cookie is Secure, so take it by hand rather than through a cookie jar.
+    return headers['Set-Cookie'].split(';', 1)[0]
+
+
+def endpoint_requests(name, tenant, cookie, args):
+    """Yield (body, headers) for each request to send, warm-up requests first."""
+    count = args.warmup + args.requests
+    if name == 'login':
+        body = json.dumps({'email': tenant['email'], 'password': PASSWORD})
+        for _ in range(count):
+            yield body, {'Content-Type': 'application/json'}
+    elif name == 'webhook':
+        # The same event ids every run; delete_tenants removes them afterwards.
+        for payload, signature in itertools.islice(
+                deliveries(webhook_events(count), args.webhook_secret, 0.1), count):
+            yield payload, {'Content-Type': 'application/json', 'Stripe-Signature': signature}
+    else:
+        for _ in range(count):
+            yield None, {'Cookie': cookie}
+
+
+def webhook_events(count):
+    # fake_events skips some cancellations; every other event is a checkout,
+    # so twice as many always gives at least `count` deliveries.
+    return list(fake_events(2 * count))
+
+
+def run_endpoint(client, name, tenant, cookie, args):
+    method, path = ENDPOINTS[name]
+    pending = list(endpoint_requests(name, tenant, cookie, args))
+    # The first request runs alone: it fills caches (a cold PDF render of a
+    # large tenant takes minutes) and its latency is reported as first_ms.
+    first = client.request(method, path, *pending[0])
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(lambda request: client.request(method, path, *request), pending[1:args.warmup]))
+        started = time.perf_counter()
+        results = list(executor.map(lambda request: client.request(method, path, *request),
+                                    pending[args.warmup:]))
+        elapsed = time.perf_counter() - started
+    summary = summarize(name, tenant['rows'] if name not in UNSCOPED_ENDPOINTS else None, results, elapsed)
+    summary['first_ms'] = round(first[3], 2)
+    return summary
+
+
+def summarize(name, tenant_rows, results, elapsed):
+    statuses = {}
+    for status, _, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    latencies = sorted(ms for _, _, _, ms in results)
+
+    def percentile(fraction):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))], 2)
+
+    return {
+        'endpoint': name,
+        'tenant_rows': tenant_rows,
+        'requests': len(results),
+        'errors': sum(1 for status, _, _, _ in results if status is None or status >= 400),
+        'statuses': statuses,
+        'throughput_rps': round(len(results) / elapsed, 1),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(latencies[-1], 2),
+        'avg_bytes': round(sum(size for _, _, size, _ in results) / len(results)),
+    }
+
+
+def result_key(result):
+    return result['endpoint'], result['tenant_rows']
+
+
+def print_results(results, baseline=None, header=True):
+    earlier = {result_key(result): result for result in (baseline or {}).get('results', [])}
+    if header:
+        print(f"{'endpoint':<12} {'rows':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'first ms':>9} {'errors':>6}")
+    for result in results:
+        rows = '-' if result['tenant_rows'] is None else result['tenant_rows']
+        line = (f"{result['endpoint']:<12} {rows:>7} {result['throughput_rps']:>8.1f} {result['p50_ms']:>8.1f} "
+                f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['first_ms']:>9.1f} {result['errors']:>6}")
+        before = earlier.get(result_key(result))
+        if before:
+            line += (f"   p95 {(result['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}%"
+                     f", req/s {(result['throughput_rps'] / before['throughput_rps'] - 1) * 100:+.0f}%")
+        print(line)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the backend API end to end.')
+    parser.add_argument('--tenants', default='1,1000,100000',
+                        help='comma-separated incident/training row counts, one tenant each')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per endpoint and tenant')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests first (at least 1)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--server', choices=('gunicorn', 'uvicorn'), default='gunicorn',
+                        help='uvicorn serves backend.asgi, the dashboard reads on asyncio')
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--stripe-latency-ms', type=float, default=0)
+    parser.add_argument('--url', help='load this running backend instead of starting --server')
+    parser.add_argument('--webhook-secret', help='STRIPE_WEBHOOK_SECRET of the backend at --url')
+    parser.add_argument('--json', help='write machine-readable results here')
+    parser.add_argument('--compare', help='results JSON from an earlier run to compare against')
+    args = parser.parse_args(argv)
+
+    endpoints = args.endpoints.split(',')
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if args.warmup < 1:
+        parser.error('--warmup must be at least 1')
+    if unknown:
+        parser.error(f'unknown endpoints: {", ".join(sorted(unknown))}')
+    if args.url and 'webhook' in endpoints and not args.webhook_secret:
+        parser.error('--url with the webhook endpoint needs --webhook-secret')
+    if not os.environ.get('DATABASE_URL'):
+        print('DATABASE_URL must point at a disposable database')
+        return 2
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    from backend import app as app_module
+    from backend import migrate
+    from backend.bench.stripe_stub import StripeStub
+    from backend.database import get_db
+
+    migrate.migrate()
+    app_module.create_app()
+    conn = get_db()
+    tenants = []
+    stub = backend = None
+    results = []
+    try:
+        password_hash = app_module.password_hasher.hash(PASSWORD)
+        for rows in (int(size) for size in args.tenants.split(',')):
+            started = time.perf_counter()
+            tenants.append(seed_tenant(app_module, conn, rows, password_hash))
+            print(f'seeded a tenant with {rows} incidents and training records in '
+                  f'{time.perf_counter() - started:.1f} s')
+
+        base_url = args.url
+        if not base_url:
+            stub = StripeStub(('127.0.0.1', 0), latency_ms=args.stripe_latency_ms)
+            threading.Thread(target=stub.serve_forever, daemon=True).start()
+            args.webhook_secret = 'whsec_' + secrets.token_hex(16)
+            report_cache_dir = tempfile.mkdtemp(prefix='compcleared-load-')
+            backend, base_url = start_backend(args, dict(
+                os.environ, STRIPE_API_BASE=stub.url, STRIPE_WEBHOOK_SECRET=args.webhook_secret,
+                REPORT_CACHE_DIR=report_cache_dir))
+        client = Client(base_url)
+
+        for name in endpoints:
+            for tenant in tenants[:1] if name in UNSCOPED_ENDPOINTS else tenants:
+                cookie = session_cookie(client, tenant['email']) if name not in UNSCOPED_ENDPOINTS else None
+                results.append(run_endpoint(client, name, tenant, cookie, args))
+                print_results(results[-1:], baseline, header=len(results) == 1)
+    finally:
+        if backend:
+            backend.terminate()
+            backend.wait()
+        if stub:
+            stub.shutdown()
+            stub.server_close()
+        delete_tenants(conn, [tenant['company_id'] for tenant in tenants],
+                       webhook_events(args.warmup + args.requests))
+        conn.close()
+
+    print()
+    print_results(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({
+                'commit': git_commit(),
+                'measured_at': datetime.now().astimezone().isoformat(),
+                'config': {name: getattr(args, name) for name in (
+                    'tenants', 'requests', 'warmup', 'concurrency', 'server', 'workers', 'threads',
+                    'stripe_latency_ms', 'url')},
+                'results': results,
+            }, output, indent=2)
+        print(f'results written to {args.json}')
+    return 0 if all(result['errors'] == 0 for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
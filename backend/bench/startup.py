@@ -0,0 +1,88 @@
+"""Cold-start benchmark for the backend web worker.
+
+Imports backend.app in fresh interpreters under ``python -X importtime`` and
+reports the median import time plus the slowest modules, then times the
+per-worker startup phase (create_app) when DATABASE_URL is set.
+
+    python -m backend.bench.startup [--runs 5] [--top 10] [--max-import-ms 400]
+
+With --max-import-ms the exit status is 1 when the median import is slower,
+which lets CI catch a heavy dependency creeping back into the import path.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Loaded on demand by backend.app; importing it must not pull them in.
+LAZY_MODULES = ('stripe', 'reportlab.platypus')
+
+
+def parse_importtime(stderr):
+    """Return {module: cumulative microseconds} from -X importtime output."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def measure_import(module='backend.app'):
+    env = dict(os.environ)
+    # Import only: no database work and no schema checks.
+    env.pop('DATABASE_URL', None)
+    code = f'import sys, {module}; print(",".join(m for m in {LAZY_MODULES!r} if m in sys.modules))'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    loaded_lazy = [name for name in result.stdout.strip().split(',') if name]
+    return parse_importtime(result.stderr), loaded_lazy
+
+
+def measure_startup():
+    started = time.perf_counter()
+    from backend import app as app_module
+    app_module.create_app()
+    return (time.perf_counter() - started) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure backend.app cold-start time.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest modules to list')
+    parser.add_argument('--max-import-ms', type=float, help='fail if the median import is slower')
+    args = parser.parse_args(argv)
+
+    samples = []
+    loaded_lazy = []
+    for _ in range(args.runs):
+        modules, loaded_lazy = measure_import()
+        samples.append(modules)
+    import_ms = statistics.median(sample['backend.app'] for sample in samples) / 1000
+    print(f'import backend.app: {import_ms:.1f} ms (median of {args.runs})')
+
+    slowest = sorted(samples[-1].items(), key=lambda item: item[1], reverse=True)
+    top_level = [(name, us) for name, us in slowest if '.' not in name and name != 'backend']
+    for name, us in top_level[:args.top]:
+        print(f'  {us / 1000:8.1f} ms  {name}')
+
+    if os.environ.get('DATABASE_URL'):
+        print(f'import + create_app(): {measure_startup():.1f} ms')
+
+    failed = False
+    if loaded_lazy:
+        print(f'❌ import backend.app loaded {", ".join(loaded_lazy)}, which should load on first use')
+        failed = True
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f'❌ import is slower than {args.max_import_ms:.0f} ms')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
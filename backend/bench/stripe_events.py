@@ -0,0 +1,134 @@
+"""Fake Stripe: signed webhook deliveries for load-testing POST /api/webhook.
+
+Builds checkout.session.completed and customer.subscription.deleted events for
+made-up subscriptions, signs them the way Stripe does with a webhook secret,
+and posts them concurrently, redelivering a share of them the way Stripe
+retries. Reports status codes and acknowledgement latency.
+
+    python -m backend.bench.stripe_events --url http://localhost:8080/api/webhook \\
+        --secret "$STRIPE_WEBHOOK_SECRET" [--events 2000] [--concurrency 16] [--duplicates 0.1]
+
+Use the backend's own STRIPE_WEBHOOK_SECRET (any whsec_... value works locally
+when the backend is started with the same one). With --print the signed
+deliveries are written as NDJSON instead of being sent.
+
+The events reference companies that do not exist, so applying them changes
+nothing; run `python -m backend.webhook_worker --once` afterwards to time the
+worker draining the inbox.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def fake_events(count, seed=0):
+    """Yield event dicts: each subscription is checked out, and some are later canceled."""
+    rng = random.Random(seed)
+    created = int(time.time()) - count
+    for number in range(count):
+        subscription_id = f'sub_fake{number // 2:08d}'
+        created += 1
+        if number % 2 == 0:
+            company_id = str(1_000_000 + number // 2)
+            yield {
+                'id': f'evt_fake{number:08d}',
+                'object': 'event',
+                'type': 'checkout.session.completed',
+                'created': created,
+                'data': {'object': {
+                    'id': f'cs_fake{number:08d}',
+                    'object': 'checkout.session',
+                    'client_reference_id': company_id,
+                    'metadata': {'company_id': company_id},
+                    'payment_status': 'paid',
+                    'customer': f'cus_fake{number // 2:08d}',
+                    'subscription': subscription_id,
+                }},
+            }
+        elif rng.random() < 0.5:
+            yield {
+                'id': f'evt_fake{number:08d}',
+                'object': 'event',
+                'type': 'customer.subscription.deleted',
+                'created': created,
+                'data': {'object': {'id': subscription_id, 'object': 'subscription'}},
+            }
+
+
+def signature_header(payload, secret, timestamp=None):
+    """The Stripe-Signature header Stripe would send for `payload` (bytes)."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f'{timestamp}.'.encode() + payload
+    return f't={timestamp},v1={hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()}'
+
+
+def deliveries(events, secret, duplicates, seed=0):
+    """Yield (payload, signature) pairs, repeating about `duplicates` of them."""
+    rng = random.Random(seed)
+    for event in events:
+        payload = json.dumps(event).encode()
+        for _ in range(2 if rng.random() < duplicates else 1):
+            yield payload, signature_header(payload, secret)
+
+
+def post(url, payload, signature):
+    request = urllib.request.Request(url, data=payload, method='POST', headers={
+        'Content-Type': 'application/json',
+        'Stripe-Signature': signature,
+    })
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except urllib.error.URLError:
+        status = None
+    return status, (time.perf_counter() - started) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Send fake signed Stripe webhooks.')
+    parser.add_argument('--url', default='http://localhost:8080/api/webhook')
+    parser.add_argument('--secret', required=True, help='the backend\'s STRIPE_WEBHOOK_SECRET')
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duplicates', type=float, default=0.1,
+                        help='share of events delivered twice')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--print', action='store_true', help='write NDJSON instead of sending')
+    args = parser.parse_args(argv)
+
+    pending = deliveries(fake_events(args.events, args.seed), args.secret, args.duplicates, args.seed)
+    if args.print:
+        for payload, signature in pending:
+            print(json.dumps({'signature': signature, 'payload': json.loads(payload)}))
+        return 0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda delivery: post(args.url, *delivery), pending))
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = sorted(ms for _, ms in results)
+    print(f'{len(results)} deliveries in {elapsed:.2f} s ({len(results) / elapsed:.0f}/s)')
+    print('status codes: ' + ', '.join(f'{status}: {count}' for status, count in sorted(
+        statuses.items(), key=lambda item: str(item[0]))))
+    for label, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+        print(f'{label}: {latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]:.1f} ms')
+    print(f'max: {latencies[-1]:.1f} ms')
+    return 0 if set(statuses) == {200} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Local stand-in for the parts of the Stripe API the backend calls.
+
+Serves checkout session create/retrieve, billing portal sessions and an empty
+event list, with configurable latency and error rate, so the signup and
+checkout flows can be benchmarked and their failure handling exercised
+without network access or a Stripe account. A created session reads back as
+paid, as if the customer finished Checkout at once.
+
+    python -m backend.bench.stripe_stub [--port 12111] [--latency-ms 300] [--jitter-ms 100]
+        [--error-rate 0.05] [--webhook-url http://localhost:8080/api/webhook --webhook-secret whsec_...]
+
+Start the backend with STRIPE_API_BASE=http://127.0.0.1:12111. With
+--webhook-url each created session is also delivered as a signed
+checkout.session.completed webhook, the way Stripe does after payment.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from backend.bench.stripe_events import post, signature_header
+
+
+class StripeStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 webhook_url=None, webhook_secret=None, seed=None):
+        super().__init__(address, StripeStubHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.requests = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def handle_error(self, request, client_address):
+        # A client that timed out hangs up before the delayed response.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def next_number(self):
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+    def delay_and_fail(self):
+        """Sleep for the configured latency; return True if this call should fail."""
+        with self.lock:
+            delay = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+            failing = self.random.random() < self.error_rate
+        time.sleep(max(0, delay) / 1000)
+        return failing
+
+    def create_checkout_session(self, form):
+        number = self.next_number()
+        metadata = {match.group(1): value for key, value in form.items()
+                    if (match := re.fullmatch(r'metadata\[(.+)\]', key))}
+        session = {
+            'id': f'cs_stub_{number:08d}',
+            'object': 'checkout.session',
+            'client_reference_id': form.get('client_reference_id'),
+            'metadata': metadata,
+            'mode': form.get('mode', 'payment'),
+            'status': 'open',
+            'payment_status': 'unpaid',
+            'customer': None,
+            'subscription': None,
+            'success_url': form.get('success_url'),
+            'url': f'{self.url}/checkout/cs_stub_{number:08d}',
+        }
+        with self.lock:
+            self.sessions[session['id']] = dict(session, status='complete', payment_status='paid',
+                                                customer=f'cus_stub_{number:08d}',
+                                                subscription=f'sub_stub_{number:08d}')
+        if self.webhook_url:
+            threading.Thread(target=self.deliver_completed, args=(session['id'],), daemon=True).start()
+        return session
+
+    def deliver_completed(self, session_id):
+        with self.lock:
+            completed = self.sessions[session_id]
+        payload = json.dumps({
+            'id': f'evt_{session_id}',
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'created': int(time.time()),
+            'data': {'object': completed},
+        }).encode()
+        post(self.webhook_url, payload, signature_header(payload, self.webhook_secret))
+
+
+class StripeStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.handle_api('GET')
+
+    def do_POST(self):
+        self.handle_api('POST')
+
+    def handle_api(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = dict(parse_qsl(self.rfile.read(length).decode())) if length else {}
+        path = urlsplit(self.path).path
+        if self.server.delay_and_fail():
+            return self.send_json(500, {'error': {'type': 'api_error', 'message': 'Stub failure'}})
+
+        if method == 'POST' and path == '/v1/checkout/sessions':
+            return self.send_json(200, self.server.create_checkout_session(form))
+        if method == 'GET' and path.startswith('/v1/checkout/sessions/'):
+            session_id = path.rsplit('/', 1)[1]
+            with self.server.lock:
+                checkout_session = self.server.sessions.get(session_id)
+            if checkout_session:
+                return self.send_json(200, checkout_session)
+            return self.send_json(404, {'error': {
+                'type': 'invalid_request_error',
+                'message': f"No such checkout.session: '{session_id}'",
+            }})
+        if method == 'POST' and path == '/v1/billing_portal/sessions':
+            number = self.server.next_number()
+            return self.send_json(200, {
+                'id': f'bps_stub_{number:08d}',
+                'object': 'billing_portal.session',
+                'customer': form.get('customer'),
+                'url': f'{self.server.url}/billing/bps_stub_{number:08d}',
+            })
+        if method == 'GET' and path == '/v1/events':
+            return self.send_json(200, {'object': 'list', 'data': [], 'has_more': False, 'url': '/v1/events'})
+        return self.send_json(404, {'error': {
+            'type': 'invalid_request_error',
+            'message': f'Unrecognized request URL ({method}: {path})',
+        }})
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Request-Id', f'req_stub_{self.server.next_number():08d}')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the Stripe API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12111)
+    parser.add_argument('--latency-ms', type=float, default=0, help='added to every response')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='latency varies by up to this much')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls answered with a 500')
+    parser.add_argument('--webhook-url', help='deliver checkout.session.completed here')
+    parser.add_argument('--webhook-secret', help='the backend\'s STRIPE_WEBHOOK_SECRET')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+    if args.webhook_url and not args.webhook_secret:
+        parser.error('--webhook-url needs --webhook-secret')
+
+    server = StripeStub((args.host, args.port), args.latency_ms, args.jitter_ms, args.error_rate,
+                        args.webhook_url, args.webhook_secret, args.seed)
+    print(f'Stripe stub listening on {server.url}; start the backend with STRIPE_API_BASE={server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Throughput of POST /api/training/bulk against one POST /api/training per row.
+
+Needs DATABASE_URL pointing at a database initialized by the app; it creates
+a throwaway company and user, times both paths through the Flask test client and
+deletes everything it created.
+
+    python -m backend.bench.training_import [--rows 2000] [--per-row-rows 200]
+
+Requests go through the test client, so these numbers exclude network round
+trips; over the internet the per-row path pays one more round trip per row.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def training_rows(count):
+    for number in range(count):
+        yield {
+            'training_date': f'2026-{number % 12 + 1:02d}-{number % 28 + 1:02d}',
+            'training_type': 'Annual SB 553 refresher',
+            'trainer_name': 'Pat Trainer',
+            'topic_description': f'Session {number}',
+            'attendee_count': number % 40 + 1,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare bulk and per-row training imports.')
+    parser.add_argument('--rows', type=int, default=2000, help='rows sent through the bulk endpoint')
+    parser.add_argument('--per-row-rows', type=int, default=200, help='rows sent one request at a time')
+    args = parser.parse_args(argv)
+
+    if not os.environ.get('DATABASE_URL'):
+        print('DATABASE_URL must point at a disposable database')
+        return 2
+
+    from backend import app as app_module
+    from backend import migrate
+    from backend.database import get_db
+
+    migrate.migrate()
+    app_module.create_app()
+    app_module.app.config.update(TESTING=True)
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('''INSERT INTO companies (name, tier, subscription_status, created_at)
+                 VALUES ('Training import benchmark', 'annual', 'active', now()) RETURNING id''')
+    company_id = c.fetchone()['id']
+    c.execute('''INSERT INTO users (company_id, email, name, created_at)
+                 VALUES (%s, %s, 'Benchmark', now()) RETURNING id''',
+              (company_id, f'training-import-{company_id}@example.com'))
+    user_id = c.fetchone()['id']
+    conn.commit()
+
+    try:
+        with app_module.app.test_client() as client:
+            with client.session_transaction() as flask_session:
+                flask_session['user_id'] = user_id
+                flask_session['company_id'] = company_id
+
+            started = time.perf_counter()
+            for row in training_rows(args.per_row_rows):
+                response = client.post('/api/training', json=row)
+                assert response.status_code == 201, response.get_json()
+            per_row_rate = args.per_row_rows / (time.perf_counter() - started)
+
+            upload = ''.join(json.dumps(row) + '\n' for row in training_rows(args.rows))
+            started = time.perf_counter()
+            response = client.post('/api/training/bulk', data=upload, content_type='application/x-ndjson')
+            bulk_seconds = time.perf_counter() - started
+            assert response.status_code == 201, response.get_json()
+            bulk_rate = args.rows / bulk_seconds
+
+            started = time.perf_counter()
+            response = client.post('/api/training/bulk?dry_run=1', data=upload,
+                                   content_type='application/x-ndjson')
+            dry_run_rate = args.rows / (time.perf_counter() - started)
+            assert response.status_code == 200, response.get_json()
+    finally:
+        c.execute('DELETE FROM training_records WHERE company_id = %s', (company_id,))
+        c.execute('DELETE FROM users WHERE company_id = %s', (company_id,))
+        c.execute('DELETE FROM companies WHERE id = %s', (company_id,))
+        conn.commit()
+        conn.close()
+
+    print(f'per-row POST /api/training:   {per_row_rate:10.0f} rows/s ({args.per_row_rows} rows)')
+    print(f'POST /api/training/bulk:      {bulk_rate:10.0f} rows/s ({args.rows} rows in {bulk_seconds:.2f} s)')
+    print(f'bulk with ?dry_run=1:         {dry_run_rate:10.0f} rows/s')
+    print(f'speedup: {bulk_rate / per_row_rate:.0f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Shared plumbing for the CSV / NDJSON bulk import endpoints.
+
+Uploads are parsed as a stream and each record is validated by the same
+function the single-record endpoint uses. Valid rows go straight into a
+Postgres COPY in one transaction; if any row is rejected, the transaction is
+rolled back and every rejection is reported with its row number, so an import
+is all-or-nothing and can simply be fixed and re-sent.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time
+
+CSV_CONTENT_TYPES = ('text/csv', 'application/csv')
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# Rejections listed in a response; the total count is always reported.
+MAX_REPORTED_ERRORS = 100
+
+# The range of Postgres INTEGER; parse_int rejects anything outside it.
+INTEGER_MIN = -2**31
+INTEGER_MAX = 2**31 - 1
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n'}
+
+
+class RowError(ValueError):
+    """A record that fails validation; `field` names the offending field."""
+
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+
+
+class TooManyRows(Exception):
+    pass
+
+
+class UnreadableUpload(ValueError):
+    """An upload that is not UTF-8 text or not parseable CSV."""
+
+
+def read_records(stream, content_type, max_rows):
+    """Yield (row_number, record_or_error) pairs from an upload stream.
+
+    CSV row numbers match the spreadsheet (the header is row 1); NDJSON row
+    numbers are line numbers. Unparseable NDJSON lines yield a RowError.
+    Raises LookupError for an unsupported content type, TooManyRows once
+    the upload exceeds max_rows and UnreadableUpload for bytes that are not
+    UTF-8 or CSV that the csv module rejects.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if content_type in CSV_CONTENT_TYPES:
+        # Cells beyond the header row land under the key None; drop them.
+        rows = ((number, {key: value for key, value in record.items() if key is not None})
+                for number, record in enumerate(csv.DictReader(text), 2))
+    elif content_type in NDJSON_CONTENT_TYPES:
+        rows = _ndjson_rows(text)
+    else:
+        raise LookupError(content_type)
+
+    try:
+        for count, row in enumerate(rows, 1):
+            if count > max_rows:
+                raise TooManyRows()
+            yield row
+    except UnicodeDecodeError:
+        raise UnreadableUpload('The upload is not UTF-8 text; save it as CSV UTF-8')
+    except csv.Error as e:
+        raise UnreadableUpload(f'The CSV could not be read: {e}')
+
+
+def _ndjson_rows(text):
+    for number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, RowError(None, f'Invalid JSON: {e.msg}')
+            continue
+        if not isinstance(record, dict):
+            yield number, RowError(None, 'Each line must be a JSON object')
+            continue
+        yield number, record
+
+
+def require(data, field):
+    value = data.get(field)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise RowError(field, f'{field} is required')
+    return value
+
+
+def parse_text(data, field, required=False, default=''):
+    """A text field; anything but a string, or a NUL Postgres cannot store, is a RowError."""
+    value = require(data, field) if required else data.get(field, default)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise RowError(field, f'{field} must be text')
+    if '\x00' in value:
+        raise RowError(field, f'{field} cannot contain NUL characters')
+    return value
+
+
+def parse_date(data, field):
+    value = require(data, field)
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    for pattern in ('%Y-%m-%d', '%m/%d/%Y'):
+        try:
+            return datetime.strptime(value, pattern).date()
+        except ValueError:
+            pass
+    raise RowError(field, f'{field} must be a date like 2026-01-31')
+
+
+def parse_time(data, field):
+    value = require(data, field)
+    if isinstance(value, time):
+        return value
+    value = str(value).strip()
+    for pattern in ('%H:%M', '%H:%M:%S', '%I:%M %p'):
+        try:
+            return datetime.strptime(value.upper(), pattern).time()
+        except ValueError:
+            pass
+    raise RowError(field, f'{field} must be a time like 14:30')
+
+
+def parse_flag(data, field):
+    value = data.get(field)
+    if not isinstance(value, str):
+        return 1 if value else 0
+    if value.strip().lower() in TRUE_VALUES:
+        return 1
+    if value.strip().lower() in FALSE_VALUES:
+        return 0
+    raise RowError(field, f'{field} must be yes or no')
+
+
+def parse_list(data, field):
+    """A JSON list, or in CSV a JSON array or semicolon-separated cell."""
+    value = data.get(field)
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        if value.lstrip().startswith('['):
+            try:
+                parsed = json.loads(value)
+            except ValueError:
+                raise RowError(field, f'{field} is not a valid JSON array')
+            if isinstance(parsed, list):
+                return parsed
+        else:
+            return [item.strip() for item in value.split(';') if item.strip()]
+    raise RowError(field, f'{field} must be a list')
+
+
+def parse_int(data, field):
+    """A whole number that fits a Postgres INTEGER column."""
+    value = data.get(field)
+    if value is None or value == '':
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise RowError(field, f'{field} must be a whole number')
+    if not INTEGER_MIN <= number <= INTEGER_MAX:
+        raise RowError(field, f'{field} is too large')
+    return number
+
+
+def import_rows(copy, rows, to_values, on_row=None):
+    """Validate every row, writing the valid ones to `copy` while none has failed.
+
+    Returns (valid_count, errors). `to_values(record)` maps a record to the
+    COPY column values or raises RowError; `on_row(record, values)` is called
+    for each row written. With copy=None rows are only validated.
+    """
+    imported = 0
+    errors = []
+    for number, record in rows:
+        try:
+            if isinstance(record, RowError):
+                raise record
+            values = to_values(record)
+        except RowError as e:
+            errors.append({'row': number, 'field': e.field, 'error': str(e)})
+            continue
+        if errors:
+            # The import will be rolled back; keep validating to report everything.
+            continue
+        if copy is not None:
+            copy.write_row(values)
+        if on_row:
+            on_row(record, values)
+        imported += 1
+    return imported, errors
+
+
+def error_summary(errors):
+    return {
+        'error_count': len(errors),
+        'errors': errors[:MAX_REPORTED_ERRORS],
+    }
@@ -0,0 +1,77 @@
+"""A circuit breaker for calls to a service that may be down or slow.
+
+After `failure_threshold` consecutive failures the breaker opens and callers
+get CircuitOpen immediately (the app answers 503) instead of each waiting out
+connect and read timeouts. After `reset_seconds` one trial call is let
+through: success closes the breaker, failure opens it again.
+"""
+import threading
+import time
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a service while its breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f'{name} is unavailable; retry in {retry_after:.0f} s')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold, reset_seconds, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._opened = 0
+        self._rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go ahead now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            waited = self._clock() - self._opened_at
+            if self._state == self.OPEN and waited >= self.reset_seconds:
+                # Let this caller through as the trial; others keep failing fast.
+                self._state = self.HALF_OPEN
+                return
+            self._rejected += 1
+            raise CircuitOpen(self.name, max(1.0, self.reset_seconds - waited))
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (
+                    self._state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._opened += 1
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'times_opened': self._opened,
+                'rejected': self._rejected,
+            }
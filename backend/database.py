@@ -2,10 +2,47 @@
 
 Replaces the old SQLite connection pattern. Uses psycopg3 with dict_row
 so fetchone() / fetchall() return dicts (matching the old sqlite3.Row behavior).
+
+Connections come from a process-wide psycopg_pool.ConnectionPool so a request
+no longer pays a TCP+TLS+auth handshake. close() hands the connection back to
+the pool instead of disconnecting. Nothing closes a forgotten connection, so
+handlers use app.request_db() (returned by the request teardown) or close
+their own get_db() connection in a finally block.
+
+Pool checkouts and statements are timed for request_metrics (GET /metrics),
+and statements over SLOW_QUERY_MS go to the slow-query log (slow_queries).
+
+The ASGI mode (backend.asgi) also reads through an AsyncConnectionPool of the
+same size, opened and closed with the event loop; see async_db().
 """
+import atexit
+import contextlib
 import os
+import threading
+import time
 import psycopg
+import psycopg.sql
+from psycopg.pq import TransactionStatus
 from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+try:
+    from . import request_metrics
+    from .slow_queries import slow_query_log
+except ImportError:
+    import request_metrics
+    from slow_queries import slow_query_log
+
+# Pool sizing is per process (each gunicorn worker has its own pool), so
+# DB_POOL_MAX_SIZE x worker count must stay below Postgres max_connections.
+POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+POOL_MAX_IDLE_SECONDS = float(os.environ.get('DB_POOL_MAX_IDLE_SECONDS', 300))
+POOL_TIMEOUT_SECONDS = float(os.environ.get('DB_POOL_TIMEOUT_SECONDS', 10))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
 
 def get_database_url():
     """Read and normalize the database URL at connection time."""
@@ -19,14 +56,224 @@ def get_database_url():
     return database_url
 
 
-def get_db():
-    """Open a new Postgres connection with dict_row factory.
+def observe_statement(cursor, query, params, started):
+    """Report a statement to request_metrics and, when it was slow, the slow-query log."""
+    if not query:
+        # The pool's checkout health check; its time is part of the checkout.
+        return
+    seconds = time.perf_counter() - started
+    request_metrics.observe_query(seconds)
+    if slow_query_log.enabled and seconds * 1000 >= slow_query_log.threshold_ms:
+        if isinstance(query, psycopg.sql.Composable):
+            query = query.as_string(cursor)
+        elif isinstance(query, bytes):
+            query = query.decode()
+        slow_query_log.record(query, params, seconds, request_metrics.current_route())
 
-    Returns a connection that auto-commits/rolls back via context manager.
-    Use as: `with get_db() as conn: with conn.cursor() as c: ...`
+
+class TimedCursor(psycopg.Cursor):
+    """Reports each statement's duration to request_metrics and the slow-query log."""
+
+    def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            observe_statement(self, query, params, started)
+
+    def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, params_seq, **kwargs)
+        finally:
+            # The parameters of a batch are not described, only its statement.
+            observe_statement(self, query, None, started)
+
+
+class TimedServerCursor(psycopg.ServerCursor):
+    """Times declaring a named cursor; its fetches run as the caller iterates."""
+
+    def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            observe_statement(self, query, params, started)
+
+
+class AsyncTimedCursor(psycopg.AsyncCursor):
+    """TimedCursor for the async pool."""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            observe_statement(self, query, params, started)
+
+
+def use_timed_server_cursors(conn):
+    conn.server_cursor_factory = TimedServerCursor
+
+
+def get_pool():
+    """Return this process's connection pool, creating it on first use.
+
+    The pool is created lazily and keyed to the current pid: a pool inherited
+    across a fork shares sockets with the parent, so the child builds its own
+    instead of touching the parent's connections.
     """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            database_url = get_database_url()
+            if not database_url:
+                raise RuntimeError('DATABASE_URL is not set. Configure it in your env vars.')
+            _pool = ConnectionPool(
+                database_url,
+                kwargs={'row_factory': dict_row, 'cursor_factory': TimedCursor},
+                configure=use_timed_server_cursors,
+                min_size=POOL_MIN_SIZE,
+                max_size=max(POOL_MAX_SIZE, POOL_MIN_SIZE),
+                max_idle=POOL_MAX_IDLE_SECONDS,
+                timeout=POOL_TIMEOUT_SECONDS,
+                # Health check on checkout: a connection dropped by Postgres or a
+                # proxy while idle is replaced instead of failing the request.
+                check=ConnectionPool.check_connection,
+                name='compcleared',
+                open=True,
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+_async_pool = None
+
+
+async def open_async_pool():
+    """Open this process's async pool on the running event loop (ASGI startup)."""
+    global _async_pool
     database_url = get_database_url()
     if not database_url:
         raise RuntimeError('DATABASE_URL is not set. Configure it in your env vars.')
-    conn = psycopg.connect(database_url, row_factory=dict_row)
-    return conn
+    _async_pool = AsyncConnectionPool(
+        database_url,
+        kwargs={'row_factory': dict_row, 'cursor_factory': AsyncTimedCursor},
+        min_size=POOL_MIN_SIZE,
+        max_size=max(POOL_MAX_SIZE, POOL_MIN_SIZE),
+        max_idle=POOL_MAX_IDLE_SECONDS,
+        timeout=POOL_TIMEOUT_SECONDS,
+        check=AsyncConnectionPool.check_connection,
+        name='compcleared-async',
+        open=False,
+    )
+    await _async_pool.open()
+    return _async_pool
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+    _async_pool = None
+
+
+@contextlib.asynccontextmanager
+async def async_db():
+    """Check out a connection from the async pool; it goes back rolled back.
+
+    Use as: `async with async_db() as conn: ...`. Raises psycopg_pool.PoolTimeout like get_db().
+    """
+    if _async_pool is None:
+        raise RuntimeError('The async pool is not open; run under backend.asgi')
+    started = time.perf_counter()
+    conn = await _async_pool.getconn()
+    request_metrics.observe_db_connect(time.perf_counter() - started)
+    try:
+        yield conn
+    finally:
+        try:
+            if not conn.closed and conn.info.transaction_status != TransactionStatus.IDLE:
+                await conn.rollback()
+        except psycopg.Error:
+            pass
+        finally:
+            await _async_pool.putconn(conn)
+
+
+def close_pool():
+    """Close this process's pool (used on shutdown and in tests)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+        _pool_pid = None
+
+
+atexit.register(close_pool)
+
+
+class PooledConnection:
+    """A pooled psycopg connection whose close() returns it to the pool.
+
+    Everything else is delegated to the underlying connection, so handlers use
+    it exactly like the connection psycopg.connect() used to return. As with a
+    real close, an uncommitted transaction is rolled back.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get('_conn')
+        if conn is None:
+            raise psycopg.InterfaceError('the connection is closed')
+        return getattr(conn, name)
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            if not conn.closed and conn.info.transaction_status != TransactionStatus.IDLE:
+                conn.rollback()
+        except psycopg.Error:
+            # The pool discards connections it cannot reset.
+            pass
+        finally:
+            self._pool.putconn(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if self._conn is not None and not self._conn.closed:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+
+
+def get_db():
+    """Check out a pooled Postgres connection with dict_row factory.
+
+    Returns a connection that auto-commits/rolls back via context manager and
+    goes back to the pool on close(). Raises psycopg_pool.PoolTimeout when no connection
+    frees up within DB_POOL_TIMEOUT_SECONDS.
+    Use as: `with get_db() as conn: with conn.cursor() as c: ...`
+    """
+    pool = get_pool()
+    started = time.perf_counter()
+    conn = pool.getconn()
+    request_metrics.observe_db_connect(time.perf_counter() - started)
+    return PooledConnection(pool, conn)
+
@@ -0,0 +1,153 @@
+"""Password hashing off the request thread, with a hard bound on queued work.
+
+pbkdf2 is deliberately slow, and hashlib releases the GIL while it runs, so a
+small pool of hashing threads leaves the worker's other request threads free
+for cheap endpoints. When the pool and its queue are full, callers get
+HashingBusy immediately (the app answers 503) instead of piling up.
+
+The work factor is PASSWORD_HASH_ITERATIONS. Hashes made with a different
+factor still verify, and are replaced on the user's next successful login.
+To pick a factor for a latency budget:
+    python -m backend.hashing calibrate --target-ms 250
+"""
+import argparse
+import hashlib
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool and its queue are full."""
+
+
+class LatencyStats:
+    """Count, total, max and recent percentiles of a latency in milliseconds."""
+
+    def __init__(self, window=1024):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self._recent.append(ms)
+
+    def snapshot(self):
+        recent = sorted(self._recent)
+
+        def percentile(fraction):
+            return round(recent[min(len(recent) - 1, int(len(recent) * fraction))], 2) if recent else None
+
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 2) if self.count else None,
+            'max_ms': round(self.max_ms, 2),
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+        }
+
+
+class PasswordHasher:
+    def __init__(self, iterations, max_workers, max_queue, clock=time.perf_counter):
+        self.iterations = iterations
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._clock = clock
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+        self._queue_wait = LatencyStats()
+        self._hash_latency = LatencyStats()
+
+    @property
+    def method(self):
+        return f'pbkdf2:sha256:{self.iterations}'
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash, password):
+        """Return (matches, needs_rehash) for a stored hash."""
+        matches = self._run(check_password_hash, password_hash, password)
+        return matches, matches and self.needs_rehash(password_hash)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'iterations': self.iterations,
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'rejected': self._rejected,
+                'queue_wait': self._queue_wait.snapshot(),
+                'hash_latency': self._hash_latency.snapshot(),
+            }
+
+    def _run(self, function, *args, **kwargs):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise HashingBusy()
+            self._in_flight += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='password-hash')
+            executor = self._executor
+        submitted = self._clock()
+
+        def timed():
+            started = self._clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                finished = self._clock()
+                with self._lock:
+                    self._queue_wait.observe((started - submitted) * 1000)
+                    self._hash_latency.observe((finished - started) * 1000)
+
+        try:
+            return executor.submit(timed).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+def calibrate(target_ms, samples=3):
+    """Return the iteration count whose pbkdf2-sha256 hash takes about target_ms here."""
+    probe = 100_000
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hashlib.pbkdf2_hmac('sha256', b'calibration', b'calibration-salt', probe)
+        timings.append(time.perf_counter() - started)
+    per_iteration_ms = min(timings) * 1000 / probe
+    return int(target_ms / per_iteration_ms) // 10_000 * 10_000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tune the password hashing work factor.')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    calibrate_parser = subcommands.add_parser('calibrate', help='suggest PASSWORD_HASH_ITERATIONS')
+    calibrate_parser.add_argument('--target-ms', type=float, default=250)
+    args = parser.parse_args(argv)
+
+    iterations = calibrate(args.target_ms)
+    print(f'PASSWORD_HASH_ITERATIONS={iterations}  # ~{args.target_ms:.0f} ms per hash on this machine')
+    print(f'(werkzeug default: {DEFAULT_PBKDF2_ITERATIONS})')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
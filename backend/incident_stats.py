@@ -0,0 +1,150 @@
+"""Incrementally maintained incident statistics for the dashboard.
+
+incident_type_counts keeps one counter per (company, violence_type) and
+incident_daily_counts one per (company, incident_date). create_incident bumps
+both in its own transaction, so /api/stats reads a handful of counter rows
+instead of aggregating a tenant's whole incident history.
+
+Admin commands:
+    python -m backend.incident_stats rebuild [--company-id ID]
+    python -m backend.incident_stats check [--company-id ID]
+"""
+import argparse
+import sys
+from collections import Counter
+
+try:
+    from .database import get_db
+except ImportError:
+    from database import get_db
+
+
+def record_incidents(c, company_id, incidents):
+    """Count new incidents into the rollup; call inside the inserting transaction.
+
+    `incidents` is an iterable of (violence_type, incident_date) pairs.
+    """
+    by_type = Counter()
+    by_day = Counter()
+    for violence_type, incident_date in incidents:
+        by_type[violence_type] += 1
+        by_day[incident_date] += 1
+    # Sorted so concurrent writers lock counter rows in the same order.
+    c.executemany('''INSERT INTO incident_type_counts (company_id, violence_type, incident_count)
+                     VALUES (%s, %s, %s)
+                     ON CONFLICT (company_id, violence_type) DO UPDATE
+                     SET incident_count = incident_type_counts.incident_count + EXCLUDED.incident_count''',
+                  [(company_id, violence_type, count) for violence_type, count in sorted(by_type.items())])
+    c.executemany('''INSERT INTO incident_daily_counts (company_id, incident_date, incident_count)
+                     VALUES (%s, %s, %s)
+                     ON CONFLICT (company_id, incident_date) DO UPDATE
+                     SET incident_count = incident_daily_counts.incident_count + EXCLUDED.incident_count''',
+                  [(company_id, incident_date, count)
+                   for incident_date, count in sorted(by_day.items(), key=lambda item: str(item[0]))])
+
+
+STATS_BY_TYPE_QUERY = '''SELECT violence_type, incident_count AS count FROM incident_type_counts
+                         WHERE company_id = %s AND incident_count > 0
+                         ORDER BY violence_type'''
+# At most one row per day in the window, however long the history is.
+STATS_RECENT_QUERY = '''SELECT COALESCE(SUM(incident_count), 0) AS count FROM incident_daily_counts
+                        WHERE company_id = %s AND incident_date >= %s'''
+
+
+def load_stats(c, company_id, since):
+    """Return the /api/stats payload: totals, by-type breakdown and count since `since`."""
+    c.execute(STATS_BY_TYPE_QUERY, (company_id,))
+    by_type = [dict(row) for row in c.fetchall()]
+    c.execute(STATS_RECENT_QUERY, (company_id, since))
+    return stats_payload(by_type, c.fetchone()['count'])
+
+
+def stats_payload(by_type, recent):
+    return {
+        'total_incidents': sum(row['count'] for row in by_type),
+        'by_type': by_type,
+        'recent_30_days': recent,
+    }
+
+
+def rebuild(conn, company_id=None):
+    """Recompute the rollup from the incidents table in one transaction.
+
+    The EXCLUSIVE lock makes concurrent create_incident calls wait for the
+    rebuild to commit before adding their own +1, so no increment is lost or
+    double counted.
+    """
+    c = conn.cursor()
+    c.execute('LOCK TABLE incident_type_counts, incident_daily_counts IN EXCLUSIVE MODE')
+    scope = 'WHERE company_id = %s' if company_id is not None else ''
+    params = (company_id,) if company_id is not None else ()
+    c.execute(f'DELETE FROM incident_type_counts {scope}', params)
+    c.execute(f'DELETE FROM incident_daily_counts {scope}', params)
+    c.execute(f'''INSERT INTO incident_type_counts (company_id, violence_type, incident_count)
+                  SELECT company_id, violence_type, COUNT(*) FROM incidents
+                  {scope} GROUP BY company_id, violence_type''', params)
+    c.execute(f'''INSERT INTO incident_daily_counts (company_id, incident_date, incident_count)
+                  SELECT company_id, incident_date::date, COUNT(*) FROM incidents
+                  {scope} GROUP BY company_id, incident_date::date''', params)
+    conn.commit()
+
+
+def check(conn, company_id=None):
+    """Compare the rollup with the raw incidents; returns a list of mismatches."""
+    c = conn.cursor()
+    scope = 'WHERE company_id = %s' if company_id is not None else ''
+    params = (company_id,) if company_id is not None else ()
+    c.execute(f'''SELECT 'violence_type' AS bucket, company_id, violence_type AS bucket_key,
+                         COALESCE(rollup.incident_count, 0) AS rollup_count,
+                         COALESCE(raw.incident_count, 0) AS raw_count
+                  FROM (SELECT * FROM incident_type_counts {scope}) AS rollup
+                  FULL OUTER JOIN (SELECT company_id, violence_type, COUNT(*) AS incident_count
+                                   FROM incidents {scope}
+                                   GROUP BY company_id, violence_type) AS raw
+                  USING (company_id, violence_type)
+                  WHERE COALESCE(rollup.incident_count, 0) <> COALESCE(raw.incident_count, 0)''',
+              params + params)
+    mismatches = [dict(row) for row in c.fetchall()]
+    c.execute(f'''SELECT 'incident_date' AS bucket, company_id, incident_date::text AS bucket_key,
+                         COALESCE(rollup.incident_count, 0) AS rollup_count,
+                         COALESCE(raw.incident_count, 0) AS raw_count
+                  FROM (SELECT * FROM incident_daily_counts {scope}) AS rollup
+                  FULL OUTER JOIN (SELECT company_id, incident_date::date AS incident_date,
+                                          COUNT(*) AS incident_count
+                                   FROM incidents {scope}
+                                   GROUP BY company_id, incident_date::date) AS raw
+                  USING (company_id, incident_date)
+                  WHERE COALESCE(rollup.incident_count, 0) <> COALESCE(raw.incident_count, 0)''',
+              params + params)
+    mismatches.extend(dict(row) for row in c.fetchall())
+    conn.rollback()
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Maintain the incident statistics rollup.')
+    parser.add_argument('command', choices=['rebuild', 'check'])
+    parser.add_argument('--company-id', type=int, help='limit to one company')
+    args = parser.parse_args(argv)
+
+    conn = get_db()
+    try:
+        if args.command == 'rebuild':
+            rebuild(conn, args.company_id)
+            print('✅ Incident statistics rebuilt')
+            return 0
+        mismatches = check(conn, args.company_id)
+    finally:
+        conn.close()
+
+    for mismatch in mismatches:
+        print(f"❌ company {mismatch['company_id']} {mismatch['bucket']}={mismatch['bucket_key']}: "
+              f"rollup {mismatch['rollup_count']}, incidents {mismatch['raw_count']}")
+    if mismatches:
+        return 1
+    print('✅ Incident statistics match the incidents table')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""Versioned schema migrations.
+
+Each schema change is a numbered module in backend/migrations, e.g.
+0004_tenant_indexes.py, with an upgrade(conn) function. The versions applied
+to a database are rows of schema_migrations. Apply the pending ones before
+starting a new release:
+
+    python -m backend.migrate [up [--target N]]
+    python -m backend.migrate status
+
+A migration runs in one transaction together with its schema_migrations row,
+so it either applies completely or not at all. A module that sets
+TRANSACTIONAL = False manages its own transactions instead, for steps that
+cannot run inside one (CREATE INDEX CONCURRENTLY) or that commit in batches.
+Such a migration is recorded only after upgrade() returns, so it must be safe
+to run again after an interruption.
+
+Migrations hold a Postgres advisory lock, so when several containers start at
+once only one migrates and the others wait and then find nothing to do.
+Statements give up after MIGRATION_LOCK_TIMEOUT_MS waiting for a table lock
+instead of queueing every request behind a long transaction; rerun later.
+
+Web and background workers only call verify_schema() at startup. It refuses
+to start a build whose migrations have not all been applied.
+"""
+import argparse
+import importlib
+import os
+import pkgutil
+import sys
+import time
+from dataclasses import dataclass
+from types import ModuleType
+
+import psycopg
+from psycopg.pq import TransactionStatus
+
+try:
+    from .database import get_database_url
+except ImportError:
+    from database import get_database_url
+
+MIGRATIONS_PACKAGE = f'{__package__}.migrations' if __package__ else 'migrations'
+MIGRATION_LOCK_TIMEOUT_MS = int(os.environ.get('MIGRATION_LOCK_TIMEOUT_MS', 5000))
+
+# pg_advisory_lock key shared by every migrating process ("ccmigrat").
+ADVISORY_LOCK_ID = 0x63636D6967726174
+# A waiting process polls for the lock: blocking in pg_advisory_lock() would
+# hold a transaction open that CREATE INDEX CONCURRENTLY in the lock holder
+# waits for, and the two would deadlock.
+ADVISORY_LOCK_POLL_SECONDS = 1
+
+# init_db recorded version 4 in the schema_version table once everything up
+# to migration 0004 was in place; such a database adopts those as applied.
+LEGACY_SCHEMA_VERSION = 4
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+    @property
+    def transactional(self):
+        return getattr(self.module, 'TRANSACTIONAL', True)
+
+    def __str__(self):
+        return f'{self.version:04d}_{self.name}'
+
+
+def discover(package=MIGRATIONS_PACKAGE):
+    """The migration modules of `package`, ordered by version."""
+    migrations = {}
+    for info in pkgutil.iter_modules(importlib.import_module(package).__path__):
+        number, _, name = info.name.partition('_')
+        if not number.isdigit():
+            continue
+        if int(number) in migrations:
+            raise MigrationError(f'Two migrations are numbered {number}: {migrations[int(number)]} and {info.name}')
+        migrations[int(number)] = Migration(int(number), name, importlib.import_module(f'{package}.{info.name}'))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def create_index_concurrently(c, index_name, definition, unique=False):
+    """Build an index without blocking writes; the cursor must be in autocommit.
+
+    A failed concurrent build leaves an INVALID index behind that IF NOT EXISTS
+    would happily skip, so that leftover is dropped and rebuilt.
+    """
+    c.execute('''SELECT idx.indisvalid
+                 FROM pg_index AS idx
+                 JOIN pg_class AS cls ON cls.oid = idx.indexrelid
+                 WHERE cls.relname = %s
+                   AND cls.relnamespace = current_schema()::regnamespace''', (index_name,))
+    existing = c.fetchone()
+    if existing and existing[0]:
+        return
+    if existing:
+        c.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {index_name}')
+    c.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {definition}")
+
+
+def connect(database_url=None):
+    database_url = database_url or get_database_url()
+    if not database_url:
+        raise MigrationError('DATABASE_URL is not set. Configure it in your env vars.')
+    # RESET lock_timeout in a migration returns to this value.
+    return psycopg.connect(database_url, autocommit=True,
+                           options=f'-c lock_timeout={MIGRATION_LOCK_TIMEOUT_MS}')
+
+
+def applied_versions(conn):
+    """Versions recorded in schema_migrations; empty when the table does not exist yet."""
+    if conn.execute("SELECT to_regclass('schema_migrations') IS NULL").fetchone()[0]:
+        return set()
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations').fetchall()}
+
+
+def adopt_legacy_schema(conn, migrations):
+    """Record the baseline migrations of a database that init_db already brought up to date."""
+    if conn.execute("SELECT to_regclass('schema_version') IS NULL").fetchone()[0]:
+        return
+    if (conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0) < LEGACY_SCHEMA_VERSION:
+        return
+    baseline = [migration for migration in migrations if migration.version <= LEGACY_SCHEMA_VERSION]
+    with conn.transaction():
+        for migration in baseline:
+            conn.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+                         (migration.version, migration.name))
+    print(f"✅ Adopted the existing schema as migrations {', '.join(map(str, baseline))}")
+
+
+def apply(conn, migration):
+    started = time.perf_counter()
+    record = ('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)', (migration.version, migration.name))
+    if migration.transactional:
+        with conn.transaction():
+            migration.module.upgrade(conn)
+            conn.execute(*record)
+    else:
+        conn.autocommit = False
+        try:
+            migration.module.upgrade(conn)
+            if conn.info.transaction_status != TransactionStatus.IDLE:
+                raise MigrationError(f'{migration} returned with its transaction still open')
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+        conn.execute(*record)
+    print(f"✅ Applied migration {migration} in {time.perf_counter() - started:.1f} s")
+
+
+def migrate(database_url=None, target=None, migrations=None):
+    """Apply pending migrations up to `target` (default: all); returns the ones applied."""
+    migrations = discover() if migrations is None else migrations
+    applied = []
+    with connect(database_url) as conn:
+        if not conn.execute('SELECT pg_try_advisory_lock(%s)', (ADVISORY_LOCK_ID,)).fetchone()[0]:
+            print('⏳ Another process is applying migrations; waiting for it')
+            while not conn.execute('SELECT pg_try_advisory_lock(%s)', (ADVISORY_LOCK_ID,)).fetchone()[0]:
+                time.sleep(ADVISORY_LOCK_POLL_SECONDS)
+        try:
+            conn.execute('''CREATE TABLE IF NOT EXISTS schema_migrations (
+                                version INTEGER PRIMARY KEY,
+                                name TEXT NOT NULL,
+                                applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                            )''')
+            if not applied_versions(conn):
+                adopt_legacy_schema(conn, migrations)
+            done = applied_versions(conn)
+            for migration in migrations:
+                if migration.version in done or (target is not None and migration.version > target):
+                    continue
+                apply(conn, migration)
+                applied.append(migration)
+        finally:
+            # Closing the connection releases the lock too.
+            if not conn.closed and conn.info.transaction_status == TransactionStatus.IDLE:
+                conn.execute('SELECT pg_advisory_unlock(%s)', (ADVISORY_LOCK_ID,))
+    return applied
+
+
+def verify_schema(database_url=None, migrations=None):
+    """Check, without changing anything, that every migration of this build is applied.
+
+    Raises SchemaOutOfDate otherwise. A database ahead of the build (during a
+    rollback) is fine: migrations only add to the schema.
+    """
+    database_url = database_url or get_database_url()
+    if not database_url:
+        print("⚠️  DATABASE_URL not set — skipping the schema check")
+        return
+    migrations = discover() if migrations is None else migrations
+    with psycopg.connect(database_url) as conn:
+        done = applied_versions(conn)
+    missing = [str(migration) for migration in migrations if migration.version not in done]
+    if missing:
+        raise SchemaOutOfDate(f"The database is missing migrations {', '.join(missing)}; "
+                              f"run python -m backend.migrate before starting this build")
+
+
+def status(database_url=None):
+    """(migration, applied) for every known migration."""
+    with connect(database_url) as conn:
+        done = applied_versions(conn)
+    return [(migration, migration.version in done) for migration in discover()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply or list schema migrations.')
+    subcommands = parser.add_subparsers(dest='command')
+    up_parser = subcommands.add_parser('up', help='apply pending migrations (the default)')
+    up_parser.add_argument('--target', type=int, help='stop after this version')
+    subcommands.add_parser('status', help='list migrations and whether each is applied')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'status':
+            for migration, applied in status():
+                print(f"{'applied' if applied else 'pending':<8} {migration}")
+            return 0
+        applied = migrate(target=getattr(args, 'target', None))
+    except (MigrationError, psycopg.Error) as e:
+        print(f'❌ Migration failed: {e}')
+        return 1
+    if not applied:
+        print('✅ Schema is up to date')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
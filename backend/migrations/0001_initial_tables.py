@@ -0,0 +1,147 @@
+"""The tables as init_db created them, before migrations were versioned."""
+
+
+def upgrade(conn):
+    c = conn.cursor()
+
+    # Companies table
+    c.execute('''CREATE TABLE IF NOT EXISTS companies (
+                    id SERIAL PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    tier TEXT NOT NULL,
+                    employee_count INTEGER,
+                    locations TEXT,
+                    created_at TEXT,
+                    subscription_status TEXT,
+                    stripe_customer_id TEXT,
+                    stripe_subscription_id TEXT
+                )''')
+    # Bumped with every change to a company's incidents or training records
+    # (see data_versioned). A constant default keeps this a catalog-only change.
+    c.execute('ALTER TABLE companies ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0')
+
+    # Users table
+    c.execute('''CREATE TABLE IF NOT EXISTS users (
+                    id SERIAL PRIMARY KEY,
+                    company_id INTEGER,
+                    email TEXT UNIQUE NOT NULL,
+                    password_hash TEXT,
+                    name TEXT,
+                    role TEXT,
+                    location_id TEXT,
+                    created_at TEXT,
+                    FOREIGN KEY (company_id) REFERENCES companies (id)
+                )''')
+
+    # This table is intentionally independent of Flask's signed client cookie. It
+    # makes the authorization durable across a webhook/browser race and lets the
+    # signup transaction consume it exactly once.
+    c.execute('''CREATE TABLE IF NOT EXISTS checkout_authorizations (
+                    checkout_session_id TEXT PRIMARY KEY,
+                    company_id INTEGER NOT NULL REFERENCES companies (id),
+                    expires_at TIMESTAMPTZ NOT NULL,
+                    consumed_at TIMESTAMPTZ
+                )''')
+    # Existing databases may have received the initial table before consumed_at
+    # was introduced; this makes the change safe to deploy repeatedly.
+    c.execute('''ALTER TABLE checkout_authorizations
+                 ADD COLUMN IF NOT EXISTS consumed_at TIMESTAMPTZ''')
+    c.execute('''CREATE INDEX IF NOT EXISTS checkout_authorizations_expiry_idx
+                 ON checkout_authorizations (expires_at)''')
+    # Stripe can deliver subscription cancellation before checkout completion.
+    # Retain that fact even while the company is still pending.
+    c.execute('''CREATE TABLE IF NOT EXISTS canceled_stripe_subscriptions (
+                    stripe_subscription_id TEXT PRIMARY KEY,
+                    canceled_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                )''')
+
+    # Workplace Violence Incidents table (SB 553 compliant)
+    c.execute('''CREATE TABLE IF NOT EXISTS incidents (
+                    id SERIAL PRIMARY KEY,
+                    company_id INTEGER,
+                    location_id TEXT,
+
+                    -- SB 553 Required Fields
+                    incident_date DATE NOT NULL,
+                    incident_time TIME NOT NULL,
+                    exact_location TEXT NOT NULL,
+
+                    violence_type TEXT NOT NULL,
+                    offender_classification TEXT NOT NULL,
+
+                    description TEXT NOT NULL,
+                    circumstances TEXT,
+                    violence_nature TEXT,
+
+                    consequences TEXT,
+                    law_enforcement_contacted INTEGER,
+                    injuries TEXT,
+                    protective_measures TEXT,
+
+                    employees_involved TEXT,
+                    corrective_actions TEXT,
+
+                    logged_by_name TEXT NOT NULL,
+                    logged_by_title TEXT NOT NULL,
+                    log_date TIMESTAMPTZ NOT NULL,
+
+                    created_at TIMESTAMPTZ,
+
+                    FOREIGN KEY (company_id) REFERENCES companies (id)
+                )''')
+
+    # Training records table (SB 553 compliance)
+    c.execute('''CREATE TABLE IF NOT EXISTS training_records (
+                    id SERIAL PRIMARY KEY,
+                    company_id INTEGER,
+                    training_date DATE NOT NULL,
+                    training_type TEXT NOT NULL, -- e.g., Annual, Initial, Post-Incident
+                    trainer_name TEXT,
+                    topic_description TEXT,
+                    attendee_count INTEGER,
+                    documentation_url TEXT, -- Link to signed sign-in sheets
+                    created_at TIMESTAMPTZ,
+                    FOREIGN KEY (company_id) REFERENCES companies (id)
+                )''')
+
+    # Background report rendering queue, drained by report_worker.
+    c.execute('''CREATE TABLE IF NOT EXISTS report_jobs (
+                    id SERIAL PRIMARY KEY,
+                    company_id INTEGER NOT NULL REFERENCES companies (id),
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    filename TEXT,
+                    result BYTEA,
+                    error TEXT,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    started_at TIMESTAMPTZ,
+                    finished_at TIMESTAMPTZ
+                )''')
+
+    # Webhook inbox: verified Stripe events keyed by event id, so redeliveries
+    # are dropped on insert. webhook_worker applies and marks them processed.
+    c.execute('''CREATE TABLE IF NOT EXISTS stripe_events (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    subscription_id TEXT,
+                    stripe_created BIGINT NOT NULL,
+                    payload JSONB NOT NULL,
+                    received_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    retry_at TIMESTAMPTZ,
+                    error TEXT,
+                    processed_at TIMESTAMPTZ
+                )''')
+
+    # Facts from verified checkout.session.completed events, so verify_session
+    # can skip the Stripe API when the webhook arrived first.
+    c.execute('''CREATE TABLE IF NOT EXISTS stripe_checkout_sessions (
+                    id TEXT PRIMARY KEY,
+                    client_reference_id TEXT,
+                    metadata_company_id TEXT,
+                    payment_status TEXT,
+                    subscription_id TEXT,
+                    customer_id TEXT,
+                    received_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )''')
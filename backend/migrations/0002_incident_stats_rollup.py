@@ -0,0 +1,32 @@
+"""Dashboard statistics rollup, maintained by create_incident (see incident_stats).
+
+The tables are created and backfilled from the incidents already stored in
+one transaction, which incident_stats.rebuild() commits.
+"""
+try:
+    from .. import incident_stats
+except ImportError:
+    import incident_stats
+
+TRANSACTIONAL = False
+
+
+def upgrade(conn):
+    c = conn.cursor()
+    c.execute("SELECT to_regclass('incident_type_counts') IS NULL")
+    if c.fetchone()[0] is not True:
+        conn.commit()
+        return
+    c.execute('''CREATE TABLE incident_type_counts (
+                    company_id INTEGER NOT NULL REFERENCES companies (id),
+                    violence_type TEXT NOT NULL,
+                    incident_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (company_id, violence_type)
+                )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS incident_daily_counts (
+                    company_id INTEGER NOT NULL REFERENCES companies (id),
+                    incident_date DATE NOT NULL,
+                    incident_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (company_id, incident_date)
+                )''')
+    incident_stats.rebuild(conn)
@@ -0,0 +1,115 @@
+"""Convert legacy TEXT date/time columns to native types without a table rewrite."""
+import psycopg
+
+try:
+    from ..migrate import MigrationError
+except ImportError:
+    from migrate import MigrationError
+
+TRANSACTIONAL = False
+
+# Columns that earlier versions of init_db created as TEXT, with their native
+# type and whether they are NOT NULL.
+TEMPORAL_COLUMNS = {
+    'incidents': [
+        ('incident_date', 'DATE', True),
+        ('incident_time', 'TIME', True),
+        ('log_date', 'TIMESTAMPTZ', True),
+        ('created_at', 'TIMESTAMPTZ', False),
+    ],
+    'training_records': [
+        ('training_date', 'DATE', True),
+        ('created_at', 'TIMESTAMPTZ', False),
+    ],
+}
+TEMPORAL_BACKFILL_BATCH_SIZE = 5000
+
+
+def native_value(column, sql_type):
+    """SQL converting a legacy TEXT value to `sql_type`.
+
+    Legacy timestamps are naive isoformat() strings in UTC, the app
+    containers' local time. Reading them AT TIME ZONE 'UTC' keeps the
+    session TimeZone out of the conversion.
+    """
+    if sql_type == 'TIMESTAMPTZ':
+        return f"(NULLIF({column}, '')::timestamp AT TIME ZONE 'UTC')"
+    return f"NULLIF({column}, '')::{sql_type}"
+
+
+def upgrade(conn):
+    """Convert legacy TEXT date/time columns to native types without a table rewrite.
+
+    ALTER COLUMN ... TYPE would rewrite the table under an ACCESS EXCLUSIVE lock.
+    Instead each legacy column gets a shadow column that a trigger keeps in
+    sync, the shadow is backfilled in short batches, and the columns are
+    swapped in one brief transaction. An interrupted run resumes safely.
+    """
+    c = conn.cursor()
+    failed = []
+    for table, columns in TEMPORAL_COLUMNS.items():
+        c.execute('''SELECT column_name FROM information_schema.columns
+                     WHERE table_schema = current_schema()
+                       AND table_name = %s AND data_type = 'text' ''', (table,))
+        text_columns = {row[0] for row in c.fetchall()}
+        pending = [column for column in columns if column[0] in text_columns]
+        if not pending:
+            continue
+
+        try:
+            for column, sql_type, _ in pending:
+                c.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}_native {sql_type}')
+            assignments = ' '.join(f"NEW.{column}_native := {native_value(f'NEW.{column}', sql_type)};"
+                                   for column, sql_type, _ in pending)
+            c.execute(f'''CREATE OR REPLACE FUNCTION {table}_native_sync() RETURNS trigger AS $$
+                          BEGIN {assignments} RETURN NEW; END
+                          $$ LANGUAGE plpgsql''')
+            c.execute(f'DROP TRIGGER IF EXISTS {table}_native_sync ON {table}')
+            c.execute(f'''CREATE TRIGGER {table}_native_sync BEFORE INSERT OR UPDATE ON {table}
+                          FOR EACH ROW EXECUTE FUNCTION {table}_native_sync()''')
+            conn.commit()
+
+            c.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+            max_id = c.fetchone()[0]
+            updates = ', '.join(f"{column}_native = {native_value(column, sql_type)}"
+                                for column, sql_type, _ in pending)
+            for start in range(0, max_id, TEMPORAL_BACKFILL_BATCH_SIZE):
+                c.execute(f'UPDATE {table} SET {updates} WHERE id > %s AND id <= %s',
+                          (start, start + TEMPORAL_BACKFILL_BATCH_SIZE))
+                conn.commit()
+
+            # A validated CHECK lets SET NOT NULL skip its table scan under the
+            # exclusive lock; VALIDATE itself does not block writes.
+            for column, _, not_null in pending:
+                if not_null:
+                    c.execute(f'''ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {column}_native_not_null,
+                                  ADD CONSTRAINT {column}_native_not_null
+                                  CHECK ({column}_native IS NOT NULL) NOT VALID''')
+                    conn.commit()
+                    c.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {column}_native_not_null')
+                    conn.commit()
+
+            c.execute(f'DROP TRIGGER {table}_native_sync ON {table}')
+            for column, _, not_null in pending:
+                c.execute(f'ALTER TABLE {table} DROP COLUMN {column}')
+                c.execute(f'ALTER TABLE {table} RENAME COLUMN {column}_native TO {column}')
+                if not_null:
+                    c.execute(f'ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL')
+                    c.execute(f'ALTER TABLE {table} DROP CONSTRAINT {column}_native_not_null')
+            c.execute(f'DROP FUNCTION {table}_native_sync()')
+            conn.commit()
+            print(f"✅ Converted {table} date/time columns to native types")
+        except psycopg.errors.LockNotAvailable:
+            # Past MIGRATION_LOCK_TIMEOUT_MS; the batches done so far are kept.
+            conn.rollback()
+            print(f"⚠️  {table} is busy — rerun the migration to finish converting it")
+            failed.append(table)
+        except psycopg.Error as e:
+            # Typically a legacy value that is not a valid date/time. The TEXT
+            # columns stay in place until it is fixed.
+            conn.rollback()
+            print(f"⚠️  Could not convert {table} date/time columns: {e}")
+            failed.append(table)
+    conn.commit()
+    if failed:
+        raise MigrationError(f"Date/time columns of {', '.join(failed)} were not converted")
@@ -0,0 +1,44 @@
+"""Indexes for the tenant-scoped reads, built without blocking writes."""
+try:
+    from ..migrate import create_index_concurrently
+except ImportError:
+    from migrate import create_index_concurrently
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction block, and it is
+# what keeps a deploy from locking production tables while indexes build.
+TRANSACTIONAL = False
+
+# Indexes matching the tenant-scoped WHERE/ORDER BY shapes of the API queries:
+# incident lists, keyset pages, the 30-day count and the PDF report walk the
+# date index; the by-type breakdown is answered from the violence_type index;
+# the report cache stamp reads a company's newest incident id; the report
+# worker claims jobs from the small set that are still pending, and the
+# webhook worker does the same with Stripe events, oldest first per
+# subscription; cancellation finds companies and authorizations by subscription.
+TENANT_INDEXES = [
+    ('incidents_company_date_idx',
+     'incidents (company_id, incident_date DESC, incident_time DESC, id DESC)'),
+    ('incidents_company_type_idx',
+     'incidents (company_id, violence_type)'),
+    ('incidents_company_id_idx',
+     'incidents (company_id, id)'),
+    ('report_jobs_pending_idx',
+     "report_jobs (id) WHERE status IN ('queued', 'running')"),
+    ('stripe_events_pending_idx',
+     'stripe_events (stripe_created, received_at, id) WHERE processed_at IS NULL'),
+    ('stripe_events_pending_subscription_idx',
+     'stripe_events (subscription_id, stripe_created, received_at, id) WHERE processed_at IS NULL'),
+    ('training_records_company_date_idx',
+     'training_records (company_id, training_date DESC, id DESC)'),
+    ('companies_stripe_subscription_idx',
+     'companies (stripe_subscription_id)'),
+    ('checkout_authorizations_company_idx',
+     'checkout_authorizations (company_id)'),
+]
+
+
+def upgrade(conn):
+    conn.autocommit = True
+    c = conn.cursor()
+    for index_name, definition in TENANT_INDEXES:
+        create_index_concurrently(c, index_name, definition)
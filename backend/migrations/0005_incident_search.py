@@ -0,0 +1,62 @@
+"""Full-text search over incident narratives for GET /api/incidents/search.
+
+incidents.search_vector holds the weighted tsvector of the narrative columns
+and incidents_search_idx is a GIN index over it. A STORED generated column
+would rewrite the table under an ACCESS EXCLUSIVE lock, so like the native
+date/time conversion the column is added empty, kept current by a trigger,
+backfilled in short batches, and then indexed concurrently. An interrupted
+run resumes where it stopped.
+"""
+try:
+    from ..migrate import create_index_concurrently
+except ImportError:
+    from migrate import create_index_concurrently
+
+TRANSACTIONAL = False
+
+SEARCH_BACKFILL_BATCH_SIZE = 5000
+
+
+def upgrade(conn):
+    c = conn.cursor()
+    # Matches in the narrative rank above the location and circumstances,
+    # and those above the corrective actions.
+    c.execute('''CREATE OR REPLACE FUNCTION incident_search_vector(
+                     description TEXT, violence_nature TEXT, exact_location TEXT,
+                     circumstances TEXT, corrective_actions TEXT) RETURNS tsvector
+                 LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+                     SELECT setweight(to_tsvector('english', coalesce(description, '')), 'A')
+                         || setweight(to_tsvector('english', coalesce(violence_nature, '')), 'A')
+                         || setweight(to_tsvector('english', coalesce(exact_location, '')), 'B')
+                         || setweight(to_tsvector('english', coalesce(circumstances, '')), 'B')
+                         || setweight(to_tsvector('english', coalesce(corrective_actions, '')), 'C')
+                 $$''')
+    c.execute('ALTER TABLE incidents ADD COLUMN IF NOT EXISTS search_vector tsvector')
+    c.execute('''CREATE OR REPLACE FUNCTION incidents_search_vector_sync() RETURNS trigger AS $$
+                 BEGIN
+                     NEW.search_vector := incident_search_vector(NEW.description, NEW.violence_nature,
+                         NEW.exact_location, NEW.circumstances, NEW.corrective_actions);
+                     RETURN NEW;
+                 END
+                 $$ LANGUAGE plpgsql''')
+    c.execute('DROP TRIGGER IF EXISTS incidents_search_vector_sync ON incidents')
+    c.execute('''CREATE TRIGGER incidents_search_vector_sync
+                 BEFORE INSERT OR UPDATE OF description, violence_nature, exact_location,
+                                            circumstances, corrective_actions
+                 ON incidents FOR EACH ROW EXECUTE FUNCTION incidents_search_vector_sync()''')
+    conn.commit()
+
+    # Rows written from here on are covered by the trigger.
+    c.execute('SELECT COALESCE(MAX(id), 0) FROM incidents')
+    max_id = c.fetchone()[0]
+    conn.commit()
+    for start in range(0, max_id, SEARCH_BACKFILL_BATCH_SIZE):
+        c.execute('''UPDATE incidents
+                     SET search_vector = incident_search_vector(description, violence_nature, exact_location,
+                                                                circumstances, corrective_actions)
+                     WHERE id > %s AND id <= %s AND search_vector IS NULL''',
+                  (start, start + SEARCH_BACKFILL_BATCH_SIZE))
+        conn.commit()
+
+    conn.autocommit = True
+    create_index_concurrently(c, 'incidents_search_idx', 'incidents USING gin (search_vector)')
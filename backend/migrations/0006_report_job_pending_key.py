@@ -0,0 +1,29 @@
+"""At most one pending report job per company and kind.
+
+POST /api/reports inserts with ON CONFLICT against report_jobs_pending_key,
+so concurrent identical requests share one job instead of each queueing
+their own. Duplicates queued before this index existed are failed first,
+keeping the oldest; their pollers are told to request the report again.
+"""
+try:
+    from ..migrate import create_index_concurrently
+except ImportError:
+    from migrate import create_index_concurrently
+
+TRANSACTIONAL = False
+
+
+def upgrade(conn):
+    c = conn.cursor()
+    c.execute('''UPDATE report_jobs
+                 SET status = 'failed', error = 'Duplicate of an earlier pending job', finished_at = now()
+                 WHERE status IN ('queued', 'running')
+                   AND id NOT IN (SELECT MIN(id) FROM report_jobs
+                                  WHERE status IN ('queued', 'running')
+                                  GROUP BY company_id, kind)''')
+    conn.commit()
+
+    conn.autocommit = True
+    create_index_concurrently(c, 'report_jobs_pending_key',
+                              "report_jobs (company_id, kind) WHERE status IN ('queued', 'running')",
+                              unique=True)
@@ -0,0 +1,7 @@
+"""Schema migrations, applied in order by backend.migrate.
+
+NNNN_description.py defines upgrade(conn). Add a new file with the next number
+for every schema change, and never edit one that has been deployed. Set
+TRANSACTIONAL = False for a migration that commits on its own or needs
+autocommit (CREATE INDEX CONCURRENTLY); it must then be safe to rerun.
+"""
@@ -0,0 +1,100 @@
+"""Content-addressed disk cache for rendered PDF reports.
+
+A report's cache key is a hash of everything that goes into it (template
+version, company fields, incident markers), so a key never needs invalidating:
+changed inputs simply produce a new key, and stale files age out through
+size-bounded LRU eviction. The key doubles as the report's strong ETag.
+
+The directory may be shared by every worker in a container; files are written
+to a temporary name and renamed into place, so readers never see partial PDFs.
+Another worker may evict a file between get() and opening it, so callers treat
+FileNotFoundError as a miss.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+
+class ReportCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+
+    @staticmethod
+    def key(*inputs):
+        raw = json.dumps(inputs, default=str, separators=(',', ':'), sort_keys=True)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        """Return the cached file's path, or None on a miss."""
+        path = self.path(key)
+        try:
+            # The modification time is the LRU clock.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, source):
+        """Copy the file object `source` into the cache and return its path.
+
+        Returns None without caching anything when the report alone is larger
+        than max_bytes, since it would only push every other report out.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as destination:
+                shutil.copyfileobj(source, destination)
+                size = destination.tell()
+            if size > self.max_bytes:
+                os.unlink(temporary_path)
+                return None
+            os.replace(temporary_path, self.path(key))
+        except BaseException:
+            try:
+                os.unlink(temporary_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self.evict(keep=key)
+        return self.path(key)
+
+    def evict(self, keep=None):
+        """Delete least recently used reports until the cache fits in max_bytes.
+
+        The report cached under `keep` is never deleted.
+        """
+        with self._evict_lock:
+            entries = []
+            total = 0
+            try:
+                names = os.listdir(self.directory)
+            except FileNotFoundError:
+                return
+            for name in names:
+                if not name.endswith('.pdf'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if name == f'{keep}.pdf':
+                    continue
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
@@ -0,0 +1,152 @@
+"""Background worker that renders queued PDF reports.
+
+POST /api/reports inserts a row into report_jobs; this process claims rows
+with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers can drain the
+same queue without handing a job out twice, and renders them in a process pool
+so a large tenant's report never ties up a web worker.
+
+Run it next to the web service:
+    python -m backend.report_worker [--processes N] [--once]
+
+A job whose worker died mid-render stays 'running'; once it is older than
+REPORT_JOB_TIMEOUT_SECONDS it is claimed again, up to REPORT_JOB_MAX_ATTEMPTS.
+"""
+import argparse
+import os
+import signal
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    from . import app as app_module
+    from .database import get_db
+except ImportError:
+    import app as app_module
+    from database import get_db
+
+REPORT_WORKER_PROCESSES = int(os.environ.get('REPORT_WORKER_PROCESSES', 2))
+REPORT_WORKER_POLL_SECONDS = float(os.environ.get('REPORT_WORKER_POLL_SECONDS', 1))
+REPORT_JOB_TIMEOUT_SECONDS = int(os.environ.get('REPORT_JOB_TIMEOUT_SECONDS', 600))
+REPORT_JOB_MAX_ATTEMPTS = int(os.environ.get('REPORT_JOB_MAX_ATTEMPTS', 3))
+# Finished jobs (and their PDFs) are deleted after this long.
+REPORT_JOB_RETENTION_SECONDS = int(os.environ.get('REPORT_JOB_RETENTION_SECONDS', 24 * 60 * 60))
+
+
+def claim_jobs(conn, limit):
+    """Mark up to `limit` runnable jobs as running and return them.
+
+    Rows another worker is claiming right now are skipped rather than waited
+    on. Jobs stuck in 'running' past the timeout are failed once they have used
+    up their attempts, and otherwise claimed again.
+    """
+    c = conn.cursor()
+    c.execute('''UPDATE report_jobs
+                 SET status = 'failed', error = 'Timed out', finished_at = now()
+                 WHERE status = 'running'
+                   AND started_at < now() - make_interval(secs => %s)
+                   AND attempts >= %s''',
+              (REPORT_JOB_TIMEOUT_SECONDS, REPORT_JOB_MAX_ATTEMPTS))
+    c.execute('''UPDATE report_jobs
+                 SET status = 'running', attempts = attempts + 1, started_at = now()
+                 WHERE id IN (SELECT id FROM report_jobs
+                              WHERE status = 'queued'
+                                 OR (status = 'running'
+                                     AND started_at < now() - make_interval(secs => %s))
+                              ORDER BY id
+                              LIMIT %s
+                              FOR UPDATE SKIP LOCKED)
+                 RETURNING id, company_id, kind''',
+              (REPORT_JOB_TIMEOUT_SECONDS, limit))
+    jobs = [dict(row) for row in c.fetchall()]
+    conn.commit()
+    return jobs
+
+
+def delete_expired_jobs(conn):
+    c = conn.cursor()
+    c.execute('''DELETE FROM report_jobs
+                 WHERE status IN ('done', 'failed')
+                   AND finished_at < now() - make_interval(secs => %s)''',
+              (REPORT_JOB_RETENTION_SECONDS,))
+    conn.commit()
+
+
+def run_job(job_id, company_id, kind):
+    """Render one claimed job and store the PDF; runs in a pool process."""
+    conn = get_db()
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=app_module.REPORT_SPOOL_MAX_BYTES) as output:
+            try:
+                filename = app_module.render_report(conn, company_id, kind, output)
+            except Exception as e:
+                conn.rollback()
+                conn.cursor().execute('''UPDATE report_jobs
+                                         SET status = 'failed', error = %s, finished_at = now()
+                                         WHERE id = %s AND status = 'running' ''',
+                                      (f'{type(e).__name__}: {e}'[:1000], job_id))
+                conn.commit()
+                print(f"❌ Report job {job_id} ({kind}) failed: {e}")
+                return False
+            output.seek(0)
+            conn.cursor().execute('''UPDATE report_jobs
+                                     SET status = 'done', filename = %s, result = %s,
+                                         error = NULL, finished_at = now()
+                                     WHERE id = %s AND status = 'running' ''',
+                                  (filename, output.read(), job_id))
+            conn.commit()
+        print(f"✅ Report job {job_id} ({kind}) done")
+        return True
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render queued PDF reports.')
+    parser.add_argument('--processes', type=int, default=REPORT_WORKER_PROCESSES,
+                        help='reports rendered in parallel')
+    parser.add_argument('--once', action='store_true',
+                        help='exit once the queue is empty instead of polling')
+    args = parser.parse_args(argv)
+
+    stopping = []
+    if not args.once:
+        # Finish the jobs in hand on shutdown; unclaimed jobs stay queued.
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+
+    app_module.create_app()
+    print(f"🖨️  Report worker started with {args.processes} processes")
+    running = set()
+    next_cleanup = 0
+    with ProcessPoolExecutor(max_workers=args.processes, initializer=app_module.prewarm_reports) as executor:
+        while True:
+            jobs = []
+            if not stopping and len(running) < args.processes:
+                conn = get_db()
+                try:
+                    if time.monotonic() >= next_cleanup:
+                        delete_expired_jobs(conn)
+                        next_cleanup = time.monotonic() + 3600
+                    jobs = claim_jobs(conn, args.processes - len(running))
+                finally:
+                    conn.close()
+            for job in jobs:
+                running.add(executor.submit(run_job, job['id'], job['company_id'], job['kind']))
+
+            if not running and (stopping or (args.once and not jobs)):
+                break
+            if running:
+                done, running = wait(running, timeout=REPORT_WORKER_POLL_SECONDS,
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        # The job stays 'running' and is retried after the timeout.
+                        print(f"❌ Report worker process error: {future.exception()}")
+            elif not jobs:
+                time.sleep(REPORT_WORKER_POLL_SECONDS)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""Per-route request metrics in the Prometheus text format.
+
+Every request records its latency (to the last byte, so streamed exports count
+in full), response size and status. The database layer reports the time spent
+checking a connection out of the pool and each query's duration (a psycopg
+cursor class, see database.py), and the Stripe HTTP client reports each call;
+those are attributed to the route of the request they ran in.
+
+Gunicorn workers are separate processes, so each worker writes its counters to
+METRICS_DIR/<pid>.json at most every METRICS_FLUSH_SECONDS, and GET /metrics
+adds up every worker's file, its own live counters included. Files of exited
+workers are kept, so counters never go backwards when a worker restarts; a
+scrape can lag another worker by up to METRICS_FLUSH_SECONDS. By default
+METRICS_DIR is a directory per gunicorn master under the system temp dir.
+"""
+import atexit
+import contextvars
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name: (type, help, label names, buckets)
+METRICS = {
+    'compcleared_http_requests_total': (
+        'counter', 'Requests answered.', ('route', 'method', 'status'), None),
+    'compcleared_http_request_duration_seconds': (
+        'histogram', 'Time from routing to the last byte of the response.', ('route', 'method'),
+        LATENCY_BUCKETS),
+    'compcleared_http_response_size_bytes': (
+        'histogram', 'Response body size.', ('route', 'method'), SIZE_BUCKETS),
+    'compcleared_http_request_db_queries': (
+        'histogram', 'Queries run by one request.', ('route',), COUNT_BUCKETS),
+    'compcleared_db_connect_duration_seconds': (
+        'histogram', 'Time waiting for a pooled connection.', ('route',), LATENCY_BUCKETS),
+    'compcleared_db_query_duration_seconds': (
+        'histogram', 'Duration of each query; fetches from server-side cursors are not included.',
+        ('route',), LATENCY_BUCKETS),
+    'compcleared_stripe_request_duration_seconds': (
+        'histogram', 'Duration of each Stripe API call, retries included.', ('route',), LATENCY_BUCKETS),
+}
+
+# Label used for work done outside a request, e.g. during worker startup.
+NO_ROUTE = '-'
+
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+
+
+def default_directory():
+    # Gunicorn workers share their master's pid as parent, so the workers of
+    # one server share a directory and a restarted server starts from zero.
+    return os.environ.get('METRICS_DIR') or os.path.join(
+        tempfile.gettempdir(), f'compcleared-metrics-{os.getppid()}')
+
+
+class Registry:
+    """Counters and histograms of one process, merged with its siblings' on collect()."""
+
+    def __init__(self, directory=None, flush_seconds=METRICS_FLUSH_SECONDS, clock=time.monotonic):
+        self._directory = directory
+        self.flush_seconds = flush_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._values = {}
+        self._pid = os.getpid()
+        self._flushed_at = None
+        self._flush_failed = False
+
+    @property
+    def directory(self):
+        if self._directory is None:
+            self._directory = default_directory()
+        return self._directory
+
+    def inc(self, name, labels, amount=1):
+        key = json.dumps([name, labels])
+        with self._lock:
+            self._reset_after_fork()
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][3]
+        key = json.dumps([name, labels])
+        with self._lock:
+            self._reset_after_fork()
+            # Non-cumulative bucket counts, then the +Inf overflow, sum and count.
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(buckets) + 3)
+            series[next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _reset_after_fork(self):
+        if self._pid != os.getpid():
+            self._values = {}
+            self._pid = os.getpid()
+            self._flushed_at = None
+
+    def flush(self, force=False):
+        """Write this process's values for /metrics in other workers, at most every flush_seconds."""
+        now = self._clock()
+        with self._lock:
+            if not force and self._flushed_at is not None and now - self._flushed_at < self.flush_seconds:
+                return
+            self._flushed_at = now
+            payload = json.dumps(self._values)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'{os.getpid()}.json')
+            with tempfile.NamedTemporaryFile('w', dir=self.directory, suffix='.tmp', delete=False) as output:
+                output.write(payload)
+            os.replace(output.name, path)
+        except OSError as e:
+            if not self._flush_failed:
+                print(f"⚠️  Metrics directory unavailable, /metrics will only show this worker: {e}")
+                self._flush_failed = True
+
+    def flush_at_exit(self):
+        # Only processes that serve requests have flushed before.
+        if self._flushed_at is not None and self._pid == os.getpid():
+            self.flush(force=True)
+
+    def collect(self):
+        """Sum every worker's last flushed values with this process's live values."""
+        with self._lock:
+            merged = {key: (list(value) if isinstance(value, list) else value)
+                      for key, value in self._values.items()}
+        own_file = f'{os.getpid()}.json'
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith('.json') and name != own_file]
+        except OSError:
+            names = []
+        for name in names:
+            try:
+                with open(os.path.join(self.directory, name)) as snapshot:
+                    values = json.load(snapshot)
+            except (OSError, ValueError):
+                continue
+            for key, value in values.items():
+                if key not in merged:
+                    merged[key] = value
+                elif isinstance(value, list):
+                    merged[key] = [mine + theirs for mine, theirs in zip(merged[key], value)]
+                else:
+                    merged[key] += value
+        return merged
+
+    def render(self):
+        """The merged values in the Prometheus text exposition format."""
+        by_name = {}
+        for key, value in self.collect().items():
+            name, labels = json.loads(key)
+            if name in METRICS:
+                by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, (kind, help_text, label_names, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(by_name.get(name, []), key=lambda item: item[0]):
+                label_text = ','.join(f'{label}="{escape(str(label_value))}"'
+                                      for label, label_value in zip(label_names, labels))
+                if kind == 'counter':
+                    lines.append(f'{name}{{{label_text}}} {format_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (math.inf,), value[:-2]):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else format_number(bound)
+                    lines.append(f'{name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label_text}}} {format_number(value[-2])}')
+                lines.append(f'{name}_count{{{label_text}}} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+atexit.register(registry.flush_at_exit)
+
+
+class RequestStats:
+    """What one request spent; the instrumented layers add to it while it runs."""
+
+    def __init__(self, route, method):
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.queries = 0
+
+
+_current = contextvars.ContextVar('compcleared_request_stats', default=None)
+
+
+def start_request(route, method):
+    stats = RequestStats(route, method)
+    _current.set(stats)
+    return stats
+
+
+def finish_request(stats, status, size):
+    """Record a finished request and flush this worker's values when they are due."""
+    if _current.get() is stats:
+        _current.set(None)
+    labels = [stats.route, stats.method]
+    registry.inc('compcleared_http_requests_total', labels + [str(status)])
+    registry.observe('compcleared_http_request_duration_seconds', labels, time.perf_counter() - stats.started)
+    if size is not None:
+        registry.observe('compcleared_http_response_size_bytes', labels, size)
+    registry.observe('compcleared_http_request_db_queries', [stats.route], stats.queries)
+    registry.flush()
+
+
+def current_route():
+    stats = _current.get()
+    return stats.route if stats else NO_ROUTE
+
+
+def observe_db_connect(seconds):
+    registry.observe('compcleared_db_connect_duration_seconds', [current_route()], seconds)
+
+
+def observe_query(seconds):
+    stats = _current.get()
+    if stats:
+        stats.queries += 1
+    registry.observe('compcleared_db_query_duration_seconds', [current_route()], seconds)
+
+
+def observe_stripe_call(seconds):
+    registry.observe('compcleared_stripe_request_duration_seconds', [current_route()], seconds)
@@ -0,0 +1,276 @@
+"""Slow-query log for statements run through database.get_db().
+
+A statement that takes longer than SLOW_QUERY_MS is written as one JSON line:
+its SQL with whitespace collapsed and literals replaced by ?, the types of its
+parameters (never their values), its duration and the route of the request it
+ran in. SLOW_QUERY_EXPLAIN_SAMPLE of the logged SELECTs that neither write,
+lock rows nor call lock, sequence or settings functions are then run again
+under EXPLAIN (ANALYZE, BUFFERS) on a read-only connection in a background
+thread, so the request does not wait for the plan, and the plan is logged
+under the same fingerprint.
+
+Each process writes SLOW_QUERY_LOG_DIR/slow-queries-<pid>.log, rotated at
+SLOW_QUERY_LOG_MAX_BYTES, so gunicorn workers never rotate each other's files.
+To see which statements cost the most:
+    python -m backend.slow_queries summarize [--top 20] [--by total] [--plans]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import tempfile
+import threading
+from datetime import datetime
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 500))
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE', 0))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.environ.get('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 30000))
+SLOW_QUERY_LOG_DIR = os.environ.get('SLOW_QUERY_LOG_DIR') or os.path.join(
+    tempfile.gettempdir(), 'compcleared-slow-queries')
+SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024))
+SLOW_QUERY_LOG_BACKUPS = int(os.environ.get('SLOW_QUERY_LOG_BACKUPS', 3))
+
+# Plans waiting for the explain thread; further samples are dropped.
+EXPLAIN_QUEUE_SIZE = 16
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WRITES = re.compile(r'\b(insert|update|delete|merge|copy|for\s+(?:no\s+key\s+)?update|for\s+(?:key\s+)?share)\b',
+                     re.IGNORECASE)
+# Functions whose effects outlive the EXPLAIN: session advisory locks (which
+# signup, checkout verification and the webhook worker serialize on),
+# sequences and settings.
+_SIDE_EFFECTS = re.compile(r'\b(pg_(?:try_)?advisory\w*|nextval|setval|set_config)\s*\(', re.IGNORECASE)
+
+
+def normalize(statement):
+    """Collapse whitespace and replace literals, so one statement shape groups together."""
+    return _LITERALS.sub('?', ' '.join(statement.split()))
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def redact(params):
+    """Describe parameters by type only; their values may be personal data."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {name: type(value).__name__ for name, value in params.items()}
+    return [type(value).__name__ for value in params]
+
+
+def explainable(normalized):
+    """Only plain reads without side effects are re-run under EXPLAIN ANALYZE."""
+    head = normalized.lstrip('( ').split(' ', 1)[0].lower()
+    return (head in ('select', 'with') and not _WRITES.search(normalized)
+            and not _SIDE_EFFECTS.search(normalized))
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms, explain_sample, directory, max_bytes, backups,
+                 connect=None, sample=random.random):
+        self.threshold_ms = threshold_ms
+        self.explain_sample = explain_sample
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._connect = connect
+        self._sample = sample
+        self._lock = threading.Lock()
+        self._logger = None
+        self._logger_pid = None
+        self._explain_queue = None
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0
+
+    def record(self, statement, params, seconds, route):
+        """Log `statement` if it ran longer than the threshold; cheap otherwise."""
+        duration_ms = seconds * 1000
+        if not self.enabled or duration_ms < self.threshold_ms:
+            return
+        normalized = normalize(statement)
+        entry = {
+            'kind': 'query',
+            'fingerprint': fingerprint(normalized),
+            'route': route,
+            'duration_ms': round(duration_ms, 2),
+            'query': normalized,
+            'params': redact(params),
+        }
+        self.write(entry)
+        if self.explain_sample > 0 and explainable(normalized) and self._sample() < self.explain_sample:
+            self._queue_explain(entry, statement, params)
+
+    def write(self, entry):
+        entry = dict(entry, at=datetime.now().astimezone().isoformat(), pid=os.getpid())
+        try:
+            self._file_logger().info(json.dumps(entry, default=str))
+        except OSError as e:
+            print(f"⚠️  Could not write the slow-query log: {e}")
+
+    def _file_logger(self):
+        with self._lock:
+            if self._logger is None or self._logger_pid != os.getpid():
+                os.makedirs(self.directory, exist_ok=True)
+                handler = logging.handlers.RotatingFileHandler(
+                    os.path.join(self.directory, f'slow-queries-{os.getpid()}.log'),
+                    maxBytes=self.max_bytes, backupCount=self.backups)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger = logging.getLogger(f'compcleared.slow_queries.{os.getpid()}')
+                logger.handlers = [handler]
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                self._logger = logger
+                self._logger_pid = os.getpid()
+            return self._logger
+
+    def _queue_explain(self, entry, statement, params):
+        with self._lock:
+            if self._explain_queue is None:
+                self._explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+                threading.Thread(target=self._explain_loop, args=(self._explain_queue,),
+                                 name='slow-query-explain', daemon=True).start()
+            explain_queue = self._explain_queue
+        try:
+            explain_queue.put_nowait((entry, statement, params))
+        except queue.Full:
+            pass
+
+    def _explain_loop(self, explain_queue):
+        conn = None
+        while True:
+            entry, statement, params = explain_queue.get()
+            try:
+                if conn is None or conn.closed:
+                    conn = self._connect()
+                plan = conn.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}', params).fetchone()[0]
+                conn.rollback()
+            except Exception as e:
+                self.write({'kind': 'explain_error', 'fingerprint': entry['fingerprint'],
+                            'route': entry['route'], 'error': str(e)})
+                if conn is not None:
+                    conn.close()
+                conn = None
+                continue
+            plan = plan[0] if isinstance(plan, list) else plan
+            self.write({
+                'kind': 'explain',
+                'fingerprint': entry['fingerprint'],
+                'route': entry['route'],
+                'planning_ms': plan.get('Planning Time'),
+                'execution_ms': plan.get('Execution Time'),
+                'plan': plan['Plan'],
+            })
+
+
+def connect_for_explain():
+    """A connection outside the pool that can only read and gives up after the timeout."""
+    import psycopg
+    try:
+        from .database import get_database_url
+    except ImportError:
+        from database import get_database_url
+    conn = psycopg.connect(get_database_url(),
+                           options=f'-c statement_timeout={SLOW_QUERY_EXPLAIN_TIMEOUT_MS}')
+    conn.read_only = True
+    return conn
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN_SAMPLE, SLOW_QUERY_LOG_DIR,
+                              SLOW_QUERY_LOG_MAX_BYTES, SLOW_QUERY_LOG_BACKUPS, connect=connect_for_explain)
+
+
+def read_entries(paths):
+    for path in paths:
+        try:
+            with open(path) as log:
+                for line in log:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except OSError as e:
+            print(f'⚠️  Skipping {path}: {e}', file=sys.stderr)
+
+
+def summarize(entries):
+    """Group query entries by fingerprint, with the most recent plan of each."""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'], 'query': None, 'count': 0, 'total_ms': 0.0,
+            'max_ms': 0.0, 'routes': set(), 'plan': None, 'plan_at': '',
+        })
+        if entry.get('kind') == 'query':
+            group['query'] = entry['query']
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            group['routes'].add(entry.get('route') or '-')
+        elif entry.get('kind') == 'explain' and entry.get('at', '') >= group['plan_at']:
+            group['plan'] = entry
+            group['plan_at'] = entry.get('at', '')
+    summaries = [group for group in groups.values() if group['count']]
+    for group in summaries:
+        group['mean_ms'] = group['total_ms'] / group['count']
+    return summaries
+
+
+def format_plan(node, depth=0):
+    """Indented one-line-per-node rendering of an EXPLAIN (FORMAT JSON) plan."""
+    relation = f" on {node['Relation Name']}" if node.get('Relation Name') else ''
+    index = f" using {node['Index Name']}" if node.get('Index Name') else ''
+    buffers = node.get('Shared Hit Blocks', 0) + node.get('Shared Read Blocks', 0)
+    lines = [f"{'  ' * depth}-> {node['Node Type']}{index}{relation} "
+             f"(rows={node.get('Actual Rows')} loops={node.get('Actual Loops')} "
+             f"time={node.get('Actual Total Time')} ms buffers={buffers})"]
+    for child in node.get('Plans', []):
+        lines.extend(format_plan(child, depth + 1))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize the slow-query log.')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    summarize_parser = subcommands.add_parser('summarize', help='top statements by time spent')
+    summarize_parser.add_argument('paths', nargs='*',
+                                  help=f'log files (default: every log in {SLOW_QUERY_LOG_DIR})')
+    summarize_parser.add_argument('--top', type=int, default=20)
+    summarize_parser.add_argument('--by', choices=('total', 'count', 'max', 'mean'), default='total')
+    summarize_parser.add_argument('--plans', action='store_true', help='print the latest plan of each')
+    args = parser.parse_args(argv)
+
+    paths = args.paths or sorted(glob.glob(os.path.join(SLOW_QUERY_LOG_DIR, 'slow-queries-*.log*')))
+    summaries = summarize(read_entries(paths))
+    if not summaries:
+        print('No slow queries logged')
+        return 0
+    sort_key = {'total': 'total_ms', 'count': 'count', 'max': 'max_ms', 'mean': 'mean_ms'}[args.by]
+    summaries.sort(key=lambda group: group[sort_key], reverse=True)
+
+    print(f"{'count':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9}  {'fingerprint':<12}  routes / query")
+    for group in summaries[:args.top]:
+        print(f"{group['count']:>6} {group['total_ms']:>10.0f} {group['mean_ms']:>9.1f} {group['max_ms']:>9.1f}  "
+              f"{group['fingerprint']:<12}  {', '.join(sorted(group['routes']))}")
+        print(f"{'':>40}  {group['query'][:200]}")
+        if args.plans and group['plan']:
+            plan = group['plan']
+            print(f"{'':>40}  plan at {plan.get('at')}: planning {plan.get('planning_ms')} ms, "
+                  f"execution {plan.get('execution_ms')} ms")
+            for line in format_plan(plan['plan']):
+                print(f"{'':>40}  {line}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
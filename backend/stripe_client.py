@@ -0,0 +1,88 @@
+"""The HTTP client the Stripe SDK uses in the web and worker processes.
+
+Stripe's defaults suit a script, not a request thread: an 80 second timeout,
+retries that can sleep for up to a minute, and a fresh connection pool per
+thread. This client shares one keep-alive pool across a worker's threads,
+bounds connect and read time separately, caps retry backoff (jittered, as the
+SDK already does) and reports every outcome to a circuit breaker, so a Stripe
+outage costs each request a 503 instead of a stuck thread.
+
+The module imports the SDK, so the app only imports it when Stripe is first
+used. STRIPE_API_BASE points the SDK at another server, e.g. the local stand-in
+in backend/bench/stripe_stub.py.
+"""
+import os
+import random
+import time
+
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+
+try:
+    from . import request_metrics
+except ImportError:
+    import request_metrics
+
+STRIPE_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('STRIPE_CONNECT_TIMEOUT_SECONDS', 2))
+STRIPE_READ_TIMEOUT_SECONDS = float(os.environ.get('STRIPE_READ_TIMEOUT_SECONDS', 10))
+STRIPE_MAX_NETWORK_RETRIES = int(os.environ.get('STRIPE_MAX_NETWORK_RETRIES', 2))
+STRIPE_MAX_RETRY_DELAY_SECONDS = float(os.environ.get('STRIPE_MAX_RETRY_DELAY_SECONDS', 1))
+STRIPE_HTTP_POOL_SIZE = int(os.environ.get('STRIPE_HTTP_POOL_SIZE', 10))
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE')
+
+
+class StripeHTTPClient(stripe.RequestsClient):
+    INITIAL_RETRY_DELAY = 0.1
+
+    def __init__(self, breaker, connect_timeout, read_timeout, max_retry_delay, pool_size):
+        session = requests.Session()
+        # One pool for every thread; the SDK handles retries itself.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        super().__init__(timeout=(connect_timeout, read_timeout), session=session)
+        self.breaker = breaker
+        self.max_retry_delay = max_retry_delay
+
+    def _request_with_retries_internal(self, *args, **kwargs):
+        # Raises CircuitOpen before any network I/O while Stripe is failing.
+        self.breaker.before_call()
+        started = time.perf_counter()
+        try:
+            response = super()._request_with_retries_internal(*args, **kwargs)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            request_metrics.observe_stripe_call(time.perf_counter() - started)
+        # 429s and 5xx survived the retries; 4xx are the caller's problem.
+        if response[1] == 429 or response[1] >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _sleep_time_seconds(self, num_retries, response=None):
+        # Full jitter under a cap small enough that retries fit in a request.
+        # Unlike the SDK, a longer Retry-After is not waited out; if Stripe
+        # keeps refusing, the breaker sheds load instead.
+        ceiling = min(self.INITIAL_RETRY_DELAY * 2 ** (num_retries - 1), self.max_retry_delay)
+        retry_after = self._retry_after_header(response) or 0
+        if retry_after > self.max_retry_delay:
+            retry_after = 0
+        return max(retry_after, random.uniform(0, ceiling))
+
+
+def configure(module, breaker):
+    """Install the shared client on the `stripe` module."""
+    module.default_http_client = StripeHTTPClient(
+        breaker,
+        connect_timeout=STRIPE_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=STRIPE_READ_TIMEOUT_SECONDS,
+        max_retry_delay=STRIPE_MAX_RETRY_DELAY_SECONDS,
+        pool_size=STRIPE_HTTP_POOL_SIZE,
+    )
+    module.max_network_retries = STRIPE_MAX_NETWORK_RETRIES
+    if STRIPE_API_BASE:
+        module.api_base = STRIPE_API_BASE
@@ -1,4 +1,6 @@
+import json
 import os
+from datetime import date, time
 from pathlib import Path
 from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
@@ -7,6 +9,7 @@ os.environ.pop("DATABASE_URL", None)
 
 import pytest
 import backend.app as app_module
+from backend.report_cache import ReportCache
 
 
 def test_generated_pdf_copy_does_not_certify_compliance_or_legal_defensibility():
@@ -95,7 +98,7 @@ class StatefulCheckoutCursor:
         if "SELECT id FROM users WHERE email" in normalized:
             email = params[0]
             self.result = next((user for user in self.database.users if user["email"] == email), None)
-        elif "SELECT authorization.company_id, company.stripe_subscription_id" in normalized:
+        elif "SELECT checkout_auth.company_id, company.stripe_subscription_id" in normalized:
             authorization = self.database.authorizations.get(params[0])
             if authorization:
                 company = self.database.companies[authorization["company_id"]]
@@ -126,9 +129,11 @@ class StatefulCheckoutCursor:
         elif "INSERT INTO canceled_stripe_subscriptions" in normalized:
             self.database.canceled_subscriptions.add(params[0])
         elif "SET subscription_status = %s" in normalized and "stripe_subscription_id = %s" in normalized:
+            self.result = []
             for company in self.database.companies.values():
                 if company["stripe_subscription_id"] == params[1]:
                     company["subscription_status"] = params[0]
+                    self.result.append({"id": company["id"]})
         elif "UPDATE checkout_authorizations" in normalized and "stripe_subscription_id" in normalized:
             for authorization in self.database.authorizations.values():
                 company = self.database.companies[authorization["company_id"]]
@@ -138,11 +143,16 @@ class StatefulCheckoutCursor:
     def fetchone(self):
         return self.result
 
+    def fetchall(self):
+        return self.result or []
+
 
 @pytest.fixture
-def client():
+def client(tmp_path):
     app_module.app.config.update(TESTING=True, SECRET_KEY="test-secret")
-    with app_module.app.test_client() as test_client:
+    report_cache = ReportCache(str(tmp_path / "reports"), 1024 * 1024)
+    with patch.object(app_module, "report_cache", report_cache), \
+         app_module.app.test_client() as test_client:
         yield test_client
 
 
@@ -154,7 +164,8 @@ def test_verify_session_rejects_company_not_owned_by_checkout(client):
         client_reference_id="7",
         metadata={"company_id": "7"},
     )
-    with patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=checkout):
+    with patch.object(app_module, "find_checkout_session", return_value=None), \
+         patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=checkout):
         response = client.get("/api/verify-session?session_id=cs_123&company_id=8")
     assert response.status_code == 403
     assert response.get_json()["error"] == "Checkout session does not match this company"
@@ -179,10 +190,7 @@ def test_billing_portal_requires_login(client):
 def test_billing_portal_uses_signed_in_company_customer_id(client):
     fake_connection = MagicMock()
     fake_cursor = fake_connection.cursor.return_value
-    fake_cursor.fetchone.return_value = {
-        "subscription_status": "active",
-        "stripe_customer_id": "cus_correct",
-    }
+    fake_cursor.fetchone.return_value = request_context(stripe_customer_id="cus_correct")
     portal = SimpleNamespace(url="https://billing.stripe.com/session/test")
     with client.session_transaction() as flask_session:
         flask_session["user_id"] = 11
@@ -198,9 +206,18 @@ def test_billing_portal_uses_signed_in_company_customer_id(client):
     )
 
 
+def test_checkout_session_with_a_missing_field_returns_its_connection(client):
+    connection = MagicMock()
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.post("/api/create-checkout-session", json={})
+    assert response.status_code == 400
+    connection.close.assert_called_once_with()
+
+
 def test_verify_session_rejects_unpaid_checkout(client):
     checkout = SimpleNamespace(payment_status="unpaid", subscription="sub_123")
-    with patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=checkout):
+    with patch.object(app_module, "find_checkout_session", return_value=None), \
+         patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=checkout):
         response = client.get("/api/verify-session?session_id=cs_123&company_id=7")
     assert response.status_code == 400
 
@@ -210,18 +227,17 @@ def test_verify_session_rejects_missing_checkout_reference(client):
         payment_status="paid", subscription="sub_123", customer="cus_123",
         client_reference_id=None, metadata={},
     )
-    with patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=checkout):
+    with patch.object(app_module, "find_checkout_session", return_value=None), \
+         patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=checkout):
         response = client.get("/api/verify-session?session_id=cs_123&company_id=7")
     assert response.status_code == 403
 
 
-def test_checkout_authorization_schema_is_initialized():
-    connection = MagicMock()
-    with patch.object(app_module, "get_database_url", return_value="postgres://test"), \
-         patch.object(app_module.psycopg, "connect", return_value=connection):
-        app_module.init_db()
-    statements = [call.args[0] for call in connection.cursor.return_value.execute.call_args_list]
-    assert any("checkout_authorizations" in statement for statement in statements)
+def test_importing_the_app_defers_stripe_and_reportlab_to_first_use():
+    from backend.bench import startup
+
+    _, loaded_lazy = startup.measure_import()
+    assert loaded_lazy == []
 
 
 def test_signup_rejects_a_stale_checkout_authorization(client):
@@ -279,20 +295,14 @@ def test_signup_consumption_is_one_time_in_behavior(client):
 
 def test_cancellation_before_signup_prevents_user_creation(client):
     database = StatefulCheckoutDb()
-    canceled_event = {
-        "type": "customer.subscription.deleted",
-        "data": {"object": {"id": "sub_123"}},
-    }
-    with patch.object(app_module.stripe.Webhook, "construct_event", return_value=canceled_event), \
-         patch.object(app_module, "get_db", return_value=database):
-        cancellation = client.post("/api/webhook", data=b"canceled", headers={"Stripe-Signature": "sig"})
+    app_module.apply_stripe_event(database.cursor(), CANCELED_EVENT)
+    with patch.object(app_module, "get_db", return_value=database):
         with client.session_transaction() as flask_session:
             flask_session["verified_checkout_session_id"] = "cs_paid"
         signup = client.post("/api/signup", json={
             "email": "owner@example.com", "password": "safe-password", "name": "Owner",
         })
 
-    assert cancellation.status_code == 200
     assert signup.status_code == 403
     assert database.companies[7]["subscription_status"] == "canceled"
     assert database.authorizations["cs_paid"]["consumed"] is True
@@ -308,7 +318,8 @@ def test_consumed_checkout_authorization_cannot_be_reissued(client):
     connection.cursor.return_value.fetchone.side_effect = [{
         "id": 7, "subscription_status": "active", "stripe_subscription_id": "sub_123",
     }, None]
-    with patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=checkout), \
+    with patch.object(app_module, "find_checkout_session", return_value=None), \
+         patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=checkout), \
          patch.object(app_module, "get_db", return_value=connection):
         response = client.get("/api/verify-session?session_id=cs_used&company_id=7")
     assert response.status_code == 200
@@ -325,7 +336,8 @@ def test_browser_verification_accepts_the_matching_active_subscription_after_web
     connection.cursor.return_value.fetchone.side_effect = [{
         "id": 7, "subscription_status": "active", "stripe_subscription_id": "sub_123",
     }, None]
-    with patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=checkout), \
+    with patch.object(app_module, "find_checkout_session", return_value=None), \
+         patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=checkout), \
          patch.object(app_module, "get_db", return_value=connection):
         response = client.get("/api/verify-session?session_id=cs_123&company_id=7")
     assert response.status_code == 200
@@ -334,28 +346,794 @@ def test_browser_verification_accepts_the_matching_active_subscription_after_web
     assert any("pg_advisory_xact_lock" in statement for statement in statements)
 
 
-def test_checkout_webhook_cannot_reactivate_a_canceled_company_on_retry(client):
-    checkout_event = {
-        "type": "checkout.session.completed",
-        "data": {"object": {
-            "metadata": {"company_id": "7"}, "client_reference_id": "7",
-            "payment_status": "paid", "subscription": "sub_123", "customer": "cus_123",
-        }},
-    }
-    canceled_event = {
-        "type": "customer.subscription.deleted",
-        "data": {"object": {"id": "sub_123"}},
-    }
+CHECKOUT_EVENT = {
+    "id": "evt_checkout",
+    "type": "checkout.session.completed",
+    "created": 1760000000,
+    "data": {"object": {
+        "metadata": {"company_id": "7"}, "client_reference_id": "7",
+        "payment_status": "paid", "subscription": "sub_123", "customer": "cus_123",
+    }},
+}
+CANCELED_EVENT = {
+    "id": "evt_canceled",
+    "type": "customer.subscription.deleted",
+    "created": 1760000100,
+    "data": {"object": {"id": "sub_123"}},
+}
+
+
+def test_verify_session_uses_the_checkout_recorded_by_the_webhook_without_calling_stripe(client):
     connection = MagicMock()
-    with patch.object(app_module.stripe.Webhook, "construct_event",
-                      side_effect=[canceled_event, checkout_event, checkout_event]), \
+    connection.cursor.return_value.fetchone.side_effect = [{
+        "id": "cs_123", "client_reference_id": "7", "metadata_company_id": "7", "payment_status": "paid",
+        "subscription_id": "sub_123", "customer_id": "cus_123",
+    }, {
+        "id": 7, "subscription_status": "active", "stripe_subscription_id": "sub_123",
+    }, None]
+    with patch.object(app_module.stripe.checkout.Session, "retrieve") as retrieve, \
          patch.object(app_module, "get_db", return_value=connection):
-        assert client.post("/api/webhook", data=b"canceled", headers={"Stripe-Signature": "sig"}).status_code == 200
-        assert client.post("/api/webhook", data=b"first", headers={"Stripe-Signature": "sig"}).status_code == 200
-        assert client.post("/api/webhook", data=b"retry", headers={"Stripe-Signature": "sig"}).status_code == 200
+        response = client.get("/api/verify-session?session_id=cs_123&company_id=7")
+    assert response.status_code == 200
+    retrieve.assert_not_called()
     statements = [call.args[0] for call in connection.cursor.return_value.execute.call_args_list]
+    assert "FROM stripe_checkout_sessions" in statements[0]
+    assert "pg_advisory_xact_lock" in statements[1]
+    assert any("FROM canceled_stripe_subscriptions" in statement for statement in statements)
+
+
+def test_checkout_event_cannot_reactivate_a_canceled_company_on_retry():
+    cursor = MagicMock()
+    for event in (CANCELED_EVENT, CHECKOUT_EVENT, CHECKOUT_EVENT):
+        app_module.apply_stripe_event(cursor, event)
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
     checkout_updates = [statement for statement in statements if "stripe_customer_id = %s" in statement]
     assert len(checkout_updates) == 2
     assert all("subscription_status = 'pending'" in statement for statement in checkout_updates)
     assert all("canceled_stripe_subscriptions" in statement for statement in checkout_updates)
-    assert sum("pg_advisory_xact_lock" in statement for statement in statements) == 3
+
+
+def test_webhook_only_records_verified_events_in_the_inbox(client):
+    import json
+
+    connection = MagicMock()
+    invoice_event = {"id": "evt_invoice", "type": "invoice.paid", "created": 1760000200,
+                     "data": {"object": {}}}
+    payload = json.dumps(CANCELED_EVENT).encode()
+    with patch.object(app_module.stripe.Webhook, "construct_event",
+                      side_effect=[CANCELED_EVENT, CANCELED_EVENT, invoice_event, ValueError("bad signature")]), \
+         patch.object(app_module, "get_db", return_value=connection):
+        first = client.post("/api/webhook", data=payload, headers={"Stripe-Signature": "sig"})
+        redelivered = client.post("/api/webhook", data=payload, headers={"Stripe-Signature": "sig"})
+        ignored = client.post("/api/webhook", data=b"{}", headers={"Stripe-Signature": "sig"})
+        forged = client.post("/api/webhook", data=payload, headers={"Stripe-Signature": "forged"})
+
+    assert first.status_code == redelivered.status_code == ignored.status_code == 200
+    assert forged.status_code == 400
+    calls = connection.cursor.return_value.execute.call_args_list
+    assert len(calls) == 2
+    assert all("ON CONFLICT (id) DO NOTHING" in call.args[0] for call in calls)
+    assert calls[0].args[1] == ("evt_canceled", "customer.subscription.deleted", "sub_123",
+                                1760000100, payload.decode())
+    assert connection.commit.call_count == 2
+
+
+def request_context(subscription_status="active", data_version=3, stripe_customer_id="cus_123"):
+    """The row load_request_context reads for user 11 of company 7."""
+    return {
+        "user_record": {"id": 11, "company_id": 7, "email": "owner@example.com", "name": "Owner", "role": "admin"},
+        "company_record": {"id": 7, "name": "Acme Co", "subscription_status": subscription_status,
+                           "data_version": data_version, "stripe_customer_id": stripe_customer_id},
+    }
+
+
+def _signed_in_with_active_subscription(client, connection):
+    with client.session_transaction() as flask_session:
+        flask_session["user_id"] = 11
+        flask_session["company_id"] = 7
+    connection.cursor.return_value.fetchone.return_value = request_context()
+
+
+def test_me_returns_the_request_context_without_the_password_hash(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    with patch.object(app_module, "get_db", return_value=connection) as get_db:
+        response = client.get("/api/me")
+
+    assert response.get_json()["user"]["email"] == "owner@example.com"
+    assert response.get_json()["company"]["name"] == "Acme Co"
+    statement = connection.cursor.return_value.execute.call_args.args[0]
+    assert "LEFT JOIN companies" in statement
+    assert "- 'password_hash'" in statement
+    assert connection.cursor.return_value.execute.call_count == 1
+    get_db.assert_called_once_with()
+    connection.close.assert_called_once_with()
+
+
+def test_protected_requests_share_one_connection_for_auth_and_handler(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchall.return_value = []
+    with patch.object(app_module, "get_db", return_value=connection) as get_db:
+        assert client.get("/api/incidents").status_code == 200
+        assert client.get("/api/training").status_code == 200
+    statements = [call.args[0] for call in connection.cursor.return_value.execute.call_args_list]
+    assert len(statements) == 4
+    assert sum("FROM users LEFT JOIN companies" in statement for statement in statements) == 2
+    assert get_db.call_count == connection.close.call_count == 2
+
+
+def test_status_changes_apply_on_the_next_request(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchone.return_value = request_context(subscription_status="canceled")
+    with patch.object(app_module, "get_db", return_value=connection):
+        assert client.get("/api/incidents").status_code == 403
+        connection.cursor.return_value.fetchone.return_value = None
+        assert client.get("/api/incidents").status_code == 401
+
+
+def test_incidents_without_paging_parameters_keep_the_full_list_shape(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchall.return_value = [{"id": 1}, {"id": 2}]
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.get("/api/incidents")
+    assert response.get_json() == {"success": True, "incidents": [{"id": 1}, {"id": 2}]}
+
+
+def test_incidents_are_paged_by_keyset_cursor(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchall.return_value = [
+        {"id": 9, "incident_date": "2026-10-02", "incident_time": "09:00"},
+        {"id": 8, "incident_date": "2026-10-01", "incident_time": "17:30"},
+        {"id": 5, "incident_date": "2026-10-01", "incident_time": "17:30"},
+    ]
+    with patch.object(app_module, "get_db", return_value=connection):
+        first = client.get("/api/incidents?limit=2")
+        cursor = first.get_json()["next_cursor"]
+        second = client.get(f"/api/incidents?limit=2&cursor={cursor}")
+
+    assert [incident["id"] for incident in first.get_json()["incidents"]] == [9, 8]
+    assert app_module.decode_cursor(cursor, app_module.INCIDENT_SORT_KEY) == [date(2026, 10, 1), time(17, 30), 8]
+    statement, params = connection.cursor.return_value.execute.call_args_list[-1].args
+    assert "(incident_date, incident_time, id) < (%s, %s, %s)" in statement
+    assert params == (7, date(2026, 10, 1), time(17, 30), 8, 3)
+    assert second.status_code == 200
+
+
+def test_training_records_reject_a_tampered_cursor(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.get("/api/training?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize("path,values", [
+    ("/api/incidents", ["not-a-date", "17:30", 1]),
+    ("/api/incidents", ["2026-10-01", "25:00", 1]),
+    ("/api/incidents", ["2026-10-01", "17:30", "1"]),
+    ("/api/incidents", [20261001, "17:30", 1]),
+    ("/api/training", ["2026-02-30", 1]),
+    ("/api/training", ["2026-02-01", True]),
+    ("/api/incidents/search?q=knife", ["not-a-rank", 1]),
+    ("/api/incidents/search?q=knife", [None, 1]),
+])
+def test_list_endpoints_reject_cursors_with_malformed_values(client, path, values):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    separator = "&" if "?" in path else "?"
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.get(f"{path}{separator}cursor={app_module.encode_cursor(values)}")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid cursor"
+    # Only the request context was read; nothing reached the list query.
+    assert connection.cursor.return_value.execute.call_count == 1
+
+
+def test_incident_search_escapes_headlines_and_pages_by_rank(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchall.return_value = [
+        {"id": 9, "rank": 0.6079270839691162, "headline": "a \x02knife\x03 & <b>bat</b>"},
+        {"id": 4, "rank": 0.6079270839691162, "headline": "\x02knife\x03 drawer"},
+    ]
+    with patch.object(app_module, "get_db", return_value=connection):
+        assert client.get("/api/incidents/search").status_code == 400
+        assert client.get(f"/api/incidents/search?q={'x' * 201}").status_code == 400
+        response = client.get("/api/incidents/search?q=knife&limit=1")
+
+    assert response.get_json()["incidents"] == [{"id": 9, "headline": "a <mark>knife</mark> &amp; &lt;b&gt;bat&lt;/b&gt;"}]
+    assert app_module.decode_cursor(response.get_json()["next_cursor"], app_module.SEARCH_SORT_KEY) == [
+        0.6079270839691162, 9]
+    statement, params = connection.cursor.return_value.execute.call_args_list[-1].args
+    assert "search_vector @@ query" in statement
+    assert params[:3] == ("knife", 7, 2)
+
+
+def test_native_date_columns_serialize_like_the_legacy_text_values(client):
+    from datetime import date, datetime, time, timedelta, timezone
+
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    logged_at = datetime(2026, 10, 1, 17, 30, 5, 120000)
+    connection.cursor.return_value.fetchall.return_value = [{
+        "id": 1,
+        "incident_date": date(2026, 10, 1),
+        "incident_time": time(17, 30),
+        "log_date": logged_at.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=-7))),
+    }]
+    with patch.object(app_module, "get_db", return_value=connection):
+        incident = client.get("/api/incidents").get_json()["incidents"][0]
+    assert incident["incident_date"] == "2026-10-01"
+    assert incident["incident_time"] == "17:30"
+    assert incident["log_date"] == logged_at.isoformat()
+
+
+def test_create_incident_updates_the_stats_rollup_in_the_same_transaction(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchone.side_effect = [request_context(), {"id": 31}]
+    events = []
+    connection.cursor.return_value.executemany.side_effect = lambda statement, rows: events.append(statement)
+    connection.commit.side_effect = lambda: events.append("COMMIT")
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.post("/api/incidents", json={
+            "incident_date": "2026-10-01", "incident_time": "09:30", "exact_location": "Lobby",
+            "violence_type": "Type 2", "offender_classification": "Customer",
+            "description": "Verbal threat", "logged_by_name": "Pat", "logged_by_title": "Manager",
+        })
+    assert response.status_code == 201
+    assert "incident_type_counts" in events[0]
+    assert "incident_daily_counts" in events[1]
+    assert events[2:] == ["COMMIT"]
+
+
+def test_stats_are_read_from_the_rollup_instead_of_scanning_incidents(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchall.return_value = [
+        {"violence_type": "Type 2", "count": 4}, {"violence_type": "Type 3", "count": 1},
+    ]
+    connection.cursor.return_value.fetchone.side_effect = [
+        request_context(), {"count": 2},
+    ]
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.get("/api/stats")
+    assert response.get_json()["stats"]["total_incidents"] == 5
+    assert response.get_json()["stats"]["recent_30_days"] == 2
+    statements = [call.args[0] for call in connection.cursor.return_value.execute.call_args_list]
+    assert not any("FROM incidents" in statement for statement in statements)
+
+
+def test_incident_report_streams_rows_from_a_server_side_cursor(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    rows = ({"incident_date": "2026-10-01", "incident_time": "09:30", "description": f"Incident {number}"}
+            for number in range(150))
+    server_cursor = MagicMock()
+    server_cursor.__iter__.return_value = rows
+    connection.cursor.side_effect = lambda name=None: server_cursor if name else connection.cursor.return_value
+    connection.cursor.return_value.fetchone.side_effect = [
+        request_context(), ACME_REPORT_STAMP, {"count": 150},
+    ]
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.get("/api/report/pdf")
+    assert response.status_code == 200
+    assert response.data.startswith(b"%PDF")
+    assert "ORDER BY incident_date DESC" in server_cursor.execute.call_args.args[0]
+    server_cursor.close.assert_called_once_with()
+
+
+ACME_REPORT_STAMP = {"id": 7, "name": "Acme Co", "last_incident_id": 150, "rollup_incident_count": 150}
+
+
+def test_incident_report_is_served_from_cache_until_incidents_change(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    cursor = connection.cursor.return_value
+    cursor.__iter__.return_value = iter([])
+    cursor.fetchone.side_effect = [
+        request_context(), ACME_REPORT_STAMP, {"count": 0},
+        request_context(), ACME_REPORT_STAMP,
+        request_context(), dict(ACME_REPORT_STAMP, last_incident_id=151, rollup_incident_count=151), {"count": 0},
+    ]
+    with patch.object(app_module, "get_db", return_value=connection):
+        first = client.get("/api/report/pdf")
+        cached = client.get("/api/report/pdf")
+        changed = client.get("/api/report/pdf")
+
+    assert first.status_code == cached.status_code == changed.status_code == 200
+    assert cached.data == first.data
+    assert cached.headers["ETag"] == first.headers["ETag"]
+    assert changed.headers["ETag"] != first.headers["ETag"]
+    assert "no-cache" in first.headers["Cache-Control"]
+    assert "private" in first.headers["Cache-Control"]
+
+
+def test_incident_report_cached_yesterday_is_rendered_again_with_todays_date(client):
+    from datetime import date
+
+    class NextDay(date):
+        @classmethod
+        def today(cls):
+            return date.today() + (date(2026, 1, 2) - date(2026, 1, 1))
+
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    cursor = connection.cursor.return_value
+    cursor.__iter__.return_value = iter([])
+    cursor.fetchone.side_effect = [
+        request_context(), ACME_REPORT_STAMP, {"count": 0},
+        request_context(), ACME_REPORT_STAMP, {"count": 0},
+    ]
+    with patch.object(app_module, "get_db", return_value=connection):
+        today = client.get("/api/report/pdf")
+        with patch.object(app_module, "date", NextDay):
+            tomorrow = client.get("/api/report/pdf")
+
+    assert today.status_code == tomorrow.status_code == 200
+    assert tomorrow.headers["ETag"] != today.headers["ETag"]
+    assert NextDay.today().strftime("%Y%m%d") in tomorrow.headers["Content-Disposition"]
+    assert cursor.fetchone.call_count == 6
+
+
+def test_report_download_revalidates_with_if_none_match(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchone.side_effect = [request_context(), request_context()]
+    with patch.object(app_module, "get_db", return_value=connection), \
+         patch.object(app_module, "render_written_plan", wraps=app_module.render_written_plan) as render:
+        first = client.get("/api/report/plan")
+        revalidated = client.get("/api/report/plan",
+                                 headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.status_code == 200
+    assert revalidated.status_code == 304
+    assert revalidated.data == b""
+    assert render.call_count == 1
+
+
+def test_report_cache_evicts_least_recently_used_files(tmp_path):
+    import io
+    import os
+
+    cache = ReportCache(str(tmp_path), max_bytes=10)
+    for number, key in enumerate(["a", "b"]):
+        cache.put(key, io.BytesIO(b"12345"))
+        os.utime(cache.path(key), (number, number))
+    cache.get("a")
+    cache.put("c", io.BytesIO(b"12345"))
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_report_cache_keeps_the_report_just_put_and_skips_oversized_ones(tmp_path):
+    import io
+    import os
+
+    cache = ReportCache(str(tmp_path), max_bytes=10)
+    cache.put("a", io.BytesIO(b"12345"))
+    os.utime(cache.path("a"), (2**31, 2**31))
+    assert cache.put("b", io.BytesIO(b"1234567")) is not None
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.put("c", io.BytesIO(b"12345678901")) is None
+    assert cache.get("b") is not None
+    assert cache.get("c") is None
+    assert sorted(os.listdir(tmp_path)) == ["b.pdf"]
+
+
+def test_report_evicted_after_cache_lookup_is_rendered_again(client, tmp_path):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchone.side_effect = [request_context()]
+    missing = str(tmp_path / "evicted.pdf")
+    with patch.object(app_module, "get_db", return_value=connection), \
+         patch.object(app_module.report_cache, "get", return_value=missing), \
+         patch.object(app_module.report_cache, "put", return_value=missing):
+        response = client.get("/api/report/plan")
+
+    assert response.status_code == 200
+    assert response.data.startswith(b"%PDF")
+
+
+def test_streamed_story_only_buffers_a_window_of_flowables():
+    pulled = []
+
+    def flowables():
+        for number in range(100):
+            pulled.append(number)
+            yield number
+
+    story = app_module.StreamedStory(flowables(), window=8)
+    assert len(pulled) == 8
+    consumed = []
+    while len(story):
+        consumed.append(story[0])
+        del story[0]
+        assert len(pulled) - len(consumed) <= 8
+    assert consumed == list(range(100))
+
+
+def test_report_job_is_queued_once_and_polled_until_done(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    cursor = connection.cursor.return_value
+    queued = {"id": 31, "kind": "incident_summary", "status": "queued", "filename": None,
+              "created_at": "2026-10-18T09:00:00", "finished_at": None}
+    cursor.fetchone.side_effect = [
+        request_context(), queued,
+        request_context(), dict(queued, result=None),
+        request_context(), dict(queued, status="done", filename="report.pdf", finished_at="2026-10-18T09:00:05",
+                                result=b"%PDF-1.4 rendered"),
+    ]
+    with patch.object(app_module, "get_db", return_value=connection):
+        created = client.post("/api/reports", json={"type": "incident_summary"})
+        pending = client.get("/api/reports/31")
+        done = client.get("/api/reports/31")
+
+    assert created.status_code == 202
+    assert created.headers["Location"] == "/api/reports/31"
+    assert created.get_json()["job"]["status"] == "queued"
+    assert pending.status_code == 202
+    assert pending.headers["Retry-After"] == "2"
+    assert done.status_code == 200
+    assert done.data == b"%PDF-1.4 rendered"
+    assert "report.pdf" in done.headers["Content-Disposition"]
+    insert = next(call for call in cursor.execute.call_args_list if "INSERT INTO report_jobs" in call.args[0])
+    assert insert.args[1] == (7, "incident_summary")
+    assert all(call.args[1][-2:] == (31, 7) for call in cursor.execute.call_args_list
+               if "FROM report_jobs" in call.args[0])
+
+
+def test_failed_report_job_is_reported_as_a_job_state_not_a_server_error(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchone.side_effect = [request_context(), {
+        "id": 31, "kind": "incident_summary", "status": "failed", "filename": None, "result": None,
+        "created_at": "2026-10-18T09:00:00", "finished_at": "2026-10-18T09:00:05",
+    }]
+    with patch.object(app_module, "get_db", return_value=connection):
+        failed = client.get("/api/reports/31")
+
+    assert failed.status_code == 200
+    assert failed.get_json()["job"]["status"] == "failed"
+    assert failed.get_json()["error"] == "Report could not be generated. Please request it again."
+
+
+def test_report_job_rejects_unknown_types_and_other_tenants_jobs(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchone.side_effect = [request_context(), request_context(), None]
+    with patch.object(app_module, "get_db", return_value=connection):
+        invalid = client.post("/api/reports", json={"type": "everything"})
+        missing = client.get("/api/reports/99")
+
+    assert invalid.status_code == 400
+    assert missing.status_code == 404
+    assert connection.cursor.return_value.execute.call_args.args[1] == (99, 7)
+
+
+def test_login_rehashes_passwords_made_with_another_work_factor(client):
+    from werkzeug.security import generate_password_hash
+
+    connection = MagicMock()
+    old_hash = generate_password_hash("safe-password", method="pbkdf2:sha256:1000")
+    connection.cursor.return_value.fetchone.return_value = {
+        "id": 11, "company_id": 7, "email": "owner@example.com", "name": "Owner", "password_hash": old_hash,
+    }
+    hasher = app_module.PasswordHasher(iterations=2000, max_workers=1, max_queue=0)
+    with patch.object(app_module, "get_db", return_value=connection), \
+         patch.object(app_module, "password_hasher", hasher):
+        response = client.post("/api/login", json={"email": "owner@example.com", "password": "safe-password"})
+
+    assert response.status_code == 200
+    update = connection.cursor.return_value.execute.call_args
+    assert update.args[0].startswith("UPDATE users SET password_hash")
+    new_hash, user_id, expected_old_hash = update.args[1]
+    assert new_hash.startswith("pbkdf2:sha256:2000$")
+    assert (user_id, expected_old_hash) == (11, old_hash)
+
+
+def test_login_is_rejected_fast_when_password_hashing_is_saturated(client):
+    connection = MagicMock()
+    connection.cursor.return_value.fetchone.return_value = {
+        "id": 11, "company_id": 7, "email": "owner@example.com", "name": "Owner", "password_hash": "pbkdf2:sha256:1$x$y",
+    }
+    with patch.object(app_module, "get_db", return_value=connection), \
+         patch.object(app_module.password_hasher, "verify", side_effect=app_module.HashingBusy):
+        response = client.post("/api/login", json={"email": "owner@example.com", "password": "safe-password"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    with client.session_transaction() as flask_session:
+        assert "user_id" not in flask_session
+
+
+def test_verify_session_fails_fast_while_the_stripe_breaker_is_open(client):
+    assert isinstance(app_module.stripe.default_http_client, app_module.stripe.RequestsClient)
+    assert app_module.stripe.default_http_client.breaker is app_module.stripe_breaker
+    with patch.object(app_module, "find_checkout_session", return_value=None), \
+         patch.object(app_module.stripe.checkout.Session, "retrieve",
+                      side_effect=app_module.CircuitOpen("Stripe", 12.5)):
+        response = client.get("/api/verify-session?session_id=cs_123&company_id=7")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "12"
+
+
+INCIDENT_CSV_HEADER = ("incident_date,incident_time,exact_location,violence_type,offender_classification,"
+                       "description,logged_by_name,logged_by_title,law_enforcement_contacted\n")
+
+
+def test_bulk_incident_import_copies_rows_and_updates_the_rollup(client):
+    from datetime import date, time
+
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    cursor = connection.cursor.return_value
+    copy = cursor.copy.return_value.__enter__.return_value
+    upload = INCIDENT_CSV_HEADER + (
+        "2026-03-01,09:30,Lobby,Type 2,Customer,Verbal threat,Pat,Manager,no\n"
+        "03/02/2026,1:15 PM,Dock,Type 3,Coworker,Shoving,Pat,Manager,yes\n"
+    )
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.post("/api/incidents/bulk", data=upload, content_type="text/csv")
+
+    assert response.status_code == 201
+    assert response.get_json() == {"success": True, "imported": 2}
+    assert cursor.copy.call_args.args[0].startswith("COPY incidents (company_id, location_id, incident_date")
+    first, second = [call.args[0] for call in copy.write_row.call_args_list]
+    assert first[:4] == (7, "main", date(2026, 3, 1), time(9, 30))
+    assert second[2:4] == (date(2026, 3, 2), time(13, 15))
+    assert second[app_module.INCIDENT_COLUMNS.index("law_enforcement_contacted")] == 1
+    rollup = [call.args[1] for call in cursor.executemany.call_args_list]
+    assert rollup[0] == [(7, "Type 2", 1), (7, "Type 3", 1)]
+    connection.commit.assert_called_once_with()
+
+
+def test_bulk_incident_import_rolls_back_and_reports_every_bad_row(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    copy = connection.cursor.return_value.copy.return_value.__enter__.return_value
+    valid = ('{"incident_date": "2026-03-01", "incident_time": "09:30", "exact_location": "Lobby", '
+             '"violence_type": "Type 2", "offender_classification": "Customer", "description": "Threat", '
+             '"logged_by_name": "Pat", "logged_by_title": "Manager"}')
+    upload = "\n".join([valid, valid.replace("2026-03-01", "March 1st"), "{not json", valid]) + "\n"
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.post("/api/incidents/bulk", data=upload, content_type="application/x-ndjson")
+        unsupported = client.post("/api/incidents/bulk", data=upload, content_type="application/pdf")
+
+    assert response.status_code == 422
+    body = response.get_json()
+    assert body["error_count"] == 2
+    assert [(error["row"], error["field"]) for error in body["errors"]] == [(2, "incident_date"), (3, None)]
+    assert copy.write_row.call_count == 1
+    connection.rollback.assert_called()
+    connection.commit.assert_not_called()
+    assert unsupported.status_code == 415
+
+
+def test_create_incident_reports_the_missing_field(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.post("/api/incidents", json={"incident_date": "2026-03-01", "incident_time": "09:30"})
+    assert response.status_code == 400
+    assert response.get_json()["field"] == "exact_location"
+
+
+def test_create_incident_names_a_field_that_is_not_text(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.post("/api/incidents", json={
+            "incident_date": "2026-03-01", "incident_time": "09:30", "exact_location": "Lobby",
+            "violence_type": ["Type 2"], "offender_classification": "Customer", "description": "Threat",
+            "logged_by_name": "Pat", "logged_by_title": "Manager",
+        })
+    assert response.status_code == 400
+    assert response.get_json()["field"] == "violence_type"
+    assert response.get_json()["error"] == "violence_type must be text"
+
+
+def test_bulk_import_answers_unreadable_or_unstorable_uploads_without_a_500(client):
+    import psycopg
+
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    copy = connection.cursor.return_value.copy.return_value.__enter__.return_value
+    latin1 = (INCIDENT_CSV_HEADER + "2026-03-01,09:30,Caf\xe9,Type 2,Customer,Threat,Pat,Manager,no\n").encode("latin-1")
+    valid = {"incident_date": "2026-03-01", "incident_time": "09:30", "exact_location": "Lobby",
+             "violence_type": "Type 2", "offender_classification": "Customer", "description": "Threat",
+             "logged_by_name": "Pat", "logged_by_title": "Manager"}
+    unstorable = "\n".join(json.dumps(dict(valid, **fields)) for fields in [
+        {"description": {"text": "Threat"}}, {"injuries": ["cut"]}, {"exact_location": "Lob\u0000by"},
+    ]) + "\n"
+    with patch.object(app_module, "get_db", return_value=connection):
+        not_utf8 = client.post("/api/incidents/bulk", data=latin1, content_type="text/csv")
+        not_utf8_dry_run = client.post("/api/incidents/bulk?dry_run=1", data=latin1, content_type="text/csv")
+        rejected = client.post("/api/incidents/bulk", data=unstorable, content_type="application/x-ndjson")
+        copy.write_row.side_effect = psycopg.errors.NumericValueOutOfRange("integer out of range")
+        refused = client.post("/api/incidents/bulk", data=json.dumps(valid) + "\n",
+                              content_type="application/x-ndjson")
+
+    assert not_utf8.status_code == not_utf8_dry_run.status_code == 400
+    assert "UTF-8" in not_utf8.get_json()["error"]
+    assert rejected.status_code == 422
+    assert [(error["row"], error["field"]) for error in rejected.get_json()["errors"]] == [
+        (1, "description"), (2, "injuries"), (3, "exact_location"),
+    ]
+    assert refused.status_code == 422
+    assert refused.get_json()["error"].startswith("No rows were imported")
+    connection.commit.assert_not_called()
+
+
+def test_training_bulk_dry_run_validates_without_touching_the_database(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    upload = ("training_date,training_type,attendee_count\n"
+              "2026-02-01,Annual,12\n"
+              "2026-02-02,,3\n"
+              "2026-02-03,Refresher,-1\n")
+    valid_upload = "training_date,training_type\n2026-02-01,Annual\n"
+    with patch.object(app_module, "get_db", return_value=connection) as get_db:
+        rejected = client.post("/api/training/bulk?dry_run=1", data=upload, content_type="text/csv")
+        accepted = client.post("/api/training/bulk?dry_run=true", data=valid_upload, content_type="text/csv")
+
+    assert rejected.status_code == 422
+    assert [(error["row"], error["field"]) for error in rejected.get_json()["errors"]] == [
+        (3, "training_type"), (4, "attendee_count"),
+    ]
+    assert accepted.status_code == 200
+    assert accepted.get_json() == {"success": True, "dry_run": True, "valid": 1}
+    # Only the request context lookups touched the database.
+    assert get_db.call_count == 2
+    assert connection.cursor.return_value.execute.call_count == 2
+    connection.cursor.return_value.copy.assert_not_called()
+
+
+def test_training_attendee_count_beyond_an_integer_is_a_field_error(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    with patch.object(app_module, "get_db", return_value=connection):
+        single = client.post("/api/training", json={
+            "training_date": "2026-02-01", "training_type": "Annual", "attendee_count": 99999999999,
+        })
+        bulk = client.post("/api/training/bulk", data="training_date,training_type,attendee_count\n"
+                                                      "2026-02-01,Annual,99999999999\n",
+                           content_type="text/csv")
+
+    assert single.status_code == 400
+    assert single.get_json()["field"] == "attendee_count"
+    assert bulk.status_code == 422
+    assert [(error["row"], error["field"]) for error in bulk.get_json()["errors"]] == [(2, "attendee_count")]
+    connection.cursor.return_value.copy.return_value.__enter__.return_value.write_row.assert_not_called()
+
+
+def test_training_bulk_import_copies_the_roster_in_one_transaction(client):
+    from datetime import date
+
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    copy = connection.cursor.return_value.copy.return_value.__enter__.return_value
+    upload = ('{"training_date": "2026-02-01", "training_type": "Annual", "attendee_count": 12}\n'
+              '{"training_date": "02/02/2026", "training_type": "Annual"}\n')
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.post("/api/training/bulk", data=upload, content_type="application/x-ndjson")
+
+    assert response.status_code == 201
+    assert response.get_json()["imported"] == 2
+    rows = [call.args[0] for call in copy.write_row.call_args_list]
+    assert [row[:3] for row in rows] == [(7, date(2026, 2, 1), "Annual"), (7, date(2026, 2, 2), "Annual")]
+    assert [row[5] for row in rows] == [12, 0]
+    connection.commit.assert_called_once_with()
+
+
+def test_incident_export_streams_batches_from_a_server_side_cursor(client):
+    from datetime import date, time
+
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    server_cursor = MagicMock()
+    row = dict.fromkeys(app_module.INCIDENT_EXPORT_COLUMNS, "")
+    row.update(id=1, incident_date=date(2026, 3, 1), incident_time=time(9, 30), description="Said \"leave\", then left",
+               employees_involved='["Sam"]', law_enforcement_contacted=0)
+    server_cursor.fetchmany.side_effect = [[row, dict(row, id=2)], [dict(row, id=3)], []]
+    connection.cursor.side_effect = lambda name=None: server_cursor if name else connection.cursor.return_value
+    with patch.object(app_module, "get_db", return_value=connection):
+        csv_response = client.get("/api/export/incidents?from=2026-01-01&to=2026-06-30")
+        csv_body = csv_response.get_data(as_text=True)
+        server_cursor.fetchmany.side_effect = [[row], []]
+        ndjson_lines = client.get("/api/export/incidents?format=ndjson").get_data(as_text=True).splitlines()
+        invalid = client.get("/api/export/incidents?from=yesterday")
+
+    assert csv_response.mimetype == "text/csv"
+    assert "attachment" in csv_response.headers["Content-Disposition"]
+    lines = csv_body.splitlines()
+    assert lines[0].startswith("id,location_id,incident_date,incident_time")
+    assert lines[1].startswith("1,,2026-03-01,09:30")
+    assert '"Said ""leave"", then left"' in lines[1]
+    assert len(lines) == 4
+    query, params = server_cursor.execute.call_args_list[0].args
+    assert "incident_date >= %s AND incident_date <= %s" in " ".join(query.split())
+    assert params == [7, date(2026, 1, 1), date(2026, 6, 30)]
+    assert json.loads(ndjson_lines[0])["employees_involved"] == ["Sam"]
+    assert invalid.status_code == 400
+    assert server_cursor.close.call_count == 2
+
+
+def test_list_endpoints_answer_if_none_match_from_the_company_data_version(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    cursor = connection.cursor.return_value
+    cursor.fetchall.return_value = [{"id": 1}]
+    with patch.object(app_module, "get_db", return_value=connection):
+        first = client.get("/api/incidents")
+        cursor.fetchall.reset_mock()
+        unchanged = client.get("/api/incidents", headers={"If-None-Match": first.headers["ETag"]})
+        other_page = client.get("/api/incidents?limit=5", headers={"If-None-Match": first.headers["ETag"]})
+        cursor.fetchone.return_value = request_context(data_version=4)
+        changed = client.get("/api/incidents", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.status_code == 200
+    assert first.headers["ETag"].startswith('"v3-')
+    assert "no-cache" in first.headers["Cache-Control"]
+    assert unchanged.status_code == 304
+    assert unchanged.data == b""
+    assert other_page.status_code == 200
+    assert other_page.headers["ETag"] != first.headers["ETag"]
+    assert changed.status_code == 200
+    assert changed.headers["ETag"].startswith('"v4-')
+    # The 304 skipped the list query entirely.
+    assert cursor.fetchall.call_count == 2
+
+
+def test_writes_bump_the_company_data_version_in_their_transaction(client):
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    connection.cursor.return_value.fetchone.side_effect = [request_context(), {"id": 5}]
+    with patch.object(app_module, "get_db", return_value=connection):
+        response = client.post("/api/training", json={"training_date": "2026-02-01", "training_type": "Annual"})
+
+    assert response.status_code == 201
+    statements = [call.args[0] for call in connection.cursor.return_value.execute.call_args_list]
+    assert statements[-1] == "UPDATE companies SET data_version = data_version + 1 WHERE id = %s"
+    connection.commit.assert_called_once_with()
+
+
+def test_metrics_record_each_route_after_its_body_is_sent(client, tmp_path):
+    from backend.request_metrics import Registry
+
+    connection = MagicMock()
+    _signed_in_with_active_subscription(client, connection)
+    server_cursor = MagicMock()
+    server_cursor.fetchmany.side_effect = [[dict.fromkeys(app_module.TRAINING_EXPORT_COLUMNS, "x")], []]
+    connection.cursor.side_effect = lambda name=None: server_cursor if name else connection.cursor.return_value
+    with patch.object(app_module.request_metrics, "registry", Registry(str(tmp_path))), \
+         patch.object(app_module, "get_db", return_value=connection):
+        export = client.get("/api/export/training?format=ndjson")
+        export_size = len(export.get_data())
+        export.close()
+        client.get("/api/health").close()
+        client.get("/api/nothing-here").close()
+        with patch.dict("os.environ", METRICS_TOKEN="scrape-token"):
+            scrape = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+            local = client.get("/metrics")
+            remote = client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.9"},
+                                headers={"Authorization": "Bearer wrong"})
+
+    text = scrape.get_data(as_text=True)
+    assert scrape.mimetype == "text/plain"
+    assert 'compcleared_http_requests_total{route="/api/export/training",method="GET",status="200"} 1' in text
+    assert ('compcleared_http_response_size_bytes_sum{route="/api/export/training",method="GET"} '
+            f'{export_size}') in text
+    assert 'compcleared_http_request_duration_seconds_count{route="/api/health",method="GET"} 1' in text
+    assert 'compcleared_http_requests_total{route="<unmatched>",method="GET",status="404"} 1' in text
+    # Behind a reverse proxy on the same host every request comes from loopback.
+    assert local.status_code == remote.status_code == 404
@@ -0,0 +1,233 @@
+import asyncio
+import contextlib
+import json
+from datetime import date, time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from psycopg_pool import PoolTimeout
+
+import backend.app as app_module
+import backend.asgi as asgi_module
+import backend.incident_stats as incident_stats
+
+INCIDENTS = [
+    {"id": 3, "company_id": 7, "incident_date": date(2026, 3, 2), "incident_time": time(9, 30),
+     "violence_type": "Type 2", "employees_involved": '["Sam"]'},
+    {"id": 2, "company_id": 7, "incident_date": date(2026, 3, 1), "incident_time": time(8, 0),
+     "violence_type": "Type 1", "employees_involved": "[]"},
+]
+TRAINING = [{"id": 4, "company_id": 7, "training_date": date(2026, 2, 1), "training_type": "Annual"}]
+
+
+class Database:
+    """Answers the dashboard's statements for both the sync and the async fake."""
+
+    def __init__(self, subscription_status="active"):
+        self.context = {
+            "user_record": {"id": 11, "company_id": 7, "email": "owner@example.com"},
+            "company_record": {"id": 7, "name": "Acme Co", "subscription_status": subscription_status,
+                               "data_version": 3},
+        }
+
+    def answer(self, query, params):
+        if query == app_module.REQUEST_CONTEXT_QUERY:
+            return [self.context]
+        if query == incident_stats.STATS_BY_TYPE_QUERY:
+            return [{"violence_type": "Type 1", "count": 1}, {"violence_type": "Type 2", "count": 1}]
+        if query == incident_stats.STATS_RECENT_QUERY:
+            return [{"count": 1}]
+        rows = INCIDENTS if "FROM incidents" in query else TRAINING
+        return rows[:params[-1]] if "LIMIT" in query else rows
+
+
+class SyncCursor:
+    def __init__(self, database):
+        self.database = database
+        self.rows = []
+
+    def execute(self, query, params=()):
+        self.rows = self.database.answer(query, params)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+class SyncConnection:
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self):
+        return SyncCursor(self.database)
+
+    def close(self):
+        pass
+
+
+class AsyncCursor(SyncCursor):
+    async def fetchone(self):
+        return SyncCursor.fetchone(self)
+
+    async def fetchall(self):
+        return SyncCursor.fetchall(self)
+
+
+class AsyncConnection:
+    def __init__(self, database):
+        self.database = database
+
+    async def execute(self, query, params=()):
+        cursor = AsyncCursor(self.database)
+        cursor.execute(query, params)
+        return cursor
+
+
+def session_cookie(**values):
+    serializer = app_module.app.session_interface.get_signing_serializer(app_module.app)
+    return f"{app_module.app.config['SESSION_COOKIE_NAME']}={serializer.dumps(values)}"
+
+
+async def request(application, method, path, query="", headers=(), body=b""):
+    """Send one request to an ASGI app; returns (status, sorted headers, body)."""
+    messages = []
+    pending = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return pending.pop(0) if pending else {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    await application({
+        "type": "http", "method": method, "path": path, "query_string": query.encode(),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+        "http_version": "1.1", "scheme": "http", "root_path": "",
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }, receive, send)
+    start = messages[0]
+    return (start["status"], sorted(start["headers"]),
+            b"".join(message.get("body", b"") for message in messages[1:]))
+
+
+def call(application, method, path, query="", headers=(), body=b""):
+    return asyncio.run(request(application, method, path, query, headers, body))
+
+
+@pytest.fixture
+def application():
+    app_module.app.config.update(TESTING=True, SECRET_KEY="test-secret")
+    application = asgi_module.Application(app_module.app, wsgi_threads=2)
+    yield application
+    application.wsgi.close()
+
+
+def serve_both(application, database, method, path, query="", headers=()):
+    """The same request answered by the async handler and by the Flask route."""
+    @contextlib.asynccontextmanager
+    async def async_db():
+        yield AsyncConnection(database)
+
+    with patch.object(asgi_module.database, "async_db", async_db), \
+         patch.object(app_module, "get_db", lambda: SyncConnection(database)):
+        served_async = call(application, method, path, query, headers)
+        served_by_flask = call(application.wsgi, method, path, query, headers)
+    return served_async, served_by_flask
+
+
+def signed_in():
+    return ("Cookie", session_cookie(user_id=11, company_id=7))
+
+
+@pytest.mark.parametrize("path,query,cookie,origin", [
+    ("/api/me", "", "signed in", None),
+    ("/api/incidents", "", "signed in", "https://compcleared.com"),
+    ("/api/incidents", "limit=1", "signed in", None),
+    ("/api/incidents", "limit=0", "signed in", None),
+    ("/api/training", "cursor=not-a-cursor", "signed in", None),
+    ("/api/training", "limit=1", "signed in", "https://evil.example"),
+    ("/api/stats", "", "signed in", None),
+    ("/api/stats", "", None, None),
+    ("/api/incidents", "", "session=forged", None),
+])
+def test_dashboard_reads_answer_exactly_like_the_flask_routes(application, path, query, cookie, origin):
+    headers = [signed_in() if cookie == "signed in" else ("Cookie", cookie)] if cookie else []
+    if origin:
+        headers.append(("Origin", origin))
+
+    served_async, served_by_flask = serve_both(application, Database(), "GET", path, query, headers)
+
+    assert served_async == served_by_flask
+    if cookie == "signed in" and query in ("", "limit=1"):
+        assert served_async[0] == 200
+
+
+def test_revalidation_and_subscription_checks_match_the_flask_routes(application):
+    first, _ = serve_both(application, Database(), "GET", "/api/incidents", headers=[signed_in()])
+    etag = dict(first[1])[b"etag"].decode()
+
+    unchanged = serve_both(application, Database(), "GET", "/api/incidents",
+                           headers=[signed_in(), ("If-None-Match", etag)])
+    canceled = serve_both(application, Database("canceled"), "GET", "/api/incidents", headers=[signed_in()])
+
+    assert unchanged[0] == unchanged[1]
+    assert unchanged[0][0] == 304
+    assert canceled[0] == canceled[1]
+    assert canceled[0][0] == 403
+
+
+def test_head_requests_get_the_get_headers_without_a_body(application):
+    get, _ = serve_both(application, Database(), "GET", "/api/incidents", headers=[signed_in()])
+    head, head_by_flask = serve_both(application, Database(), "HEAD", "/api/incidents", headers=[signed_in()])
+
+    assert head == head_by_flask
+    assert head[0] == 200
+    assert head[1] == get[1]
+    assert dict(head[1])[b"content-length"] == str(len(get[2])).encode()
+    assert head[2] == b""
+
+
+def test_dashboard_reads_follow_the_flask_session_settings_and_access_rule(application):
+    with patch.dict(app_module.app.config, SESSION_COOKIE_NAME="compcleared_session"):
+        renamed = serve_both(application, Database(), "GET", "/api/incidents", headers=[signed_in()])
+    with patch.object(app_module, "access_denial", return_value=("Account locked", 423)):
+        locked = serve_both(application, Database(), "GET", "/api/incidents", headers=[signed_in()])
+
+    assert renamed[0] == renamed[1]
+    assert renamed[0][0] == 200
+    assert locked[0] == locked[1]
+    assert locked[0][0] == 423
+    assert json.loads(locked[0][2])["error"] == "Account locked"
+
+
+def test_a_busy_async_pool_answers_503(application):
+    @contextlib.asynccontextmanager
+    async def async_db():
+        raise PoolTimeout("no connection")
+        yield
+
+    with patch.object(asgi_module.database, "async_db", async_db):
+        status, headers, body = call(application, "GET", "/api/stats", headers=[signed_in()])
+
+    assert status == 503
+    assert (b"retry-after", b"1") in headers
+    assert json.loads(body)["error"] == "Service is busy, please retry"
+
+
+def test_other_routes_run_on_flask_with_their_request_body(application):
+    conn = MagicMock()
+    conn.cursor.return_value.fetchone.return_value = None
+
+    with patch.object(app_module, "get_db", return_value=conn):
+        # No Content-Length, as with a chunked upload.
+        status, _, body = call(application, "POST", "/api/login", headers=[("Content-Type", "application/json")],
+                               body=json.dumps({"email": "owner@example.com", "password": "pw"}).encode())
+    health = call(application, "GET", "/api/health")
+
+    assert status == 401
+    assert json.loads(body)["error"] == "Invalid email or password"
+    conn.cursor.return_value.execute.assert_called_once_with(
+        "SELECT * FROM users WHERE email = %s", ("owner@example.com",))
+    assert json.loads(health[2]) == {"status": "ok", "service": "CompCleared SB 553"}
@@ -0,0 +1,65 @@
+import io
+from datetime import date, time
+
+import pytest
+
+from backend import bulk_import
+
+
+def test_csv_and_ndjson_records_are_numbered_like_the_source_file():
+    csv_upload = io.BytesIO("﻿incident_date,description\n2026-01-31,\"Two\nlines\"\n01/02/2026,Other,extra\n".encode())
+    assert list(bulk_import.read_records(csv_upload, "text/csv", 10)) == [
+        (2, {"incident_date": "2026-01-31", "description": "Two\nlines"}),
+        (3, {"incident_date": "01/02/2026", "description": "Other"}),
+    ]
+
+    ndjson_upload = io.BytesIO(b'{"a": 1}\n\n{"a": \n[1]\n')
+    rows = list(bulk_import.read_records(ndjson_upload, "application/x-ndjson", 10))
+    assert rows[0] == (1, {"a": 1})
+    assert [number for number, _ in rows] == [1, 3, 4]
+    assert all(isinstance(record, bulk_import.RowError) for _, record in rows[1:])
+
+    with pytest.raises(bulk_import.TooManyRows):
+        list(bulk_import.read_records(io.BytesIO(b'{}\n{}\n'), "application/x-ndjson", 1))
+
+
+def test_field_parsers_accept_spreadsheet_formats_and_name_the_bad_field():
+    record = {"day": "01/31/2026", "at": "2:30 pm", "police": "Yes", "people": "Pat; Sam"}
+    assert bulk_import.parse_date(record, "day") == date(2026, 1, 31)
+    assert bulk_import.parse_time(record, "at") == time(14, 30)
+    assert bulk_import.parse_flag(record, "police") == 1
+    assert bulk_import.parse_flag({"police": True}, "police") == 1
+    assert bulk_import.parse_list(record, "people") == ["Pat", "Sam"]
+    assert bulk_import.parse_list({"people": '["Pat"]'}, "people") == ["Pat"]
+
+    for parse, value in [(bulk_import.parse_date, "31.01.2026"), (bulk_import.parse_time, "noon"),
+                         (bulk_import.parse_flag, "maybe"), (bulk_import.require, " ")]:
+        with pytest.raises(bulk_import.RowError) as error:
+            parse({"field": value}, "field")
+        assert error.value.field == "field"
+
+
+def test_unreadable_uploads_and_non_text_fields_are_rejected():
+    for upload in ["a,b\n1,caf\xe9\n".encode("latin-1"), b"a\n" + b"x" * 200000 + b"\n"]:
+        with pytest.raises(bulk_import.UnreadableUpload):
+            list(bulk_import.read_records(io.BytesIO(upload), "text/csv", 10))
+    with pytest.raises(bulk_import.UnreadableUpload):
+        list(bulk_import.read_records(io.BytesIO(b'{"a": "\xff"}\n'), "application/x-ndjson", 10))
+
+    assert bulk_import.parse_text({"note": "ok"}, "note") == "ok"
+    assert bulk_import.parse_text({}, "note") == ""
+    for value in [{"a": 1}, ["a"], 3, "nul\x00"]:
+        with pytest.raises(bulk_import.RowError) as error:
+            bulk_import.parse_text({"field": value}, "field")
+        assert error.value.field == "field"
+    with pytest.raises(bulk_import.RowError):
+        bulk_import.parse_text({"field": " "}, "field", required=True)
+
+
+def test_whole_numbers_must_fit_an_integer_column():
+    assert bulk_import.parse_int({"count": str(bulk_import.INTEGER_MAX)}, "count") == 2**31 - 1
+    assert bulk_import.parse_int({"count": bulk_import.INTEGER_MIN}, "count") == -2**31
+    for value in ["99999999999", 2**31, -2**31 - 1]:
+        with pytest.raises(bulk_import.RowError) as error:
+            bulk_import.parse_int({"count": value}, "count")
+        assert error.value.field == "count"
@@ -0,0 +1,73 @@
+from unittest.mock import MagicMock, patch
+
+from psycopg.pq import TransactionStatus
+import pytest
+
+import backend.database as database_module
+
+
+@pytest.fixture
+def pool_class():
+    database_module.close_pool()
+    with patch.dict(database_module.os.environ, {"DATABASE_URL": "postgres://test"}), \
+         patch.object(database_module, "ConnectionPool") as pool_class:
+        yield pool_class
+    database_module.close_pool()
+
+
+def test_pool_is_created_once_per_process_with_normalized_url(pool_class):
+    first = database_module.get_pool()
+    second = database_module.get_pool()
+    assert first is second
+    assert pool_class.call_count == 1
+    assert pool_class.call_args.args[0] == "postgresql://test"
+    assert pool_class.call_args.kwargs["check"] is not None
+
+    with patch.object(database_module.os, "getpid", return_value=-1):
+        database_module.get_pool()
+    assert pool_class.call_count == 2
+
+
+def test_close_returns_the_connection_to_the_pool_and_rolls_back_open_work(pool_class):
+    raw_connection = MagicMock(closed=False)
+    raw_connection.info.transaction_status = TransactionStatus.INTRANS
+    pool = pool_class.return_value
+    pool.getconn.return_value = raw_connection
+
+    conn = database_module.get_db()
+    conn.cursor().execute("SELECT 1")
+    conn.close()
+    conn.close()
+
+    raw_connection.rollback.assert_called_once_with()
+    pool.putconn.assert_called_once_with(raw_connection)
+    raw_connection.close.assert_not_called()
+    assert conn.closed
+    with pytest.raises(database_module.psycopg.InterfaceError):
+        conn.cursor()
+
+
+def test_context_manager_commits_before_returning_to_the_pool(pool_class):
+    raw_connection = MagicMock(closed=False)
+    raw_connection.info.transaction_status = TransactionStatus.IDLE
+    pool = pool_class.return_value
+    pool.getconn.return_value = raw_connection
+
+    with database_module.get_db() as conn:
+        conn.cursor().execute("INSERT INTO companies DEFAULT VALUES")
+
+    raw_connection.commit.assert_called_once_with()
+    raw_connection.rollback.assert_not_called()
+    pool.putconn.assert_called_once_with(raw_connection)
+
+
+def test_checkout_time_is_recorded_against_the_current_request(pool_class, tmp_path):
+    from backend import request_metrics
+
+    pool_class.return_value.getconn.return_value = MagicMock(closed=True)
+    with patch.object(request_metrics, "registry", request_metrics.Registry(str(tmp_path))) as registry:
+        stats = request_metrics.start_request("/api/stats", "GET")
+        database_module.get_db()
+        request_metrics.finish_request(stats, 200, 10)
+
+        assert 'compcleared_db_connect_duration_seconds_count{route="/api/stats"} 1' in registry.render()
@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from backend.hashing import HashingBusy, PasswordHasher
+
+
+def test_hashes_verify_and_flag_other_work_factors_for_rehash():
+    hasher = PasswordHasher(iterations=1000, max_workers=1, max_queue=0)
+    old_hasher = PasswordHasher(iterations=2000, max_workers=1, max_queue=0)
+    password_hash = hasher.hash("correct horse")
+
+    assert password_hash.startswith("pbkdf2:sha256:1000$")
+    assert hasher.verify(password_hash, "correct horse") == (True, False)
+    assert hasher.verify(password_hash, "wrong") == (False, False)
+    assert hasher.verify(old_hasher.hash("correct horse"), "correct horse") == (True, True)
+    assert hasher.metrics()["hash_latency"]["count"] == 4
+
+
+def test_saturated_pool_rejects_immediately_instead_of_queueing():
+    hasher = PasswordHasher(iterations=1000, max_workers=1, max_queue=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking(value):
+        started.set()
+        release.wait(5)
+        return value
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(hasher._run(blocking, "done"))) for _ in range(2)]
+    threads[0].start()
+    started.wait(5)
+    threads[1].start()
+    while hasher.metrics()["in_flight"] < 2:
+        pass
+
+    with pytest.raises(HashingBusy):
+        hasher.hash("third caller")
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    metrics = hasher.metrics()
+    assert results == ["done", "done"]
+    assert metrics["rejected"] == 1
+    assert metrics["in_flight"] == 0
+    assert metrics["queue_wait"]["count"] == 2
@@ -0,0 +1,74 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import backend.migrate as migrate
+
+
+def migration(name):
+    return next(migration for migration in migrate.discover() if migration.name == name)
+
+
+def executed(connection):
+    return [call.args[0] for call in connection.cursor.return_value.execute.call_args_list]
+
+
+def test_migrations_are_numbered_without_gaps():
+    migrations = migrate.discover()
+    assert [migration.version for migration in migrations] == list(range(1, len(migrations) + 1))
+    assert migration("initial_tables").transactional
+    assert not migration("tenant_indexes").transactional
+
+
+def test_checkout_authorization_schema_is_created():
+    connection = MagicMock()
+    migration("initial_tables").module.upgrade(connection)
+    assert any("checkout_authorizations" in statement for statement in executed(connection))
+
+
+def test_tenant_indexes_are_built_concurrently_outside_a_transaction():
+    connection = MagicMock()
+    # Every index lookup reports an INVALID leftover from an interrupted build.
+    connection.cursor.return_value.fetchone.return_value = (False,)
+    tenant_indexes = migration("tenant_indexes").module
+
+    tenant_indexes.upgrade(connection)
+
+    statements = executed(connection)
+    index_statements = [statement for statement in statements if "CREATE INDEX CONCURRENTLY" in statement]
+    assert len(index_statements) == len(tenant_indexes.TENANT_INDEXES)
+    assert sum("DROP INDEX CONCURRENTLY" in statement for statement in statements) == len(
+        tenant_indexes.TENANT_INDEXES)
+    assert any("incidents (company_id, incident_date DESC, incident_time DESC, id DESC)" in statement
+               for statement in index_statements)
+    assert connection.autocommit is True
+
+
+def test_workers_only_read_the_applied_versions():
+    versions = [migration.version for migration in migrate.discover()]
+    connection = MagicMock()
+    connection.__enter__.return_value = connection
+    connection.execute.return_value.fetchone.return_value = (False,)
+    connection.execute.return_value.fetchall.return_value = [(version,) for version in versions]
+
+    with patch.object(migrate.psycopg, "connect", return_value=connection):
+        migrate.verify_schema("postgres://test")
+        connection.execute.return_value.fetchall.return_value = [(version,) for version in versions[:-1]]
+        with pytest.raises(migrate.SchemaOutOfDate, match=str(migrate.discover()[-1])):
+            migrate.verify_schema("postgres://test")
+
+    statements = [call.args[0] for call in connection.execute.call_args_list]
+    assert statements == ["SELECT to_regclass('schema_migrations') IS NULL",
+                          "SELECT version FROM schema_migrations"] * 2
+
+
+def test_duplicate_pending_report_jobs_are_failed_before_the_unique_key_is_built():
+    connection = MagicMock()
+    connection.cursor.return_value.fetchone.return_value = None
+
+    migration("report_job_pending_key").module.upgrade(connection)
+
+    statements = executed(connection)
+    assert "SET status = 'failed'" in statements[0]
+    assert statements[-1].startswith("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS report_jobs_pending_key")
+    assert connection.autocommit is True
@@ -0,0 +1,957 @@
+"""Tests that need a real Postgres.
+
+Set TEST_DATABASE_URL to a disposable database to run them; the public schema
+is dropped and recreated for every test.
+"""
+import json
+import os
+import socket
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+os.environ.pop("DATABASE_URL", None)
+
+import psycopg
+import pytest
+
+import backend.app as app_module
+import backend.database as database_module
+import backend.migrate as migrate
+from backend.report_cache import ReportCache
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+@pytest.fixture
+def database(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", TEST_DATABASE_URL)
+    database_module.close_pool()
+    with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA public CASCADE")
+        conn.execute("CREATE SCHEMA public")
+    migrate.migrate(TEST_DATABASE_URL)
+    yield TEST_DATABASE_URL
+    database_module.close_pool()
+
+
+@pytest.fixture
+def client(database, tmp_path):
+    app_module.app.config.update(TESTING=True, SECRET_KEY="test-secret")
+    report_cache = ReportCache(str(tmp_path / "reports"), 1024 * 1024)
+    with patch.object(app_module, "report_cache", report_cache), \
+         app_module.app.test_client() as test_client:
+        yield test_client
+
+
+def seed_company(conn, name, subscription_id, incidents=0, training_records=0):
+    company_id = conn.execute(
+        """INSERT INTO companies (name, tier, subscription_status, stripe_customer_id,
+                                  stripe_subscription_id, created_at)
+           VALUES (%s, 'annual', 'active', %s, %s, '2026-01-01T00:00:00')
+           RETURNING id""",
+        (name, f"cus_{subscription_id}", subscription_id)).fetchone()[0]
+    conn.execute("""INSERT INTO users (company_id, email, name, role, created_at)
+                    VALUES (%s, %s, 'Owner', 'admin', '2026-01-01T00:00:00')""",
+                 (company_id, f"owner@{subscription_id}.example"))
+    for number in range(incidents):
+        conn.execute(
+            """INSERT INTO incidents (company_id, location_id, incident_date, incident_time,
+                                      exact_location, violence_type, offender_classification,
+                                      description, logged_by_name, logged_by_title, log_date,
+                                      created_at)
+               VALUES (%s, 'main', %s, %s, 'Lobby', %s, 'Type 2', 'Verbal threat',
+                       'Pat', 'Manager', '2026-01-01T00:00:00', '2026-01-01T00:00:00')""",
+            (company_id, f"2026-{number % 12 + 1:02d}-{number % 28 + 1:02d}",
+             f"{number % 24:02d}:15", ("Type 1", "Type 2", "Type 3")[number % 3]))
+    for number in range(training_records):
+        conn.execute(
+            """INSERT INTO training_records (company_id, training_date, training_type, created_at)
+               VALUES (%s, %s, 'Annual', '2026-01-01T00:00:00')""",
+            (company_id, f"2026-{number % 12 + 1:02d}-01"))
+    return company_id
+
+
+def sign_in(client, company_id):
+    """Sign the test client in as the owner seed_company created."""
+    with psycopg.connect(TEST_DATABASE_URL) as conn:
+        user_id = conn.execute("SELECT id FROM users WHERE company_id = %s ORDER BY id LIMIT 1",
+                               (company_id,)).fetchone()[0]
+    with client.session_transaction() as flask_session:
+        flask_session["user_id"] = user_id
+        flask_session["company_id"] = company_id
+
+
+class RecordingConnection:
+    def __init__(self, connection, statements):
+        self._connection = connection
+        self._statements = statements
+
+    def cursor(self, *args, **kwargs):
+        return RecordingCursor(self._connection.cursor(*args, **kwargs), self._statements)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class RecordingCursor:
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+
+    def execute(self, statement, params=()):
+        self._statements.append((statement, params))
+        return self._cursor.execute(statement, params)
+
+    def executemany(self, statement, params_seq):
+        self._statements.append((statement, None))
+        return self._cursor.executemany(statement, params_seq)
+
+    def copy(self, statement, *args, **kwargs):
+        self._statements.append((statement, None))
+        return self._cursor.copy(statement, *args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+
+def plan_node_types(plan):
+    yield plan["Node Type"]
+    for child in plan.get("Plans", []):
+        yield from plan_node_types(child)
+
+
+def test_tenant_scoped_endpoint_queries_use_index_scans(client, database):
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=60, training_records=30)
+        seed_company(conn, "Other", "sub_other", incidents=60, training_records=30)
+        incident_id = conn.execute("SELECT MAX(id) FROM incidents WHERE company_id = %s",
+                                   (company_id,)).fetchone()[0]
+        conn.execute("ANALYZE")
+
+    sign_in(client, company_id)
+
+    from backend import webhook_worker
+
+    statements = []
+    real_get_db = database_module.get_db
+    canceled_event = {"id": "evt_canceled", "type": "customer.subscription.deleted", "created": 1760000000,
+                      "data": {"object": {"id": "sub_other"}}}
+    with patch.object(app_module, "get_db", lambda: RecordingConnection(real_get_db(), statements)), \
+         patch.object(app_module.stripe.Webhook, "construct_event", return_value=canceled_event):
+        first_page = client.get("/api/incidents?limit=5").get_json()
+        first_matches = client.get("/api/incidents/search?q=verbal+threat&limit=5").get_json()
+        responses = [
+            client.get("/api/incidents"),
+            client.get(f"/api/incidents?limit=5&cursor={first_page['next_cursor']}"),
+            client.get(f"/api/incidents/{incident_id}"),
+            client.get(f"/api/incidents/search?q=threat&limit=5&cursor={first_matches['next_cursor']}"),
+            client.get("/api/stats"),
+            client.get("/api/training"),
+            client.get("/api/training?limit=5"),
+            client.get("/api/report/pdf"),
+            client.get("/api/export/incidents?from=2026-02-01&to=2026-05-31"),
+            client.get("/api/export/training?format=ndjson"),
+            client.post("/api/webhook", data=json.dumps(canceled_event), headers={"Stripe-Signature": "sig"}),
+        ]
+        assert all(response.status_code == 200 for response in responses)
+        assert all(response.get_data() for response in responses)
+    conn = RecordingConnection(real_get_db(), statements)
+    try:
+        assert webhook_worker.process_next_event(conn) == "evt_canceled"
+    finally:
+        conn.close()
+
+    explained = 0
+    with psycopg.connect(database) as conn:
+        # With sequential scans priced out, a Seq Scan in the plan means no index
+        # can serve the statement's shape at all.
+        conn.execute("SET enable_seqscan = off")
+        for statement, params in statements:
+            normalized = " ".join(statement.split())
+            if not normalized.startswith(("SELECT", "UPDATE")) or "pg_advisory_xact_lock" in normalized:
+                continue
+            plan = conn.execute("EXPLAIN (FORMAT JSON) " + statement, params).fetchone()[0]
+            node_types = list(plan_node_types(plan[0]["Plan"]))
+            assert "Seq Scan" not in node_types, (normalized, json.dumps(plan))
+            explained += 1
+        conn.rollback()
+    assert explained >= 14
+
+
+LEGACY_TEXT_SCHEMA = """
+CREATE TABLE companies (
+    id SERIAL PRIMARY KEY, name TEXT NOT NULL, tier TEXT NOT NULL, employee_count INTEGER,
+    locations TEXT, created_at TEXT, subscription_status TEXT, stripe_customer_id TEXT,
+    stripe_subscription_id TEXT
+);
+CREATE TABLE users (
+    id SERIAL PRIMARY KEY, company_id INTEGER REFERENCES companies (id), email TEXT UNIQUE NOT NULL,
+    password_hash TEXT, name TEXT, role TEXT, location_id TEXT, created_at TEXT
+);
+CREATE TABLE incidents (
+    id SERIAL PRIMARY KEY, company_id INTEGER REFERENCES companies (id), location_id TEXT,
+    incident_date TEXT NOT NULL, incident_time TEXT NOT NULL, exact_location TEXT NOT NULL,
+    violence_type TEXT NOT NULL, offender_classification TEXT NOT NULL, description TEXT NOT NULL,
+    circumstances TEXT, violence_nature TEXT, consequences TEXT, law_enforcement_contacted INTEGER,
+    injuries TEXT, protective_measures TEXT, employees_involved TEXT, corrective_actions TEXT,
+    logged_by_name TEXT NOT NULL, logged_by_title TEXT NOT NULL, log_date TEXT NOT NULL,
+    created_at TEXT
+);
+CREATE TABLE training_records (
+    id SERIAL PRIMARY KEY, company_id INTEGER REFERENCES companies (id), training_date TEXT NOT NULL,
+    training_type TEXT NOT NULL, trainer_name TEXT, topic_description TEXT, attendee_count INTEGER,
+    documentation_url TEXT, created_at TEXT
+);
+"""
+
+
+def test_legacy_text_date_columns_are_converted_in_place_with_stable_json(client, database, monkeypatch):
+    with psycopg.connect(database, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA public CASCADE")
+        conn.execute("CREATE SCHEMA public")
+        conn.execute(LEGACY_TEXT_SCHEMA)
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=7, training_records=3)
+    native_temporal_columns = next(migration.module for migration in migrate.discover()
+                                   if migration.name == "native_temporal_columns")
+    monkeypatch.setattr(native_temporal_columns, "TEMPORAL_BACKFILL_BATCH_SIZE", 2)
+
+    migrate.migrate(database)
+
+    with psycopg.connect(database) as conn:
+        column_types = dict(conn.execute(
+            """SELECT table_name || '.' || column_name, data_type FROM information_schema.columns
+               WHERE table_schema = 'public' AND table_name IN ('incidents', 'training_records')""").fetchall())
+        index_names = {row[0] for row in conn.execute("SELECT indexname FROM pg_indexes").fetchall()}
+        nullable = conn.execute(
+            """SELECT is_nullable FROM information_schema.columns
+               WHERE table_name = 'incidents' AND column_name = 'incident_date'""").fetchone()[0]
+    assert column_types["incidents.incident_date"] == "date"
+    assert column_types["incidents.incident_time"] == "time without time zone"
+    assert column_types["incidents.log_date"] == "timestamp with time zone"
+    assert column_types["training_records.training_date"] == "date"
+    assert column_types["training_records.created_at"] == "timestamp with time zone"
+    assert nullable == "NO"
+    assert "incidents_company_date_idx" in index_names
+    migrate.verify_schema(database)
+
+    sign_in(client, company_id)
+    incidents = client.get("/api/incidents").get_json()["incidents"]
+    assert len(incidents) == 7
+    assert incidents[0]["incident_date"] == "2026-07-07"
+    assert incidents[0]["incident_time"] == "06:15"
+    assert incidents[0]["log_date"] == "2026-01-01T00:00:00"
+    training = client.get("/api/training").get_json()["training_records"]
+    assert training[0]["training_date"] == "2026-03-01"
+
+
+def test_legacy_naive_timestamps_round_trip_whatever_the_session_time_zone(client, database, monkeypatch):
+    import time as time_module
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA public CASCADE")
+        conn.execute("CREATE SCHEMA public")
+        conn.execute(LEGACY_TEXT_SCHEMA)
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=1)
+        conn.execute("UPDATE incidents SET log_date = '2026-10-01T17:30:05.120000'")
+    # Neither the migration's session nor the app process runs in UTC.
+    monkeypatch.setenv("PGTZ", "America/Los_Angeles")
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time_module.tzset()
+    try:
+        migrate.migrate(database)
+        with psycopg.connect(database) as conn:
+            stored = conn.execute("SELECT log_date AT TIME ZONE 'UTC' FROM incidents").fetchone()[0]
+        sign_in(client, company_id)
+        incident = client.get("/api/incidents").get_json()["incidents"][0]
+    finally:
+        monkeypatch.undo()
+        time_module.tzset()
+
+    assert stored.isoformat() == "2026-10-01T17:30:05.120000"
+    assert incident["log_date"] == "2026-10-01T17:30:05.120000"
+
+
+def test_migrations_apply_once_across_concurrent_runners_and_adopt_init_db_schemas(database, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    migrations = migrate.discover()
+    with psycopg.connect(database, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA public CASCADE")
+        conn.execute("CREATE SCHEMA public")
+    with pytest.raises(migrate.SchemaOutOfDate):
+        migrate.verify_schema(database)
+
+    monkeypatch.setattr(migrate, "ADVISORY_LOCK_POLL_SECONDS", 0.05)
+    with ThreadPoolExecutor(max_workers=2) as runners:
+        runs = [runners.submit(migrate.migrate, database) for _ in range(2)]
+        applied = sorted((run.result() for run in runs), key=len)
+
+    assert applied == [[], migrations]
+    assert migrate.migrate(database) == []
+    migrate.verify_schema(database)
+
+    # A database that init_db brought to schema_version 4 runs none of the baseline again.
+    with psycopg.connect(database, autocommit=True) as conn:
+        conn.execute("DROP TABLE schema_migrations")
+        conn.execute("CREATE TABLE schema_version (version INTEGER PRIMARY KEY)")
+        conn.execute("INSERT INTO schema_version VALUES (3), (4)")
+    statements = []
+    with patch.object(migrate, "apply", side_effect=lambda conn, migration: statements.append(migration)):
+        assert migrate.migrate(database) == [m for m in migrations if m.version > migrate.LEGACY_SCHEMA_VERSION]
+    assert statements == [m for m in migrations if m.version > migrate.LEGACY_SCHEMA_VERSION]
+
+
+def test_a_failed_migration_leaves_nothing_behind(database):
+    def upgrade(conn):
+        conn.execute("CREATE TABLE half_done (id INTEGER)")
+        conn.execute("SELECT * FROM no_such_table")
+
+    broken = migrate.Migration(999, "broken", SimpleNamespace(upgrade=upgrade))
+    with pytest.raises(psycopg.errors.UndefinedTable):
+        migrate.migrate(database, migrations=migrate.discover() + [broken])
+
+    with psycopg.connect(database) as conn:
+        assert conn.execute("SELECT to_regclass('half_done')").fetchone()[0] is None
+        assert 999 not in migrate.applied_versions(conn)
+        # The advisory lock was released with the failure.
+        assert conn.execute("SELECT pg_try_advisory_lock(%s)", (migrate.ADVISORY_LOCK_ID,)).fetchone()[0]
+
+
+def test_stats_rollup_tracks_new_incidents_and_rebuilds_from_scratch(client, database):
+    from datetime import date, timedelta
+
+    from backend import incident_stats
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme")
+    sign_in(client, company_id)
+
+    recent = date.today().isoformat()
+    old = (date.today() - timedelta(days=90)).isoformat()
+    for incident_date, violence_type in [(recent, "Type 2"), (recent, "Type 2"), (old, "Type 3")]:
+        response = client.post("/api/incidents", json={
+            "incident_date": incident_date, "incident_time": "09:30", "exact_location": "Lobby",
+            "violence_type": violence_type, "offender_classification": "Customer",
+            "description": "Verbal threat", "logged_by_name": "Pat", "logged_by_title": "Manager",
+        })
+        assert response.status_code == 201
+
+    stats = client.get("/api/stats").get_json()["stats"]
+    assert stats == {
+        "total_incidents": 3,
+        "by_type": [{"violence_type": "Type 2", "count": 2}, {"violence_type": "Type 3", "count": 1}],
+        "recent_30_days": 2,
+    }
+
+    conn = database_module.get_db()
+    try:
+        assert incident_stats.check(conn) == []
+        conn.execute("UPDATE incident_type_counts SET incident_count = 40")
+        conn.commit()
+        assert len(incident_stats.check(conn, company_id)) == 2
+        incident_stats.rebuild(conn, company_id)
+        assert incident_stats.check(conn) == []
+    finally:
+        conn.close()
+
+
+def test_report_worker_renders_queued_jobs_for_polling(client, database):
+    from backend import report_worker
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=25)
+    sign_in(client, company_id)
+
+    summary = client.post("/api/reports", json={"type": "incident_summary"})
+    duplicate = client.post("/api/reports", json={"type": "incident_summary"})
+    plan = client.post("/api/reports", json={"type": "written_plan"})
+    assert summary.status_code == duplicate.status_code == plan.status_code == 202
+    assert duplicate.get_json()["job"]["id"] == summary.get_json()["job"]["id"]
+    assert client.get(summary.headers["Location"]).status_code == 202
+
+    assert report_worker.main(["--once", "--processes", "2"]) == 0
+
+    for created in (summary, plan):
+        response = client.get(created.headers["Location"])
+        assert response.status_code == 200
+        assert response.data.startswith(b"%PDF")
+        assert response.mimetype == "application/pdf"
+
+
+def test_concurrent_report_requests_share_one_pending_job(client, database):
+    from concurrent.futures import ThreadPoolExecutor
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme")
+        # A job of the same kind that already finished does not count.
+        conn.execute("""INSERT INTO report_jobs (company_id, kind, status, finished_at)
+                        VALUES (%s, 'written_plan', 'done', now())""", (company_id,))
+    sign_in(client, company_id)
+    cookie = client.get_cookie("session").value
+
+    def request_report(_):
+        with app_module.app.test_client() as other_client:
+            other_client.set_cookie("session", cookie)
+            response = other_client.post("/api/reports", json={"type": "written_plan"})
+            assert response.status_code == 202, response.get_json()
+            return response.get_json()["job"]["id"]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        job_ids = set(pool.map(request_report, range(16)))
+
+    assert len(job_ids) == 1
+    with psycopg.connect(database) as conn:
+        assert conn.execute("""SELECT COUNT(*) FROM report_jobs
+                               WHERE company_id = %s AND status = 'queued'""", (company_id,)).fetchone()[0] == 1
+        conn.execute("DELETE FROM report_jobs")
+        conn.commit()
+    # Retention removed the job while the client was still polling it.
+    assert client.get(f"/api/reports/{job_ids.pop()}").status_code == 404
+
+
+def test_report_jobs_are_claimed_once_and_reclaimed_after_a_crash(database):
+    from backend import report_worker
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        # Distinct companies and kinds: only one job per company and kind can be pending.
+        company_ids = [seed_company(conn, "Acme", "sub_acme"), seed_company(conn, "Other", "sub_other")]
+        job_ids = [conn.execute("INSERT INTO report_jobs (company_id, kind) VALUES (%s, %s) RETURNING id",
+                                (company_id, kind)).fetchone()[0]
+                   for company_id in company_ids for kind in ("written_plan", "incident_summary")]
+        conn.execute("""UPDATE report_jobs SET status = 'running', attempts = 1,
+                                               started_at = now() - interval '1 hour'
+                        WHERE id = %s""", (job_ids[2],))
+        conn.execute("""UPDATE report_jobs SET status = 'running', attempts = %s,
+                                               started_at = now() - interval '1 hour'
+                        WHERE id = %s""", (report_worker.REPORT_JOB_MAX_ATTEMPTS, job_ids[3]))
+
+    with psycopg.connect(database) as other_worker:
+        # Another worker is mid-claim on the first job: it is skipped, not waited on.
+        other_worker.execute("SELECT id FROM report_jobs WHERE id = %s FOR UPDATE", (job_ids[0],))
+        conn = database_module.get_db()
+        try:
+            claimed = report_worker.claim_jobs(conn, 10)
+        finally:
+            conn.close()
+        other_worker.rollback()
+
+    assert [job["id"] for job in claimed] == job_ids[1:3]
+    with psycopg.connect(database) as conn:
+        statuses = dict(conn.execute("SELECT id, status FROM report_jobs").fetchall())
+    assert statuses == {job_ids[0]: "queued", job_ids[1]: "running",
+                        job_ids[2]: "running", job_ids[3]: "failed"}
+
+
+def test_bulk_incident_import_loads_ten_thousand_rows_in_one_copy(client, database, monkeypatch):
+    import time
+
+    from backend import incident_stats
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme")
+    sign_in(client, company_id)
+
+    header = ("incident_date,incident_time,exact_location,violence_type,offender_classification,"
+              "description,logged_by_name,logged_by_title,employees_involved\n")
+    rows = [f"2025-{number % 12 + 1:02d}-{number % 28 + 1:02d},{number % 24:02d}:05,Lobby,"
+            f"Type {number % 4 + 1},Customer,\"Threat, verbal #{number}\",Pat,Manager,Sam;Lee\n"
+            for number in range(10000)]
+    started = time.perf_counter()
+    response = client.post("/api/incidents/bulk", data=header + "".join(rows), content_type="text/csv")
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 201, response.get_json()
+    assert response.get_json()["imported"] == 10000
+    assert elapsed < 10
+
+    rejected = client.post("/api/incidents/bulk", data=header + rows[0] + "2025-02-30,09:00,Lobby\n",
+                           content_type="text/csv")
+    assert rejected.status_code == 422
+    monkeypatch.setattr(app_module, "BULK_IMPORT_MAX_ROWS", 5)
+    too_many = client.post("/api/incidents/bulk", data=header + "".join(rows[:6]), content_type="text/csv")
+    assert too_many.status_code == 413
+
+    with psycopg.connect(database) as conn:
+        count = conn.execute("SELECT COUNT(*) FROM incidents WHERE company_id = %s", (company_id,)).fetchone()[0]
+        employees = conn.execute("SELECT employees_involved FROM incidents ORDER BY id DESC LIMIT 1").fetchone()[0]
+    assert count == 10000
+    assert json.loads(employees) == ["Sam", "Lee"]
+    conn = database_module.get_db()
+    try:
+        assert incident_stats.check(conn) == []
+    finally:
+        conn.close()
+
+
+def test_training_import_benchmark_runs_against_a_live_database(database, capsys):
+    from backend.bench import training_import
+
+    assert training_import.main(["--rows", "50", "--per-row-rows", "5"]) == 0
+    assert "speedup" in capsys.readouterr().out
+    with psycopg.connect(database) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM training_records").fetchone()[0] == 0
+
+
+def test_incident_search_benchmark_runs_against_a_live_database(database, capsys):
+    from backend.bench import incident_search
+
+    assert incident_search.main(["--rows", "300", "--repeats", "1"]) == 0
+    assert "no index ms" in capsys.readouterr().out
+    with psycopg.connect(database) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM incidents").fetchone()[0] == 0
+        assert conn.execute("SELECT to_regclass('incidents_search_idx') IS NOT NULL").fetchone()[0]
+
+
+def test_load_benchmark_drives_every_endpoint_through_gunicorn(database, monkeypatch, tmp_path):
+    from backend.bench import load
+
+    monkeypatch.setenv("PASSWORD_HASH_ITERATIONS", "1000")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    results_path = tmp_path / "results.json"
+
+    assert load.main(["--tenants", "1,30", "--requests", "6", "--warmup", "2", "--concurrency", "2",
+                      "--workers", "1", "--port", str(port), "--json", str(results_path)]) == 0
+    results = json.loads(results_path.read_text())
+    assert {(result["endpoint"], result["tenant_rows"]) for result in results["results"]} == {
+        ("login", None), ("webhook", None),
+        *((name, rows) for name in ("incidents", "stats", "training", "report_pdf") for rows in (1, 30)),
+    }
+    assert all(result["statuses"] == {"200": 6} for result in results["results"])
+    with psycopg.connect(database) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM companies").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM stripe_events").fetchone()[0] == 0
+
+
+def test_exports_stream_every_row_and_round_trip_through_bulk_import(client, database):
+    with psycopg.connect(database, autocommit=True) as conn:
+        source_id = seed_company(conn, "Acme", "sub_acme", incidents=1200, training_records=40)
+        target_id = seed_company(conn, "Acme Copy", "sub_copy")
+
+    sign_in(client, source_id)
+    incidents_csv = client.get("/api/export/incidents").get_data(as_text=True)
+    march = client.get("/api/export/incidents?format=ndjson&from=2026-03-01&to=2026-03-31").get_data(as_text=True)
+    training = client.get("/api/export/training?format=ndjson").get_data(as_text=True)
+    assert len(incidents_csv.splitlines()) == 1201
+    assert len(march.splitlines()) == 100
+    assert all(json.loads(line)["incident_date"].startswith("2026-03") for line in march.splitlines())
+    assert len(training.splitlines()) == 40
+
+    sign_in(client, target_id)
+    imported = client.post("/api/incidents/bulk", data=incidents_csv, content_type="text/csv")
+    assert imported.status_code == 201, imported.get_json()
+    assert imported.get_json()["imported"] == 1200
+    assert client.post("/api/training/bulk", data=training,
+                       content_type="application/x-ndjson").get_json()["imported"] == 40
+
+
+def test_incident_search_ranks_highlights_and_pages_within_the_company(client, database):
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=30)
+        other_id = seed_company(conn, "Other", "sub_other")
+        narratives = [
+            (company_id, "Customer threatened staff with a knife & a bat at the counter <3", "Parking lot"),
+            (company_id, "Shouting match at the counter", "Knife drawer left unlocked"),
+            (other_id, "Visitor brandished a knife", "Lobby"),
+        ]
+        for owner, description, location in narratives:
+            conn.execute("""INSERT INTO incidents (company_id, location_id, incident_date, incident_time,
+                                                   exact_location, violence_type, offender_classification,
+                                                   description, logged_by_name, logged_by_title, log_date)
+                            VALUES (%s, 'main', '2026-03-01', '09:00', %s, 'Type 2', 'Customer', %s,
+                                    'Pat', 'Manager', now())""", (owner, location, description))
+    sign_in(client, company_id)
+    header = "incident_date,incident_time,exact_location,violence_type,offender_classification,description," \
+             "logged_by_name,logged_by_title\n"
+    assert client.post("/api/incidents/bulk", content_type="text/csv", data=header +
+                       "2026-04-01,10:00,Kitchen,Type 2,Customer,A knife was taken from the kitchen,Pat,Manager\n"
+                       ).status_code == 201
+
+    knives = client.get("/api/incidents/search?q=knife").get_json()
+    # A match in the description outranks one in the location, ties go to the
+    # newest incident, and other companies never match.
+    assert [incident["description"] for incident in knives["incidents"]] == [
+        "A knife was taken from the kitchen",
+        "Customer threatened staff with a knife & a bat at the counter <3",
+        "Shouting match at the counter",
+    ]
+    assert knives["next_cursor"] is None
+    assert "search_vector" not in knives["incidents"][0]
+    assert knives["incidents"][1]["headline"].startswith(
+        "Customer threatened staff with a <mark>knife</mark> &amp; a bat at the counter &lt;3 ... ")
+    assert "<mark>Knife</mark> drawer" in knives["incidents"][2]["headline"]
+    assert client.get('/api/incidents/search?q="knife drawer"').get_json()["incidents"][0]["exact_location"] == \
+        "Knife drawer left unlocked"
+    assert client.get("/api/incidents/search?q=knife -kitchen").get_json()["incidents"][0]["description"] == \
+        "Shouting match at the counter"
+    assert client.get("/api/incidents/search?q=the").get_json()["incidents"] == []
+
+    seen = []
+    cursor = ""
+    while cursor is not None:
+        page = client.get(f"/api/incidents/search?q=verbal+threat&limit=7&cursor={cursor}").get_json()
+        seen += [incident["id"] for incident in page["incidents"]]
+        cursor = page["next_cursor"]
+    assert len(seen) == len(set(seen)) == 30
+
+    with psycopg.connect(database) as conn:
+        conn.execute("UPDATE incidents SET exact_location = 'Storage room' WHERE exact_location LIKE 'Knife%%'")
+        conn.commit()
+    assert len(client.get("/api/incidents/search?q=knife").get_json()["incidents"]) == 2
+    assert client.get("/api/incidents/search?q=%20").status_code == 400
+    assert client.get("/api/incidents/search?q=knife&cursor=bogus").status_code == 400
+
+
+def test_incident_search_migration_backfills_existing_rows(database):
+    with psycopg.connect(database, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA public CASCADE")
+        conn.execute("CREATE SCHEMA public")
+    migrate.migrate(database, target=4)
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=12)
+    with patch.object(migrate.discover()[4].module, "SEARCH_BACKFILL_BATCH_SIZE", 5):
+        assert [migration.version for migration in migrate.migrate(database, target=5)] == [5]
+
+    with psycopg.connect(database) as conn:
+        assert conn.execute("""SELECT COUNT(*) FROM incidents
+                               WHERE company_id = %s AND search_vector @@ websearch_to_tsquery('english', 'threats')""",
+                            (company_id,)).fetchone()[0] == 12
+        assert conn.execute("""SELECT indisvalid FROM pg_index
+                               WHERE indexrelid = 'incidents_search_idx'::regclass""").fetchone()[0]
+
+
+def test_etags_change_only_when_the_company_data_changes(client, database):
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme")
+        other_id = seed_company(conn, "Other", "sub_other")
+    sign_in(client, company_id)
+
+    tags = {path: client.get(path).headers["ETag"] for path in ("/api/incidents", "/api/stats", "/api/training")}
+    for path, tag in tags.items():
+        assert client.get(path, headers={"If-None-Match": tag}).status_code == 304
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        conn.execute("UPDATE companies SET data_version = data_version + 1 WHERE id = %s", (other_id,))
+    assert client.get("/api/stats", headers={"If-None-Match": tags["/api/stats"]}).status_code == 304
+
+    assert client.post("/api/training", json={"training_date": "2026-02-01",
+                                               "training_type": "Annual"}).status_code == 201
+    for path, tag in tags.items():
+        response = client.get(path, headers={"If-None-Match": tag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != tag
+
+
+# Statements each endpoint may run, including the request context lookup
+# shared by login_required and subscription_required. One connection each.
+QUERY_BUDGETS = [
+    ("GET", "/api/me", {}, 1),
+    ("POST", "/api/billing-portal", {}, 1),
+    ("GET", "/api/incidents", {}, 2),
+    ("GET", "/api/incidents?limit=5", {}, 2),
+    ("GET", "/api/incidents/{incident_id}", {}, 2),
+    ("GET", "/api/incidents/search?q=threat", {}, 2),
+    ("GET", "/api/training", {}, 2),
+    ("GET", "/api/stats", {}, 3),
+    ("POST", "/api/incidents", {"json": {
+        "incident_date": "2026-10-01", "incident_time": "09:30", "exact_location": "Lobby",
+        "violence_type": "Type 2", "offender_classification": "Customer",
+        "description": "Verbal threat", "logged_by_name": "Pat", "logged_by_title": "Manager",
+    }}, 5),
+    ("POST", "/api/training", {"json": {"training_date": "2026-02-01", "training_type": "Annual"}}, 3),
+    ("POST", "/api/training/bulk", {"data": "training_date,training_type\n2026-02-01,Annual\n",
+                                    "content_type": "text/csv"}, 3),
+    ("GET", "/api/report/plan", {}, 1),
+    ("GET", "/api/report/pdf", {}, 5),
+    ("POST", "/api/reports", {"json": {"type": "written_plan"}}, 3),
+]
+
+
+@pytest.mark.parametrize("method,path,kwargs,budget", QUERY_BUDGETS,
+                         ids=[f"{method} {path}" for method, path, _, _ in QUERY_BUDGETS])
+def test_endpoint_query_counts_stay_within_budget(client, database, method, path, kwargs, budget):
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=3, training_records=3)
+        incident_id = conn.execute("SELECT MAX(id) FROM incidents WHERE company_id = %s",
+                                   (company_id,)).fetchone()[0]
+    sign_in(client, company_id)
+
+    statements = []
+    connections = []
+    real_get_db = database_module.get_db
+
+    def recording_get_db():
+        connections.append(real_get_db())
+        return RecordingConnection(connections[-1], statements)
+
+    portal = SimpleNamespace(url="https://billing.stripe.com/session/test")
+    with patch.object(app_module, "get_db", recording_get_db), \
+         patch.object(app_module.stripe.billing_portal.Session, "create", return_value=portal):
+        response = client.open(path.format(incident_id=incident_id), method=method, **kwargs)
+        response.get_data()
+
+    assert response.status_code < 300, response.get_data(as_text=True)
+    assert len(statements) <= budget, [" ".join(statement.split()) for statement, _ in statements]
+    assert len(connections) == 1
+    assert all(conn.closed for conn in connections)
+
+
+def test_export_streams_on_its_own_connection_after_one_context_lookup(client, database):
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=3)
+    sign_in(client, company_id)
+
+    statements = []
+    real_get_db = database_module.get_db
+    with patch.object(app_module, "get_db", lambda: RecordingConnection(real_get_db(), statements)):
+        response = client.get("/api/export/incidents")
+        assert len(response.get_data(as_text=True).splitlines()) == 4
+    assert len(statements) == 2
+
+
+def test_failing_unauthenticated_requests_give_their_connections_back(client, database, monkeypatch):
+    monkeypatch.setattr(database_module, "POOL_MAX_SIZE", 2)
+    monkeypatch.setattr(database_module, "POOL_TIMEOUT_SECONDS", 1)
+    database_module.close_pool()
+
+    for _ in range(3):
+        assert client.post("/api/create-checkout-session", json={}).status_code == 400
+        assert client.post("/api/signup", json={}).status_code == 403
+    with patch.object(app_module.stripe.checkout.Session, "retrieve", side_effect=ValueError("no such session")):
+        for _ in range(3):
+            assert client.get("/api/verify-session?session_id=cs_missing&company_id=1").status_code == 400
+    login = client.post("/api/login", json={"email": "nobody@example.com", "password": "pw"})
+
+    assert login.status_code == 401
+    assert database_module.get_pool().get_stats()["pool_available"] == 2
+
+
+def test_pooled_cursors_report_queries_and_checkouts_to_request_metrics(client, database, tmp_path):
+    from backend.request_metrics import Registry
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=3)
+    sign_in(client, company_id)
+
+    with patch.object(app_module.request_metrics, "registry", Registry(str(tmp_path))), \
+         patch.dict(os.environ, METRICS_TOKEN="scrape-token"):
+        client.get("/api/incidents?limit=2").close()
+        client.get("/api/export/incidents").close()
+        text = client.get("/metrics", headers={"Authorization": "Bearer scrape-token"}).get_data(as_text=True)
+
+    assert 'compcleared_db_query_duration_seconds_count{route="/api/incidents"} 2' in text
+    assert 'compcleared_db_connect_duration_seconds_count{route="/api/incidents"} 1' in text
+    assert 'compcleared_http_request_db_queries_bucket{route="/api/incidents",le="1"} 0' in text
+    assert 'compcleared_http_request_db_queries_bucket{route="/api/incidents",le="2"} 1' in text
+    # The export declares its server-side cursor while the body streams.
+    assert 'compcleared_db_query_duration_seconds_count{route="/api/export/incidents"} 2' in text
+
+
+def test_asgi_dashboard_reads_run_on_the_async_pool_and_match_flask(client, database):
+    import asyncio
+
+    from backend import asgi
+    from backend.test_asgi import request, session_cookie
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=5, training_records=3)
+        user_id = conn.execute("SELECT id FROM users WHERE company_id = %s", (company_id,)).fetchone()[0]
+    headers = [("Cookie", session_cookie(user_id=user_id, company_id=company_id))]
+    reads = [("/api/me", ""), ("/api/incidents", ""), ("/api/incidents", "limit=2"),
+             ("/api/training", "limit=2"), ("/api/stats", "")]
+    application = asgi.Application(app_module.app, wsgi_threads=2)
+
+    async def serve():
+        lifespan = asyncio.Queue()
+        lifespan_sent = []
+
+        async def send(message):
+            lifespan_sent.append(message["type"])
+
+        running = asyncio.create_task(application({"type": "lifespan"}, lifespan.get, send))
+        await lifespan.put({"type": "lifespan.startup"})
+        while not lifespan_sent:
+            await asyncio.sleep(0.01)
+        served_async = [await request(application, "GET", path, query, headers) for path, query in reads]
+        served_by_flask = [await request(application.wsgi, "GET", path, query, headers) for path, query in reads]
+        # More concurrent requests than the pool has connections wait for one.
+        concurrent = await asyncio.gather(*[request(application, "GET", "/api/incidents", "limit=2", headers)
+                                            for _ in range(database_module.POOL_MAX_SIZE * 3)])
+        await lifespan.put({"type": "lifespan.shutdown"})
+        await running
+        return lifespan_sent, served_async, served_by_flask, concurrent
+
+    lifespan_sent, served_async, served_by_flask, concurrent = asyncio.run(serve())
+
+    assert lifespan_sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert [status for status, _, _ in served_async] == [200] * len(reads)
+    assert served_async == served_by_flask
+    assert len(json.loads(served_async[1][2])["incidents"]) == 5
+    assert all(response == served_async[2] for response in concurrent)
+    assert database_module._async_pool is None
+
+
+def test_slow_queries_are_logged_with_their_route_and_sampled_plans(client, database, tmp_path):
+    from backend import slow_queries
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme", incidents=3)
+    sign_in(client, company_id)
+
+    log = slow_queries.SlowQueryLog(0.001, 1.0, str(tmp_path), 1024 * 1024, 1,
+                                    connect=slow_queries.connect_for_explain)
+    with patch.object(database_module, "slow_query_log", log):
+        assert client.get("/api/incidents?limit=2").status_code == 200
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        entries = [json.loads(line) for line in next(tmp_path.glob("*.log")).read_text().splitlines()]
+        if sum(entry["kind"] == "explain" for entry in entries) == 2:
+            break
+        time.sleep(0.1)
+
+    queries = [entry for entry in entries if entry["kind"] == "query"]
+    assert {entry["route"] for entry in queries} == {"/api/incidents"}
+    assert len(queries) == 2
+    assert all(entry["params"] for entry in queries)
+    plans = [entry["plan"] for entry in entries if entry["kind"] == "explain"]
+    assert len(plans) == 2
+    assert all("Shared Hit Blocks" in plan for plan in plans)
+
+
+def test_webhook_inbox_dedupes_deliveries_and_applies_events_in_order(client, database, monkeypatch):
+    from backend import webhook_worker
+    from backend.bench import stripe_events
+
+    monkeypatch.setenv("STRIPE_WEBHOOK_SECRET", "whsec_test")
+    with psycopg.connect(database, autocommit=True) as conn:
+        company_id = seed_company(conn, "Acme", "sub_acme")
+        conn.execute("UPDATE companies SET subscription_status = 'pending', stripe_subscription_id = NULL")
+    checkout = {"id": "evt_checkout", "type": "checkout.session.completed", "created": 100,
+                "data": {"object": {
+                    "id": "cs_new", "client_reference_id": str(company_id), "metadata": {"company_id": str(company_id)},
+                    "payment_status": "paid", "subscription": "sub_new", "customer": "cus_new",
+                }}}
+    canceled = {"id": "evt_canceled", "type": "customer.subscription.deleted", "created": 200,
+                "data": {"object": {"id": "sub_new"}}}
+
+    def deliver(event, signature=None):
+        payload = json.dumps(event).encode()
+        return client.post("/api/webhook", data=payload, headers={
+            "Stripe-Signature": signature or stripe_events.signature_header(payload, "whsec_test")})
+
+    # Stripe delivers the cancellation first and retries the checkout event.
+    assert deliver(canceled).status_code == 200
+    assert deliver(checkout).status_code == 200
+    assert deliver(checkout).status_code == 200
+    assert deliver(checkout, signature="t=1,v1=forged").status_code == 400
+
+    with psycopg.connect(database) as conn:
+        assert conn.execute("SELECT count(*) FROM stripe_events").fetchone()[0] == 2
+        assert conn.execute("SELECT subscription_status FROM companies").fetchone()[0] == "pending"
+
+    with patch.object(app_module, "apply_stripe_event", wraps=app_module.apply_stripe_event) as apply:
+        assert webhook_worker.main(["--once"]) == 0
+    assert [call.args[1]["id"] for call in apply.call_args_list] == ["evt_checkout", "evt_canceled"]
+    with psycopg.connect(database) as conn:
+        assert conn.execute("SELECT subscription_status FROM companies").fetchone()[0] == "canceled"
+        assert conn.execute("SELECT count(*) FROM stripe_events WHERE processed_at IS NULL").fetchone()[0] == 0
+
+    assert webhook_worker.main(["replay", "evt_checkout"]) == 0
+    assert webhook_worker.main(["--once"]) == 0
+    with psycopg.connect(database) as conn:
+        # The replayed checkout cannot reactivate the canceled subscription.
+        assert conn.execute("SELECT subscription_status FROM companies").fetchone()[0] == "canceled"
+
+
+def test_failing_webhook_events_are_retried_then_parked_for_replay(database, monkeypatch):
+    from backend import webhook_worker
+
+    monkeypatch.setattr(webhook_worker, "WEBHOOK_EVENT_RETRY_SECONDS", 0)
+    monkeypatch.setattr(webhook_worker, "WEBHOOK_EVENT_MAX_ATTEMPTS", 2)
+    with psycopg.connect(database, autocommit=True) as conn:
+        for number, subscription_id in enumerate(("sub_a", "sub_a", "sub_b")):
+            event = {"id": f"evt_{number}", "type": "customer.subscription.deleted", "created": number,
+                     "data": {"object": {"id": subscription_id}}}
+            conn.execute("""INSERT INTO stripe_events (id, type, subscription_id, stripe_created, payload)
+                            VALUES (%s, %s, %s, %s, %s)""",
+                         (event["id"], event["type"], subscription_id, number, json.dumps(event)))
+
+    def apply(c, event):
+        if event["id"] == "evt_0":
+            raise RuntimeError("database hiccup")
+        return real_apply(c, event)
+
+    real_apply = app_module.apply_stripe_event
+    processed = []
+    with patch.object(app_module, "apply_stripe_event", apply):
+        conn = database_module.get_db()
+        try:
+            while (event_id := webhook_worker.process_next_event(conn)) is not None:
+                processed.append(event_id)
+        finally:
+            conn.close()
+
+    # evt_1 waits behind the failing evt_0 for the same subscription until
+    # evt_0 uses up its attempts.
+    assert processed == ["evt_0", "evt_0", "evt_1", "evt_2"]
+    with psycopg.connect(database) as conn:
+        assert conn.execute("SELECT attempts, error FROM stripe_events WHERE processed_at IS NULL").fetchall() == [
+            (2, "RuntimeError: database hiccup")]
+
+    assert webhook_worker.main(["replay", "--failed"]) == 0
+    assert webhook_worker.main(["--once"]) == 0
+    with psycopg.connect(database) as conn:
+        assert conn.execute("SELECT count(*) FROM stripe_events WHERE processed_at IS NULL").fetchone()[0] == 0
+
+
+def test_verify_session_reads_the_webhook_checkout_record_and_falls_back_to_stripe(client, database, monkeypatch):
+    from types import SimpleNamespace as StripeObject
+
+    from backend.bench import stripe_events
+
+    monkeypatch.setenv("STRIPE_WEBHOOK_SECRET", "whsec_test")
+    with psycopg.connect(database, autocommit=True) as conn:
+        paid_id = seed_company(conn, "Paid", "sub_paid")
+        async_id = seed_company(conn, "Async", "sub_async")
+        conn.execute("UPDATE companies SET subscription_status = 'pending', stripe_subscription_id = NULL")
+
+    for company_id, session_id, payment_status in ((paid_id, "cs_paid", "paid"), (async_id, "cs_async", "unpaid")):
+        payload = json.dumps({
+            "id": f"evt_{session_id}", "type": "checkout.session.completed", "created": 100,
+            "data": {"object": {
+                "id": session_id, "client_reference_id": str(company_id),
+                "metadata": {"company_id": str(company_id)}, "payment_status": payment_status,
+                "subscription": f"sub_{session_id}", "customer": f"cus_{session_id}",
+            }},
+        }).encode()
+        assert client.post("/api/webhook", data=payload, headers={
+            "Stripe-Signature": stripe_events.signature_header(payload, "whsec_test")}).status_code == 200
+
+    with patch.object(app_module.stripe.checkout.Session, "retrieve",
+                      side_effect=AssertionError("Stripe API called")):
+        response = client.get(f"/api/verify-session?session_id=cs_paid&company_id={paid_id}")
+    assert response.get_json() == {"success": True, "status": "active"}
+
+    # The recorded session was unpaid; Stripe has the settled payment.
+    settled = StripeObject(id="cs_async", client_reference_id=str(async_id), metadata={"company_id": str(async_id)},
+                           payment_status="paid", subscription="sub_cs_async", customer="cus_cs_async")
+    with patch.object(app_module.stripe.checkout.Session, "retrieve", return_value=settled) as retrieve:
+        response = client.get(f"/api/verify-session?session_id=cs_async&company_id={async_id}")
+    assert response.get_json() == {"success": True, "status": "active"}
+    retrieve.assert_called_once_with("cs_async")
+
+    with psycopg.connect(database) as conn:
+        statuses = dict(conn.execute("SELECT id, subscription_status FROM companies").fetchall())
+    assert statuses == {paid_id: "active", async_id: "active"}
@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+import backend.request_metrics as request_metrics
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def worker_registry(directory, pid, clock=None):
+    with patch.object(request_metrics.os, "getpid", return_value=pid):
+        return request_metrics.Registry(str(directory), flush_seconds=1, clock=clock or FakeClock())
+
+
+def test_histograms_render_cumulative_buckets_with_sum_and_count(tmp_path):
+    registry = worker_registry(tmp_path, 101)
+    with patch.object(request_metrics.os, "getpid", return_value=101):
+        for seconds in (0.003, 0.04, 0.04, 120):
+            registry.observe("compcleared_db_query_duration_seconds", ["/api/stats"], seconds)
+        registry.inc("compcleared_http_requests_total", ["/api/stats", "GET", "200"])
+        text = registry.render()
+
+    lines = text.splitlines()
+    assert "# TYPE compcleared_db_query_duration_seconds histogram" in lines
+    assert 'compcleared_db_query_duration_seconds_bucket{route="/api/stats",le="0.001"} 0' in lines
+    assert 'compcleared_db_query_duration_seconds_bucket{route="/api/stats",le="0.005"} 1' in lines
+    assert 'compcleared_db_query_duration_seconds_bucket{route="/api/stats",le="0.05"} 3' in lines
+    assert 'compcleared_db_query_duration_seconds_bucket{route="/api/stats",le="60"} 3' in lines
+    assert 'compcleared_db_query_duration_seconds_bucket{route="/api/stats",le="+Inf"} 4' in lines
+    assert 'compcleared_db_query_duration_seconds_count{route="/api/stats"} 4' in lines
+    assert 'compcleared_http_requests_total{route="/api/stats",method="GET",status="200"} 1' in lines
+
+
+def test_collect_sums_the_flushed_values_of_every_worker(tmp_path):
+    clock = FakeClock()
+    first = worker_registry(tmp_path, 101, clock)
+    second = worker_registry(tmp_path, 102, clock)
+    with patch.object(request_metrics.os, "getpid", return_value=101):
+        first.inc("compcleared_http_requests_total", ["/api/stats", "GET", "200"], 2)
+        first.observe("compcleared_db_connect_duration_seconds", ["/api/stats"], 0.002)
+        first.flush()
+        # Within flush_seconds of the last write, the file is left as it is.
+        first.inc("compcleared_http_requests_total", ["/api/stats", "GET", "200"])
+        first.flush()
+    with patch.object(request_metrics.os, "getpid", return_value=102):
+        second.inc("compcleared_http_requests_total", ["/api/stats", "GET", "200"])
+        second.observe("compcleared_db_connect_duration_seconds", ["/api/stats"], 0.2)
+        merged = second.collect()
+
+    requests_key = '["compcleared_http_requests_total", ["/api/stats", "GET", "200"]]'
+    connect = merged['["compcleared_db_connect_duration_seconds", ["/api/stats"]]']
+    assert merged[requests_key] == 3
+    assert connect[-1] == 2
+    assert round(connect[-2], 3) == 0.202
+
+    clock.now = 1.5
+    with patch.object(request_metrics.os, "getpid", return_value=101):
+        first.flush()
+    with patch.object(request_metrics.os, "getpid", return_value=102):
+        assert second.collect()[requests_key] == 4
+
+
+def test_queries_are_counted_against_the_request_they_ran_in(tmp_path):
+    registry = request_metrics.Registry(str(tmp_path))
+    with patch.object(request_metrics, "registry", registry):
+        stats = request_metrics.start_request("/api/incidents", "GET")
+        request_metrics.observe_query(0.01)
+        request_metrics.observe_query(0.02)
+        request_metrics.finish_request(stats, 200, 512)
+        assert request_metrics.current_route() == request_metrics.NO_ROUTE
+        request_metrics.observe_query(0.01)
+        text = registry.render()
+
+    assert 'compcleared_db_query_duration_seconds_count{route="-"} 1' in text
+    assert 'compcleared_db_query_duration_seconds_count{route="/api/incidents"} 2' in text
+    assert 'compcleared_http_request_db_queries_bucket{route="/api/incidents",le="1"} 0' in text
+    assert 'compcleared_http_request_db_queries_bucket{route="/api/incidents",le="2"} 1' in text
+    assert 'compcleared_http_response_size_bytes_sum{route="/api/incidents",method="GET"} 512' in text
+    assert (tmp_path / f"{request_metrics.os.getpid()}.json").exists()
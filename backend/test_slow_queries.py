@@ -0,0 +1,78 @@
+import json
+import threading
+from unittest.mock import MagicMock
+
+import backend.slow_queries as slow_queries
+
+
+def read_log(directory):
+    return [json.loads(line) for path in sorted(directory.glob("slow-queries-*.log"))
+            for line in path.read_text().splitlines()]
+
+
+def test_normalize_replaces_literals_and_collapses_whitespace():
+    statement = """SELECT * FROM incidents
+                   WHERE company_id = %s AND violence_type = 'Type 2' LIMIT 101"""
+    assert slow_queries.normalize(statement) == (
+        "SELECT * FROM incidents WHERE company_id = %s AND violence_type = ? LIMIT ?")
+    assert slow_queries.explainable("WITH recent AS (SELECT 1) SELECT * FROM recent")
+    assert not slow_queries.explainable("UPDATE companies SET data_version = data_version + ?")
+    assert not slow_queries.explainable("SELECT id FROM companies WHERE id = %s FOR UPDATE")
+    assert not slow_queries.explainable("SELECT pg_advisory_xact_lock(hashtext(%s))")
+    assert not slow_queries.explainable("SELECT PG_TRY_ADVISORY_LOCK (%s)")
+    assert not slow_queries.explainable("WITH next AS (SELECT nextval(?)) SELECT * FROM next")
+    assert not slow_queries.explainable("SELECT set_config(?, %s, false)")
+
+
+def test_only_statements_over_the_threshold_are_logged_without_parameter_values(tmp_path):
+    log = slow_queries.SlowQueryLog(100, 0, str(tmp_path), 1024 * 1024, 1)
+    log.record("SELECT * FROM users WHERE email = %s", ("owner@example.com",), 0.05, "/api/login")
+    log.record("SELECT * FROM users WHERE email = %s", ("owner@example.com",), 0.25, "/api/login")
+
+    [entry] = read_log(tmp_path)
+    assert entry["kind"] == "query"
+    assert entry["route"] == "/api/login"
+    assert entry["duration_ms"] == 250
+    assert entry["params"] == ["str"]
+    assert "owner@example.com" not in json.dumps(entry)
+
+
+def test_sampled_reads_are_explained_in_the_background(tmp_path):
+    explained = threading.Event()
+    conn = MagicMock(closed=False)
+    conn.execute.return_value.fetchone.return_value = [[{
+        "Plan": {"Node Type": "Index Scan", "Index Name": "idx_incidents_company_date",
+                 "Relation Name": "incidents", "Actual Rows": 3, "Actual Loops": 1, "Actual Total Time": 0.2},
+        "Planning Time": 0.1, "Execution Time": 0.3,
+    }]]
+    conn.rollback.side_effect = lambda: explained.set()
+    log = slow_queries.SlowQueryLog(1, 1.0, str(tmp_path), 1024 * 1024, 1, connect=lambda: conn)
+
+    log.record("UPDATE companies SET data_version = data_version + 1 WHERE id = %s", (7,), 0.5, "/api/incidents")
+    log.record("SELECT pg_advisory_xact_lock(hashtext(%s))", ("sub_1",), 0.5, "/api/webhook")
+    log.record("SELECT * FROM incidents WHERE company_id = %s", (7,), 0.5, "/api/incidents")
+    assert explained.wait(5)
+
+    statement, params = conn.execute.call_args.args
+    assert statement == "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) SELECT * FROM incidents WHERE company_id = %s"
+    assert params == (7,)
+    conn.execute.assert_called_once()
+
+
+def test_summarize_ranks_statements_by_total_time_with_their_latest_plan(tmp_path, capsys):
+    entries = [
+        {"kind": "query", "fingerprint": "a", "route": "/api/stats", "duration_ms": 600, "query": "SELECT a"},
+        {"kind": "query", "fingerprint": "b", "route": "/api/incidents", "duration_ms": 900, "query": "SELECT b"},
+        {"kind": "query", "fingerprint": "a", "route": "/api/me", "duration_ms": 700, "query": "SELECT a"},
+        {"kind": "explain", "fingerprint": "a", "at": "2026-10-18T10:00:00", "planning_ms": 0.1,
+         "execution_ms": 650, "plan": {"Node Type": "Seq Scan", "Relation Name": "incidents"}},
+    ]
+    log_path = tmp_path / "slow-queries-1.log"
+    log_path.write_text("".join(json.dumps(entry) + "\n" for entry in entries) + "not json\n")
+
+    assert slow_queries.main(["summarize", str(log_path), "--plans"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[1].split()[:4] == ["2", "1300", "650.0", "700.0"]
+    assert lines[1].endswith("/api/me, /api/stats")
+    assert "-> Seq Scan on incidents" in "\n".join(lines[2:5])
+    assert any(line.split()[:2] == ["1", "900"] for line in lines)
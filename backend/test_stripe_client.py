@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+import stripe
+
+from backend.bench.stripe_stub import StripeStub
+from backend.circuit_breaker import CircuitBreaker, CircuitOpen
+from backend.stripe_client import StripeHTTPClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def stub():
+    server = StripeStub(('127.0.0.1', 0), seed=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stripe_client(stub):
+    breaker = CircuitBreaker('Stripe', failure_threshold=2, reset_seconds=30)
+    http_client = StripeHTTPClient(breaker, connect_timeout=1, read_timeout=0.5,
+                                   max_retry_delay=0.01, pool_size=2)
+    return stripe.StripeClient('sk_test_stub', base_addresses={'api': stub.url},
+                               http_client=http_client, max_network_retries=1), breaker
+
+
+def test_breaker_opens_after_consecutive_failures_and_lets_one_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker('Stripe', failure_threshold=2, reset_seconds=30, clock=clock)
+
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 10
+    with pytest.raises(CircuitOpen) as rejected:
+        breaker.before_call()
+    assert rejected.value.retry_after == 20
+
+    clock.now = 30
+    breaker.before_call()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 60
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.metrics() == {
+        'state': 'closed', 'consecutive_failures': 0, 'times_opened': 2, 'rejected': 2,
+    }
+
+
+def test_client_reuses_pooled_connections_against_the_stub(stub, stripe_client):
+    client, breaker = stripe_client
+
+    created = client.checkout.sessions.create(params={
+        'mode': 'subscription', 'client_reference_id': '7', 'metadata': {'company_id': '7'},
+    })
+    retrieved = client.checkout.sessions.retrieve(created.id)
+
+    assert created.payment_status == 'unpaid'
+    assert retrieved.payment_status == 'paid'
+    assert retrieved.metadata['company_id'] == '7'
+    assert retrieved.client_reference_id == '7'
+    assert breaker.metrics()['consecutive_failures'] == 0
+
+
+def test_client_times_out_and_then_fails_fast_while_stripe_is_down(stub, stripe_client):
+    client, breaker = stripe_client
+    stub.latency_ms = 2000
+
+    started = time.perf_counter()
+    with pytest.raises(stripe.APIConnectionError):
+        client.checkout.sessions.retrieve('cs_missing')
+    # One try and one retry, each cut off by the 0.5 s read timeout.
+    assert time.perf_counter() - started < 1.5
+
+    stub.latency_ms = 0
+    stub.error_rate = 1.0
+    with pytest.raises(stripe.APIError):
+        client.checkout.sessions.retrieve('cs_missing')
+    assert breaker.state == CircuitBreaker.OPEN
+
+    requests_before = stub.requests
+    with pytest.raises(CircuitOpen):
+        client.checkout.sessions.retrieve('cs_missing')
+    assert stub.requests == requests_before
@@ -0,0 +1,171 @@
+"""Background worker that applies Stripe events stored by POST /api/webhook.
+
+The endpoint only verifies an event and inserts it into stripe_events, keyed
+by Stripe's event id, so a retried delivery costs one no-op INSERT. This
+process applies stored events oldest first (by Stripe's `created`). Each event
+is applied and marked processed in one transaction under its subscription's
+advisory lock, so it takes effect exactly once, and it is never claimed while
+an older event for the same subscription is still pending. Any number of
+workers can drain the inbox together.
+
+    python -m backend.webhook_worker [--once]
+    python -m backend.webhook_worker replay evt_123 [evt_456 ...]
+    python -m backend.webhook_worker replay --failed
+    python -m backend.webhook_worker fetch --since 2026-10-01
+
+`replay` marks stored events pending again; applying an event twice is
+harmless. `fetch` pulls events Stripe still holds (up to 30 days) into the
+inbox, for deliveries that never reached the endpoint.
+
+A failing event is retried every WEBHOOK_EVENT_RETRY_SECONDS, up to
+WEBHOOK_EVENT_MAX_ATTEMPTS times, and then waits for a replay.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+
+try:
+    from . import app as app_module
+    from .database import get_db
+except ImportError:
+    import app as app_module
+    from database import get_db
+
+WEBHOOK_WORKER_POLL_SECONDS = float(os.environ.get('WEBHOOK_WORKER_POLL_SECONDS', 1))
+WEBHOOK_EVENT_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_EVENT_MAX_ATTEMPTS', 5))
+WEBHOOK_EVENT_RETRY_SECONDS = int(os.environ.get('WEBHOOK_EVENT_RETRY_SECONDS', 30))
+
+
+def process_next_event(conn):
+    """Apply the oldest runnable event and return its id, or None if there is none."""
+    c = conn.cursor()
+    # An event whose subscription has an older pending event waits for it,
+    # including one another worker holds right now (its row is still pending).
+    c.execute('''SELECT event.id, event.subscription_id, event.payload
+                 FROM stripe_events AS event
+                 WHERE event.processed_at IS NULL
+                   AND event.attempts < %s
+                   AND (event.retry_at IS NULL OR event.retry_at <= now())
+                   AND NOT EXISTS (
+                       SELECT 1 FROM stripe_events AS earlier
+                       WHERE earlier.subscription_id = event.subscription_id
+                         AND earlier.processed_at IS NULL
+                         AND earlier.attempts < %s
+                         AND (earlier.stripe_created, earlier.received_at, earlier.id)
+                             < (event.stripe_created, event.received_at, event.id)
+                   )
+                 ORDER BY event.stripe_created, event.received_at, event.id
+                 LIMIT 1
+                 FOR UPDATE OF event SKIP LOCKED''',
+              (WEBHOOK_EVENT_MAX_ATTEMPTS, WEBHOOK_EVENT_MAX_ATTEMPTS))
+    event = c.fetchone()
+    if not event:
+        conn.rollback()
+        return None
+
+    try:
+        if event['subscription_id']:
+            c.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', (event['subscription_id'],))
+        app_module.apply_stripe_event(c, event['payload'])
+        c.execute('''UPDATE stripe_events
+                     SET processed_at = now(), attempts = attempts + 1, retry_at = NULL, error = NULL
+                     WHERE id = %s''', (event['id'],))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        c.execute('''UPDATE stripe_events
+                     SET attempts = attempts + 1, error = %s,
+                         retry_at = now() + make_interval(secs => %s)
+                     WHERE id = %s''',
+                  (f'{type(e).__name__}: {e}'[:1000], WEBHOOK_EVENT_RETRY_SECONDS, event['id']))
+        conn.commit()
+        print(f"❌ Stripe event {event['id']} failed: {e}")
+    return event['id']
+
+
+def replay_events(conn, event_ids=(), failed=False):
+    """Mark events pending again so the worker re-applies them; returns how many."""
+    c = conn.cursor()
+    if failed:
+        c.execute('''UPDATE stripe_events
+                     SET attempts = 0, retry_at = NULL, error = NULL
+                     WHERE processed_at IS NULL AND attempts >= %s''', (WEBHOOK_EVENT_MAX_ATTEMPTS,))
+    else:
+        c.execute('''UPDATE stripe_events
+                     SET processed_at = NULL, attempts = 0, retry_at = NULL, error = NULL
+                     WHERE id = ANY(%s)''', (list(event_ids),))
+    replayed = c.rowcount
+    conn.commit()
+    return replayed
+
+
+def fetch_events(conn, since):
+    """Insert events of the handled types created since `since` that the inbox lacks."""
+    c = conn.cursor()
+    fetched = 0
+    events = app_module.stripe.Event.list(types=list(app_module.STRIPE_EVENT_TYPES),
+                                          created={'gte': int(since.timestamp())}, limit=100)
+    for event in events.auto_paging_iter():
+        if app_module.record_stripe_event(c, event, json.dumps(event)):
+            fetched += 1
+    conn.commit()
+    return fetched
+
+
+def run(once):
+    stopping = []
+    if not once:
+        # Finish the event in hand on shutdown.
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+
+    app_module.create_app()
+    print("📬 Webhook worker started")
+    while not stopping:
+        conn = get_db()
+        try:
+            event_id = process_next_event(conn)
+        finally:
+            conn.close()
+        if event_id is None:
+            if once:
+                break
+            time.sleep(WEBHOOK_WORKER_POLL_SECONDS)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply Stripe events from the webhook inbox.')
+    parser.add_argument('--once', action='store_true',
+                        help='exit once no event is runnable instead of polling')
+    subcommands = parser.add_subparsers(dest='command')
+    replay_parser = subcommands.add_parser('replay', help='mark stored events pending again')
+    replay_parser.add_argument('event_ids', nargs='*', metavar='EVENT_ID')
+    replay_parser.add_argument('--failed', action='store_true',
+                               help='every event that used up its attempts')
+    fetch_parser = subcommands.add_parser('fetch', help='pull missed events from the Stripe API')
+    fetch_parser.add_argument('--since', required=True, type=datetime.fromisoformat,
+                              help='ISO date or time, e.g. 2026-10-01')
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        return run(args.once)
+
+    conn = get_db()
+    try:
+        if args.command == 'replay':
+            if not args.event_ids and not args.failed:
+                parser.error('replay needs event ids or --failed')
+            print(f"🔁 {replay_events(conn, args.event_ids, args.failed)} events marked for replay")
+        else:
+            print(f"📥 {fetch_events(conn, args.since)} missed events added to the inbox")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())